@@ -9,6 +9,7 @@ import unittest
 from scipy.spatial.distance import pdist, squareform
 from verypy.classic_heuristics.gillet_miller_sweep import gillet_miller_init, _shortest_path_through_nodes
 from verypy.cvrp_ops import D2D_c, validate_solution_feasibility
+from verypy.cvrp_io import generate_CVRP
 
 from replicationbase import ReplicationBase, REPRO_QUALITY_LEVELS
 
@@ -86,6 +87,11 @@ class TestGilletMillerSweep(unittest.TestCase):
         sol = gillet_miller_init(pts,D_c,d,C,L)
         self.assertTrue(validate_solution_feasibility(sol, D_c, d, C, L),"Should produce feasible solution")
         
+    def test_parallel_sweeps_give_the_same_solution(self):
+        _, pts, _, d, D, C, _ = generate_CVRP(40, 10, 5, 2)
+        self.assertEqual(gillet_miller_init(pts, D, d, C, jobs=1),
+                         gillet_miller_init(pts, D, d, C, jobs=2))
+        
 
 class TestMillerSolutions(unittest.TestCase):
     """ Because replicating results was not succeedi
@@ -12,6 +12,7 @@ from verypy.classic_heuristics.sequential_savings import sequential_savings_init
 from verypy.classic_heuristics.gaskell_savings import gaskell_savings_init
 from verypy.classic_heuristics.paessens_savings import paessens_savings_init
 from verypy.classic_heuristics.suppression_savings import suppression_savings_init
+from verypy.cvrp_io import generate_CVRP
 
 from verypy.local_search import LSOPT, do_local_search
 from verypy.local_search.intra_route_operators import do_3opt_move
@@ -113,6 +114,14 @@ class TestSavingsCWEilonEtAl1971Replications(ReplicationBase):
         self.assertTrue( abs(sdq) < REPRO_QUALITY_LEVELS.A_SD, "There is too much variation between instances") 
     
     
+class TestSavingsPaessensParallel(unittest.TestCase):
+    def test_parallel_parameter_search_gives_the_same_solution(self):
+        _, _, _, d, D, C, _ = generate_CVRP(40, 10, 5, 2)
+        for strategy in ["M4", [(1.0,0.0), (1.2,0.4), (1.6,0.1)]]:
+            self.assertEqual(
+                paessens_savings_init(D,d,C,None,strategy=strategy,jobs=1),
+                paessens_savings_init(D,d,C,None,strategy=strategy,jobs=2))
+    
 class TestSavingsPaessensReplications(ReplicationBase):
     """ The results were published in Paessens1988 
     """
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+""" This file implements tests checking that the cheapest insertion heuristic
+always makes the best feasible insertion even though it keeps only the best
+insertion of each customer in memory.
+"""
+###############################################################################
+
+# Written in Python 2.7, but try to maintain Python 3+ compatibility
+from __future__ import print_function
+from __future__ import division
+
+import unittest
+import random
+
+import numpy as np
+
+from verypy.cvrp_io import generate_CVRP
+from verypy.cvrp_ops import validate_solution_feasibility
+from verypy.classic_heuristics.cheapest_insertion import \
+    cheapest_insertion_init, parametrized_insertion_criteria,\
+    _try_insert_and_update
+from verypy.config import CAPACITY_EPSILON as C_EPS
+
+class TestCheapestInsertion(unittest.TestCase):
+    def setUp(self):
+        random.seed(1)
+        np.random.seed(1)
+
+    def _check_best_insertion_callback(self, D, d, C, lm, mm):
+        """ Returns an insert callback that checks that the insertion is the
+        best of all insertions of the unrouted customers to the route. """
+        routed = set()
+        def checking_callback(insertion, rd, D, L, minimize_K):
+            route = list(rd.route)
+            routed.update(route)
+            best_key = None
+            for u in set(range(1,len(D)))-routed:
+                if rd.used_capacity+d[u]-C_EPS>C:
+                    continue
+                for i, j in zip(route[:-1], route[1:]):
+                    strain, secondary = parametrized_insertion_criteria(
+                        D, i, u, j, lm, mm)
+                    l_saving = -D[i,j]+D[i,u]+D[u,j]-D[0,u]-D[u,0]
+                    key = (-strain, secondary, l_saving)
+                    if best_key is None or key<best_key:
+                        best_key = key
+            i = insertion.after_node.value
+            u = insertion.customer
+            j = insertion.before_node.value
+            strain, secondary = parametrized_insertion_criteria(
+                D, i, u, j, lm, mm)
+            self.assertEqual((-strain, secondary), best_key[:2])
+
+            routed.add(u)
+            return _try_insert_and_update(insertion, rd, D, L, minimize_K)
+        return checking_callback
+
+    def test_best_insertion_is_made(self):
+        for lm, mm in [(1.0, 0.0), (2.0, 1.0), (0.0, 1.0)]:
+            _, _, _, d, D, C, _ = generate_CVRP(30, 10.0, 5.0, 2.0)
+            callback = self._check_best_insertion_callback(D, d, C, lm, mm)
+            sol = cheapest_insertion_init(D, d, C, minimize_K=True,
+                insertion_strain_callback=lambda D,i,u,j:\
+                    parametrized_insertion_criteria(D,i,u,j,lm,mm),
+                insert_callback=callback)
+            self.assertTrue(all(validate_solution_feasibility(sol, D, d, C)))
+
+    def test_parallel_insertion(self):
+        _, _, _, d, D, C, _ = generate_CVRP(100, 10.0, 5.0, 2.0)
+        L = 2.5*np.max(D[0])
+        for minimize_K in [False, True]:
+            sol = cheapest_insertion_init(D, d, C, L, minimize_K=minimize_K,
+                                          emerging_route_count=4)
+            self.assertTrue(all(validate_solution_feasibility(sol, D, d, C,
+                                                              L)))
+            self.assertEqual(sorted(sol)[sol.count(0):],
+                             list(range(1,len(D))))
+
+if __name__ == '__main__':
+    unittest.main()
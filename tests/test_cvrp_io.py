@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+""" This file implements tests for reading the TSPLIB problem files, and
+especially that the compiled problem cache gives the same problems as the
+TSPLIB parser. Also, the vectorized distance calculation and building the
+problems in memory are tested.
+"""
+###############################################################################
+
+# Written in Python 2.7, but try to maintain Python 3+ compatibility
+from __future__ import print_function
+from __future__ import division
+
+import os
+import shutil
+import unittest
+from tempfile import mkdtemp
+
+import numpy as np
+from scipy.spatial.distance import pdist, cdist, squareform
+
+from verypy.cvrp_io import read_TSPLIB_CVRP, read_TSBLIB_additional_constraints
+from verypy.cvrp_io import read_compiled_CVRP, write_TSPLIB_file
+from verypy.cvrp_io import calculate_D, _geo, _att, _haversine
+from verypy.cvrp_io import build_CVRP
+import verypy.cvrp_io
+
+EXAMPLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, "examples")
+
+class TestEdgeWeightSection(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = mkdtemp()
+        n = 7
+        M = np.random.randint(1, 100, (n,n))
+        self.D = np.tril(M, -1)+np.tril(M, -1).T
+        np.fill_diagonal(self.D, 0)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _read_with_format(self, edge_weight_format, weights):
+        pfn = os.path.join(self.tmp_dir, edge_weight_format+".vrp")
+        with open(pfn, "w") as fh:
+            fh.write("NAME: test\nTYPE: CVRP\nDIMENSION: %d\n"%len(self.D))
+            fh.write("CAPACITY: 10\nEDGE_WEIGHT_TYPE: EXPLICIT\n")
+            fh.write("EDGE_WEIGHT_FORMAT: %s\n"%edge_weight_format)
+            fh.write("EDGE_WEIGHT_SECTION\n")
+            # the weights are not necessarily given one row per line
+            for i in range(0, len(weights), 5):
+                fh.write(" ".join(str(w) for w in weights[i:i+5])+"\n")
+            fh.write("DEMAND_SECTION\n")
+            for i in range(len(self.D)):
+                fh.write("%d 1\n"%(i+1))
+            fh.write("DEPOT_SECTION\n1\n-1\nEOF\n")
+        return read_TSPLIB_CVRP(pfn)
+
+    def test_edge_weight_formats(self):
+        D = self.D
+        n = len(D)
+        weights_in_format = {
+            "FULL_MATRIX":[D[i,j] for i in range(n) for j in range(n)],
+            "LOWER_ROW":[D[i,j] for i in range(n) for j in range(i)],
+            "LOWER_DIAG_ROW":[D[i,j] for i in range(n) for j in range(i+1)],
+            "UPPER_ROW":[D[i,j] for i in range(n) for j in range(i+1,n)],
+            "LOWER_COL":[D[i,j] for j in range(n) for i in range(j+1,n)],
+            "UPPER_DIAG_ROW":[D[i,j] for i in range(n) for j in range(i,n)]}
+        for edge_weight_format, weights in weights_in_format.items():
+            pd = self._read_with_format(edge_weight_format, weights)
+            self.assertTrue(np.array_equal(pd.distance_matrix, D),
+                            edge_weight_format)
+            self.assertTrue(np.issubdtype(pd.distance_matrix.dtype,
+                                          np.integer))
+
+    def test_missing_edge_weights(self):
+        n = len(self.D)
+        weights = [self.D[i,j] for i in range(n) for j in range(i)]
+        with self.assertRaises(IOError):
+            self._read_with_format("LOWER_ROW", weights[:-1])
+
+class TestCompiledProblemCache(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def _assert_same_problem(self, file_name, pd, constraints):
+        ref_pd = read_TSPLIB_CVRP(file_name)
+        self.assertEqual(constraints,
+                         read_TSBLIB_additional_constraints(file_name))
+        for field, value, ref_value in zip(pd._fields, pd, ref_pd):
+            if field=='distance_matrix':
+                self.assertEqual(value.dtype, ref_value.dtype)
+                self.assertTrue(np.array_equal(value, ref_value))
+            else:
+                self.assertEqual(value, ref_value, field)
+
+    def test_compiled_examples(self):
+        for problem_name in ["E-n51-k5.vrp", "example.vrp", "ulysses16.tsp"]:
+            pfn = os.path.join(EXAMPLES_PATH, problem_name)
+            # the first read compiles, the second reads the compiled problem
+            pd, constraints = read_compiled_CVRP(pfn, self.cache_dir)
+            self._assert_same_problem(pfn, pd, constraints)
+            pd, constraints = read_compiled_CVRP(pfn, self.cache_dir)
+            self.assertTrue(isinstance(pd.distance_matrix, np.memmap))
+            self._assert_same_problem(pfn, pd, constraints)
+
+    def test_changed_file_is_recompiled(self):
+        pfn = os.path.join(self.cache_dir, "changing.vrp")
+        D = np.array([[0, 1, 2], [1, 0, 3], [2, 3, 0]])
+        write_TSPLIB_file(pfn, D, d=[0, 1, 1], C=2)
+        pd, _ = read_compiled_CVRP(pfn, self.cache_dir)
+        self.assertEqual(pd.distance_matrix[1,2], 3)
+
+        D[1,2] = D[2,1] = 4
+        write_TSPLIB_file(pfn, D, d=[0, 1, 1], C=2)
+        pd, constraints = read_compiled_CVRP(pfn, self.cache_dir)
+        self.assertEqual(pd.distance_matrix[1,2], 4)
+        self._assert_same_problem(pfn, pd, constraints)
+
+class TestVectorizedDistances(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(1)
+        n = 120
+        self.points = {
+            'GEO' : np.random.uniform(-1.5, 1.5, (n,2)),
+            'ATT' : np.random.randint(0, 5000, (n,2)).astype(float),
+            'HAVERSINE' : np.column_stack([np.random.uniform(-180, 180, n),
+                                           np.random.uniform(-89, 89, n)])}
+        self.scalar_distances = {'GEO':_geo, 'ATT':_att,
+                                 'HAVERSINE':_haversine}
+        
+    def _check_same_as_scalar(self):
+        for ewt, pts in self.points.items():
+            f = self.scalar_distances[ewt]
+            D = calculate_D(pts, None, ewt)
+            D_ref = squareform(pdist(pts, lambda v,w: f(v,w)))
+            S = calculate_D(pts[:7], pts, ewt)
+            S_ref = cdist(pts[:7], pts, lambda v,w: f(v,w))
+            self.assertEqual(D.dtype, D_ref.dtype)
+            if ewt=='HAVERSINE':
+                # NumPy arcsin may differ from the math.asin in the last digit 
+                self.assertTrue(np.allclose(D, D_ref, rtol=1e-12, atol=0))
+                self.assertTrue(np.allclose(S, S_ref, rtol=1e-12, atol=0))
+            else:
+                self.assertTrue(np.array_equal(D, D_ref), ewt)
+                self.assertTrue(np.array_equal(S, S_ref), ewt)
+            
+    def test_same_as_scalar(self):
+        self._check_same_as_scalar()
+        
+    def test_small_batches(self):
+        original_batch_size = verypy.cvrp_io.DISTANCE_BATCH_SIZE
+        try:
+            verypy.cvrp_io.DISTANCE_BATCH_SIZE = 500
+            self._check_same_as_scalar()
+        finally:
+            verypy.cvrp_io.DISTANCE_BATCH_SIZE = original_batch_size
+            
+    def test_geo_example(self):
+        pd = read_TSPLIB_CVRP(os.path.join(EXAMPLES_PATH, "ulysses16.tsp"))
+        # the distances of the optimal tour of ulysses16 sum up to 6859
+        opt_tour = [1,14,13,12,7,6,15,5,11,9,10,16,3,2,4,8,1]
+        self.assertEqual(sum(pd.distance_matrix[i-1,j-1] for i, j in
+                             zip(opt_tour[:-1], opt_tour[1:])), 6859)
+
+class TestBuildCVRP(unittest.TestCase):
+    def _read_node_coord_section(self, pfn):
+        with open(pfn) as fh:
+            lines = [l.split() for l in fh.read().split("NODE_COORD_SECTION")[1]
+                     .split("\n") if l.strip()]
+        return [(float(l[1]), float(l[2])) for l in lines
+                if len(l)==3 and l[0].isdigit()]
+        
+    def _assert_same_problem(self, pd, built_pd):
+        self.assertEqual(built_pd.size, pd.size)
+        self.assertEqual(built_pd.customer_demands, pd.customer_demands)
+        self.assertEqual(built_pd.capacity_constraint, pd.capacity_constraint)
+        self.assertEqual(built_pd.edge_weight_type, pd.edge_weight_type)
+        for pts, built_pts in [
+           (pd.coordinate_points, built_pd.coordinate_points),
+           (pd.display_coordinate_points, built_pd.display_coordinate_points)]:
+            if pts is None:
+                self.assertIsNone(built_pts)
+            else:
+                self.assertTrue(np.array_equal(built_pts, pts))
+        self.assertEqual(built_pd.distance_matrix.dtype,
+                         pd.distance_matrix.dtype)
+        self.assertTrue(np.array_equal(built_pd.distance_matrix,
+                                       pd.distance_matrix))
+        
+    def test_same_as_read(self):
+        for problem_name in ["E-n51-k5.vrp", "ulysses16.tsp"]:
+            pfn = os.path.join(EXAMPLES_PATH, problem_name)
+            pd = read_TSPLIB_CVRP(pfn)
+            built_pd = build_CVRP(self._read_node_coord_section(pfn),
+                                  pd.customer_demands, pd.capacity_constraint,
+                                  pd.edge_weight_type)
+            self._assert_same_problem(pd, built_pd)
+            
+    def test_depot_is_moved_first(self):
+        points = [(3.0, 4.0), (0.0, 0.0), (1.0, 7.0), (5.0, 2.0)]
+        pd = build_CVRP(points, [1, 0, 2, 3], 5, 'EXACT_2D', depot_node=2)
+        self.assertEqual(pd.coordinate_points, [[0.0, 0.0], [3.0, 4.0],
+                                                [1.0, 7.0], [5.0, 2.0]])
+        self.assertEqual(pd.customer_demands, [0.0, 1.0, 2.0, 3.0])
+        self.assertTrue(np.array_equal(pd.distance_matrix, 
+            calculate_D(pd.coordinate_points, None, 'EXACT_2D')))
+        
+    def test_invalid_problems(self):
+        points = [(3.0, 4.0), (0.0, 0.0), (1.0, 7.0)]
+        with self.assertRaises(ValueError):
+            build_CVRP(points+[(1.0,)])
+        with self.assertRaises(ValueError):
+            build_CVRP(points, [0, 1])
+        with self.assertRaises(ValueError):
+            build_CVRP(points, depot_node=4)
+        with self.assertRaises(ValueError):
+            build_CVRP(points, edge_weight_type="EXPLICIT")
+
+if __name__ == '__main__':
+    unittest.main()
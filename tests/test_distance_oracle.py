@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+""" This file implements tests checking that the DistanceOracle gives the
+same distances as the dense distance matrix, and that the heuristics that
+only read D produce the same solutions with it.
+"""
+###############################################################################
+
+# Written in Python 2.7, but try to maintain Python 3+ compatibility
+from __future__ import print_function
+from __future__ import division
+
+import os
+import unittest
+
+import numpy as np
+
+from verypy.cvrp_io import calculate_D, read_TSPLIB_CVRP
+from verypy.cvrp_ops import D2D_c
+from verypy.distance_oracle import DistanceOracle
+from verypy.classic_heuristics.parallel_savings import parallel_savings_init
+from verypy.classic_heuristics.sweep import sweep_init
+from verypy.classic_heuristics.gillet_miller_sweep import gillet_miller_init
+from verypy.classic_heuristics.nearest_neighbor import nearest_neighbor_init
+
+EXAMPLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, "examples")
+
+class TestDistanceOracle(unittest.TestCase):
+    def setUp(self):
+        self.points = np.random.rand(40, 2)*1000
+
+    def test_same_as_dense(self):
+        for ewt in ['EUC_2D', 'CEIL_2D', 'EXACT_2D', 'ATT', 'GEO']:
+            pts = self.points/100 if ewt=='GEO' else self.points
+            for st in [None, 10, 2.5]:
+                D = calculate_D(pts, None, ewt)
+                O = DistanceOracle(pts, ewt, max_cached_rows=4)
+                if st:
+                    D = D2D_c(D, st)
+                    O = D2D_c(O, st)
+                msg = "%s with st=%s"%(ewt, str(st))
+                self.assertEqual(len(O), len(D))
+                self.assertEqual(O.dtype, D.dtype, msg)
+                self.assertTrue(np.array_equal(O.as_dense(), D), msg)
+                for i, j in [(0,0), (3,7), (7,3), (-1,5)]:
+                    self.assertEqual(O[i,j], D[i,j], msg)
+                self.assertTrue(np.array_equal(O[5,:], D[5,:]))
+                self.assertTrue(np.array_equal(O[5][:], D[5][:]))
+
+    def test_fancy_indexing(self):
+        D = calculate_D(self.points)
+        O = DistanceOracle(self.points, max_cached_rows=4)
+        idxs = np.random.randint(0, len(D), 10)
+        jdxs = np.random.randint(0, len(D), 10)
+        for key in [(idxs, jdxs), (idxs, 3), (slice(2,9), jdxs),
+                    (slice(None), 4), np.ix_(idxs, jdxs)]:
+            self.assertTrue(np.array_equal(O[key], D[key]))
+
+    def test_read_only(self):
+        O = DistanceOracle(self.points)
+        with self.assertRaises(TypeError):
+            O[1,2] = 0.0
+        with self.assertRaises(ValueError):
+            O[1][2] = 0.0
+
+    def test_float32_dense(self):
+        D = calculate_D(self.points)
+        D32 = DistanceOracle(self.points, max_cached_rows=7).as_dense(
+            np.float32)
+        self.assertEqual(D32.dtype, np.float32)
+        self.assertTrue(np.array_equal(D32, D))
+
+class TestHeuristicsWithDistanceOracle(unittest.TestCase):
+    def setUp(self):
+        pd = read_TSPLIB_CVRP(os.path.join(EXAMPLES_PATH, "E-n51-k5.vrp"))
+        self.points = pd.coordinate_points
+        self.d = pd.customer_demands
+        self.C = pd.capacity_constraint
+        self.D = pd.distance_matrix
+        self.O = DistanceOracle(self.points, pd.edge_weight_type,
+                                max_cached_rows=8)
+
+    def test_savings(self):
+        self.assertEqual(parallel_savings_init(self.D, self.d, self.C),
+                         parallel_savings_init(self.O, self.d, self.C))
+
+    def test_sweep(self):
+        self.assertEqual(sweep_init(self.points, self.D, self.d, self.C),
+                         sweep_init(self.points, self.O, self.d, self.C))
+
+    def test_gillet_miller(self):
+        # the oracle is read-only, GM must not write to D
+        self.assertEqual(
+            gillet_miller_init(self.points, self.D, self.d, self.C),
+            gillet_miller_init(self.points, self.O, self.d, self.C))
+
+    def test_nearest_neighbor(self):
+        self.assertEqual(nearest_neighbor_init(self.D, self.d, self.C),
+                         nearest_neighbor_init(self.O, self.d, self.C))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,13 +6,21 @@ from __future__ import print_function
 from __future__ import division
 
 import unittest
+import random
+from itertools import product
+import numpy as np
 from scipy.spatial.distance import pdist, squareform
-from verypy.local_search import LSOPT
+from verypy.local_search import LSOPT, do_local_search, granular_neighbor_lists
 from verypy.local_search.inter_route_operators import do_2optstar_move,\
                             do_insert_move,do_redistribute_move,\
-                            do_2point_move, do_1point_move
+                            do_2point_move, do_1point_move,\
+                            do_granular_2optstar_move,\
+                            do_granular_1point_move, do_granular_2point_move
+from verypy.cvrp_io import generate_CVRP
+from verypy.cvrp_ops import validate_solution_feasibility
+from verypy.classic_heuristics.nearest_neighbor import nearest_neighbor_init
                             
-from verypy.routedata import RouteData
+from verypy.routedata import RouteData, ArrayRouteData
 
 # Helpers, so simple that they are sure to work right
 from verypy.util import routes2sol, sol2routes
@@ -67,6 +75,31 @@ class Test2OptStar(unittest.TestCase):
         #print([0,1,2,3,4,0], [0,5,6,7,0], route_l([0,1,2,3,4,0], self.D)+route_l([0,5,6,7,0], self.D))
         self.assertEqual( new_r1d[0], [0,1,2,3,4,0], "nodes 4 and 7 should be swapped")
         self.assertEqual( new_r2d[0], [0,5,6,7,0], "nodes 4 and 7 should be swapped")
+        
+    def test_updated_route_costs(self):
+        new_r1d, new_r2d, f_delta = self._make_improving_move(
+                r1=[0,1,2,7,0], r2=[0,4,3,6,5,0], C=4.0, d = self.d) 
+        self.assertAlmostEqual( new_r1d.cost, route_l(new_r1d.route, self.D) )
+        self.assertAlmostEqual( new_r2d.cost, route_l(new_r2d.route, self.D) )
+        
+    def test_array_route_data(self):
+        D, d = self.D, self.d
+        r1, r2 = [0,1,2,7,0], [0,4,3,6,5,0]
+        r1rd = ArrayRouteData(r1, route_l(r1,D), route_d(r1, d))
+        r2rd = ArrayRouteData(r2, route_l(r2,D), route_d(r2, d))
+        new_r1d, new_r2d, f_delta = do_2optstar_move(r1rd, r2rd, D, d=d,
+                                    C=4.0, strategy=LSOPT.BEST_ACCEPT)
+        self.assertTrue( r1rd.aux_data_updated )
+        
+        # the partially reused auxiliary data must match a recalculated one
+        for new_rd in (new_r1d, new_r2d):
+            self.assertIsInstance(new_rd, ArrayRouteData)
+            new_rd.update_auxiliary_data(D, d)
+            recalculated_rd = RouteData(new_rd.route)
+            recalculated_rd.update_auxiliary_data(D, d)
+            for aux in ['fwd_l', 'rwd_l', 'fwd_d', 'rwd_d']:
+                self.assertEqual( list(getattr(new_rd, aux)),
+                                  list(getattr(recalculated_rd, aux)) )
 
 
 class TestInsertion(unittest.TestCase):
@@ -546,5 +579,64 @@ class TestTwoPointMove(unittest.TestCase):
 #        raise NotImplementedError()
         
     
+class TestGranularMoves(unittest.TestCase):
+    def setUp(self):
+        random.seed(1)
+        np.random.seed(1)
+        _, _, _, self.d, self.D, self.C, _ = generate_CVRP(40, 50.0, 5.0, 2.0)
+        self.operators = [(do_1point_move, do_granular_1point_move),
+                          (do_2point_move, do_granular_2point_move),
+                          (do_2optstar_move, do_granular_2optstar_move)]
+    
+    def _random_route_data(self, customers):
+        route = [0]+customers+[0]
+        return RouteData(route, route_l(route, self.D),
+                         route_d(route, self.d), None)
+        
+    def test_neighbor_lists(self):
+        k = 5
+        neighbors = granular_neighbor_lists(self.D, k)
+        for i, nbrs in enumerate(neighbors):
+            self.assertNotIn(i, nbrs)
+            # all closer than the k. nearest must be there, whatever the ties
+            kth_nearest = sorted(self.D[i,j] for j in range(len(self.D))
+                                 if j!=i)[k-1]
+            for j in range(len(self.D)):
+                if j!=i and self.D[i,j]<kth_nearest:
+                    self.assertIn(j, nbrs)
+            self.assertGreaterEqual(len([j for j in nbrs
+                                         if self.D[i,j]<=kth_nearest]), k)
+            for j in nbrs:
+                self.assertIn(i, neighbors[j])
+    
+    def test_all_neighbors_is_same_as_full(self):
+        neighbors = granular_neighbor_lists(self.D, len(self.D))
+        customers = list(range(1, len(self.D)))
+        for trial, strategy in product(range(10), [LSOPT.FIRST_ACCEPT,
+                                                   LSOPT.BEST_ACCEPT]):
+            random.shuffle(customers)
+            r1, r2 = customers[:7], customers[7:12]
+            for full_op, granular_op in self.operators:
+                full = full_op(self._random_route_data(r1),
+                               self._random_route_data(r2),
+                               self.D, self.d, self.C, None, strategy)
+                gran = granular_op(self._random_route_data(r1),
+                                   self._random_route_data(r2),
+                                   self.D, self.d, self.C, None, strategy,
+                                   neighbors=neighbors)
+                self.assertEqual(full[2], gran[2])
+                if full[2] is not None:
+                    self.assertEqual(full[0].route, gran[0].route)
+                    self.assertEqual(full[1].route, gran[1].route)
+    
+    def test_local_search(self):
+        L = 2.5*np.max(self.D[0])
+        sol = nearest_neighbor_init(self.D, self.d, self.C, L)
+        ls_sol = do_local_search([op for _, op in self.operators], sol,
+                                 self.D, self.d, self.C, L)
+        self.assertTrue(all(validate_solution_feasibility(ls_sol, self.D,
+                                                   self.d, self.C, L)))
+        self.assertLess(route_l(ls_sol, self.D), route_l(sol, self.D))
+        
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
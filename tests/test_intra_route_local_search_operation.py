@@ -6,10 +6,12 @@ from __future__ import print_function
 from __future__ import division
 
 import unittest
+import random
 from scipy.spatial.distance import pdist, squareform
 from verypy.local_search import LSOPT
 from verypy.local_search.intra_route_operators import do_2opt_move, do_3opt_move,\
-                            do_relocate_move, do_exchange_move
+                            do_relocate_move, do_exchange_move,\
+                            do_granular_3opt_move
 from verypy.cvrp_io import generate_CVRP
 
 # Helpers, so simple that they are sure to work right
@@ -81,6 +83,37 @@ class Test2Opt(unittest.TestCase):
         self.assertEqual( i+1,required_moves )
         self.assertEqual( opt_route,[0,1,2,3,4,5,6,7,0] )
 
+class TestVectorized2Opt(unittest.TestCase):
+    """ The NumPy evaluation of the 2-opt moves must make exactly the same
+    moves as the plain Python loops. """
+    
+    def setUp(self):
+        random.seed(1)
+        self.N = 60
+        self.D = generate_CVRP(self.N, 100.0, 20.0, 5.0).distance_matrix
+    
+    def test_empty_route(self):
+        self.assertEqual(do_2opt_move([],self.D, vectorized=True), (None, None))
+        self.assertEqual(do_2opt_move([0,0],self.D, vectorized=True), (None, None))
+    
+    def _assert_same_moves(self, strategy):
+        for route_len in [3, 10, 25, self.N]:
+            route = [0]+random.sample(range(1,self.N+1), route_len)+[0]
+            vec_route = route
+            while route is not None:
+                route, delta = do_2opt_move(route, self.D, strategy,
+                                            vectorized=False)
+                vec_route, vec_delta = do_2opt_move(vec_route, self.D, strategy,
+                                                    vectorized=True)
+                self.assertEqual(route, vec_route)
+                self.assertEqual(delta, vec_delta)
+    
+    def test_same_moves_first_accept(self):
+        self._assert_same_moves(LSOPT.FIRST_ACCEPT)
+        
+    def test_same_moves_best_accept(self):
+        self._assert_same_moves(LSOPT.BEST_ACCEPT)
+
 class Test3Opt(unittest.TestCase):
     def setUp(self):
         # a problem that is a circle with a radius of ~7, the depot on the rim
@@ -328,6 +361,32 @@ class Test3Opt(unittest.TestCase):
                 break
             
         
+class TestGranular3Opt(Test3Opt):
+    """ The moves forced in Test3Opt use short new edges, and, thus, they
+    must be found also when searching only the nearest neighbors. """
+    def setUp(self):
+        super(TestGranular3Opt, self).setUp()
+        self.move_op = do_granular_3opt_move
+        
+    def test_dont_look_bits(self):
+        D = self.D.copy()
+        set_weight(D,2,3,100)
+        set_weight(D,8,9,100)
+        set_weight(D,2,8,1)
+        set_weight(D,3,9,1)
+        
+        dont_look_bits = set()
+        sol, delta_f = self.move_op(self.optimum, D,
+                                    dont_look_bits=dont_look_bits)
+        self.assertIsNotNone(sol)
+        # the end nodes of the removed edges must be searched again
+        self.assertTrue(dont_look_bits.isdisjoint([2,3,8,9]))
+        
+        # the route is now optimal, all nodes get their don't look bit set
+        sol, delta_f = self.move_op(sol, D, dont_look_bits=dont_look_bits)
+        self.assertEqual(sol, None)
+        self.assertEqual(dont_look_bits, set(self.optimum))
+
 class TestRelocate(unittest.TestCase):
  
     def setUp(self):
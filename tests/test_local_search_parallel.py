@@ -40,7 +40,8 @@ from verypy.local_search.naive_implementations import do_naive_local_search, \
     do_naive_2opt_move, do_naive_2optstar_move, \
     do_naive_1point_move, do_naive_relocate_move, \
     do_naive_exchange_move, do_naive_2point_move
-from verypy.local_search import LSOPT, do_local_search
+from verypy.local_search import LSOPT, do_local_search,\
+    granular_neighbor_lists, _RouteNeighborhoodIndex
 from verypy.local_search.intra_route_operators import do_2opt_move, do_3opt_move,\
     do_relocate_move, do_exchange_move
 from verypy.local_search.inter_route_operators import do_2optstar_move,\
@@ -565,6 +566,49 @@ class TestExchangeMove(unittest.TestCase):
             [do_exchange_move], [do_naive_exchange_move],
             operator_strategy=LSOPT.FIRST_ACCEPT)
 
+
+class TestRouteNeighborhoodIndex(unittest.TestCase):
+    def setUp(self):
+        _, _, _, self.d, self.D, self.C, _ = generate_CVRP(60, 50, 8, 3)
+        self.neighbors = granular_neighbor_lists(self.D, 4)
+    
+    def _check_counts(self, index, routes):
+        recalculated = _RouteNeighborhoodIndex(routes, self.neighbors)
+        for ri in range(len(routes)):
+            for rj in range(len(routes)):
+                self.assertEqual(index.edge_counts[ri][rj],
+                                 recalculated.edge_counts[ri][rj])
+                self.assertEqual(index.are_neighbors((ri,rj)),
+                                 recalculated.are_neighbors((ri,rj)))
+    
+    def test_incremental_update(self):
+        routes = sol2routes(_get_random_solution(self.d, self.C))
+        index = _RouteNeighborhoodIndex(routes, self.neighbors)
+        self._check_counts(index, routes)
+        for trial in range(30):
+            # move a random customer to another route
+            ri, rj = np.random.choice(len(routes), 2, replace=False)
+            if len(routes[ri])<=2:
+                continue
+            old_ri, old_rj = routes[ri], routes[rj]
+            i = randint(1, len(old_ri)-2)
+            routes[ri] = old_ri[:i]+old_ri[i+1:]
+            routes[rj] = old_rj[:1]+[old_ri[i]]+old_rj[1:]
+            index.update_routes([(ri, old_ri, routes[ri]),
+                                 (rj, old_rj, routes[rj])])
+            self._check_counts(index, routes)
+    
+    def test_pruned_local_search(self):
+        sol = _get_random_solution(self.d, self.C)
+        for operator_strategy in [LSOPT.FIRST_ACCEPT, LSOPT.BEST_ACCEPT]:
+            ls_sol = do_local_search(
+                [do_1point_move, do_2point_move, do_2optstar_move], sol,
+                self.D, self.d, self.C, operator_strategy=operator_strategy,
+                prune_route_combinations=True)
+            self.assertTrue(all(validate_solution_feasibility(
+                ls_sol, self.D, self.d, self.C)))
+            self.assertLess(objf(ls_sol, self.D), objf(sol, self.D))
+        
 if __name__=="__main__":
     
     if __debug__:
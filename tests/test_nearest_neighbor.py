@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+""" This file implements tests checking that the lazily filled nearest
+neighbor queues give the neighbors in the same order as sorting the entire
+row of the distance matrix.
+"""
+###############################################################################
+
+# Written in Python 2.7, but try to maintain Python 3+ compatibility
+from __future__ import print_function
+from __future__ import division
+
+import unittest
+from operator import itemgetter
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from verypy.cvrp_io import calculate_D
+from verypy.cvrp_ops import D2D_c
+from verypy.classic_heuristics.nearest_neighbor import nearest_neighbor_init,\
+    _NearestNeighborQueue
+
+class TestNearestNeighborQueues(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(1)
+        # integer coordinates produce many ties
+        self.points = np.random.randint(0, 20, (80,2)).astype(float)
+
+    def _check_queue_order(self, D, kdtree):
+        for i in range(len(D)):
+            expected = sorted(enumerate(D[i][:]), key=itemgetter(1))
+            queue = _NearestNeighborQueue(i, D, kdtree)
+            popped = [queue.popleft() for _ in range(len(D))]
+            self.assertEqual(len(queue), 0)
+            self.assertEqual([n for n, _ in popped], [n for n, _ in expected])
+            self.assertEqual([dist for _, dist in popped],
+                             [dist for _, dist in expected])
+            with self.assertRaises(IndexError):
+                queue.peekleft()
+
+    def test_same_order_as_sorted(self):
+        for wtt in ["EUC_2D", "EXACT_2D", "CEIL_2D"]:
+            D = calculate_D(self.points, None, wtt)
+            self._check_queue_order(D, None)
+            self._check_queue_order(D, cKDTree(self.points))
+            # also with the depot and the node itself not following the
+            #  Euclidean distance
+            D_c = D2D_c(D, 3)
+            self._check_queue_order(D_c, cKDTree(self.points))
+
+    def test_peek_from_both_ends(self):
+        D = calculate_D(self.points)
+        queue = _NearestNeighborQueue(5, D, cKDTree(self.points))
+        expected = sorted(enumerate(D[5][:]), key=itemgetter(1))
+        self.assertEqual(queue.popleft(), expected[0])
+        self.assertEqual(queue[3], expected[4])
+        self.assertEqual(queue.popright(), expected[-1])
+        self.assertEqual(queue.peekright(), expected[-2])
+        self.assertEqual(len(queue), len(D)-2)
+
+    def test_with_points(self):
+        D = calculate_D(self.points, None, "EUC_2D")
+        d = [0]+[1]*(len(D)-1)
+        for k in [1, 3]:
+            for init in ["farthest", "closest", "nearest"]:
+                self.assertEqual(
+                    nearest_neighbor_init(D, d, 10, emerging_route_count=k,
+                                          initialize_routes_with=init),
+                    nearest_neighbor_init(D, d, 10, emerging_route_count=k,
+                                          initialize_routes_with=init,
+                                          points=self.points))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+""" This file implements tests checking that an interrupt (Ctrl-C) during the
+local search post-optimization of the VeRyPy CLI gives the solution of the
+construction heuristic, and that it never escapes a parallel solve task.
+"""
+###############################################################################
+
+# Written in Python 2.7, but try to maintain Python 3+ compatibility
+from __future__ import print_function
+from __future__ import division
+
+import os
+import sys
+import unittest
+from functools import partial
+from threading import Event
+from tempfile import mkstemp
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+import verypy.VeRyPy as VeRyPy
+import verypy.cvrp_ops as cvrp_ops
+from verypy.classic_heuristics.parallel_savings import get_ps_algorithm
+
+EXAMPLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, "examples")
+
+def _interrupting_move(route, D, strategy=None, best_delta=None):
+    raise KeyboardInterrupt()
+
+class TestInterruptedLocalSearch(unittest.TestCase):
+    def setUp(self):
+        self.pfn = os.path.join(EXAMPLES_PATH, "E-n51-k5.vrp")
+        self.problem = VeRyPy._read_problem(self.pfn, cache_dir=None)
+        _, _, self.algo_f = get_ps_algorithm()
+        
+        VeRyPy._worker_stop_event = Event()
+        VeRyPy._worker_problem_cache.clear()
+        VeRyPy._worker_problem_cache[self.pfn] = self.problem
+        VeRyPy._worker_algorithm_cache["ps"] = self.algo_f
+    
+    def tearDown(self):
+        VeRyPy._worker_stop_event = None
+        VeRyPy._worker_problem_cache.clear()
+        VeRyPy._worker_algorithm_cache.clear()
+    
+    def test_construction_solution_is_returned(self):
+        N, points, d, D, D_c, C, L, st, ewt = self.problem
+        expected = cvrp_ops.normalize_solution(
+            self.algo_f(points, D_c, d, C, L, st, ewt, False, False))
+        
+        result = VeRyPy._solve_problem(self.problem, self.algo_f,
+                                       [_interrupting_move], False, False)
+        self.assertTrue(result.interrupted)
+        self.assertEqual(result.sol, expected)
+        self.assertIsNone(result.pre_ls_sol_q)
+        self.assertTrue(result.feasible)
+    
+    def test_interrupt_does_not_escape_the_task(self):
+        solve_args = ([_interrupting_move], False, False, False, False)
+        task = (self.pfn, "ps", None, None, solve_args, False)
+        result = VeRyPy._solve_task(task)
+        self.assertTrue(result.interrupted)
+        self.assertIsNotNone(result.sol)
+        self.assertTrue(VeRyPy._worker_stop_event.is_set())
+        self.assertFalse(VeRyPy._worker_is_solving)
+        
+        # the rest of the tasks are not started
+        self.assertIsNone(VeRyPy._solve_task(task))
+    
+    def test_interrupt_after_the_local_search(self):
+        def interrupting_validation(*args, **kwargs):
+            raise KeyboardInterrupt()
+        original_validation = cvrp_ops.validate_solution_feasibility
+        try:
+            cvrp_ops.validate_solution_feasibility = interrupting_validation
+            result = VeRyPy._solve_task((self.pfn, "ps", None, None,
+                                         (None, False, False, False, False),
+                                         False))
+        finally:
+            cvrp_ops.validate_solution_feasibility = original_validation
+        self.assertTrue(result.interrupted)
+        self.assertTrue(VeRyPy._worker_stop_event.is_set())
+
+class TestParallelSolve(unittest.TestCase):
+    def setUp(self):
+        # the (forked) workers and the main process must not write to the
+        #  real problem cache
+        self.original_read_problem = VeRyPy._read_problem
+        VeRyPy._read_problem = partial(self.original_read_problem,
+                                       cache_dir=None)
+        fd, self.list_fn = mkstemp(suffix=".txt")
+        with os.fdopen(fd, "w") as list_file:
+            list_file.write(os.path.join(EXAMPLES_PATH, "example.vrp")+"\n")
+            list_file.write(os.path.join(EXAMPLES_PATH, "E-n51-k5.vrp")+"\n")
+        self.problem_args = ["-a", "ps", "-a", "gm", self.list_fn]
+    
+    def tearDown(self):
+        VeRyPy._read_problem = self.original_read_problem
+        os.remove(self.list_fn)
+    
+    def _main_output(self, args):
+        original_stdout = sys.stdout
+        try:
+            sys.stdout = StringIO()
+            VeRyPy.main(args)
+            return sys.stdout.getvalue().splitlines()
+        finally:
+            sys.stdout = original_stdout
+    
+    def test_same_results_as_sequential(self):
+        sequential = self._main_output(self.problem_args)
+        parallel = self._main_output(self.problem_args+["--jobs", "2"])
+        self.assertEqual(parallel, sequential)
+        # the collected results table is printed at the end
+        self.assertTrue(sequential[-3].startswith("instance"))
+    
+    def test_same_minimal_output_rows_as_sequential(self):
+        def without_time(rows):
+            return [row.rsplit(";",1)[0] for row in rows]
+        sequential = self._main_output(self.problem_args+["-m"])
+        parallel = self._main_output(self.problem_args+["-m", "--jobs", "2"])
+        self.assertEqual(len(sequential), 5)
+        self.assertEqual(without_time(parallel), without_time(sequential))
+
+if __name__ == '__main__':
+    unittest.main()
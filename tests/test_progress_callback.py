@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+""" This file implements tests checking that the algorithms report their
+improving solutions to the progress_callback, and that the last reported
+solution is as good as the solution the algorithm returns.
+"""
+###############################################################################
+
+# Written in Python 2.7, but try to maintain Python 3+ compatibility
+from __future__ import print_function
+from __future__ import division
+
+import unittest
+import random
+
+import numpy as np
+
+from verypy import get_algorithms
+from verypy.cvrp_io import generate_CVRP
+from verypy.cvrp_ops import validate_solution_feasibility
+from verypy.util import objf, progress_reporter
+
+class TestProgressCallback(unittest.TestCase):
+    def setUp(self):
+        random.seed(1)
+        np.random.seed(1)
+        _, self.points, _, self.d, self.D, self.C, _ = \
+            generate_CVRP(40, 10.0, 5.0, 2.0)
+        self.reported = []
+    
+    def _record(self, sol, sol_f, sol_K, elapsed):
+        self.reported.append((list(sol), sol_f, sol_K, elapsed))
+    
+    def test_only_improvements_are_reported(self):
+        report = progress_reporter(self._record, minimize_K=False)
+        for sol_f, sol_K in [(10.0, 3), (12.0, 2), (9.0, 4), (9.0, 3)]:
+            report([0,1,0], sol_f, sol_K)
+        self.assertEqual([(f, K) for _, f, K, _ in self.reported],
+                         [(10.0, 3), (9.0, 4)])
+        
+        self.reported = []
+        report = progress_reporter(self._record, minimize_K=True)
+        for sol_f, sol_K in [(10.0, 3), (12.0, 2), (9.0, 4), (11.0, 2)]:
+            report([0,1,0], sol_f, sol_K)
+        self.assertEqual([(f, K) for _, f, K, _ in self.reported],
+                         [(10.0, 3), (12.0, 2), (11.0, 2)])
+        
+        # nothing to report to, or nothing to report
+        progress_reporter(None)([0,1,0], 1.0, 1)
+        progress_reporter(self._record)(None, 1.0, 1)
+        self.assertEqual(len(self.reported), 3)
+    
+    def test_algorithms_report_progress(self):
+        for algo_name in ["swp", "cmt"]:
+            for minimize_K in [False, True]:
+                self.reported = []
+                _, _, _, call_init = get_algorithms(algo_name)[0]
+                sol = call_init(self.points, self.D, self.d, self.C, None,
+                                None, "EXACT_2D", False, minimize_K,
+                                progress_callback=self._record)
+                msg = "%s (minimize_K=%s)"%(algo_name, minimize_K)
+                self.assertTrue(len(self.reported)>0, msg)
+                for rsol, _, rsol_K, _ in self.reported:
+                    self.assertTrue(all(validate_solution_feasibility(
+                        rsol, self.D, self.d, self.C)), msg)
+                    self.assertEqual(rsol.count(0)-1, rsol_K, msg)
+                elapsed = [e for _, _, _, e in self.reported]
+                self.assertEqual(elapsed, sorted(elapsed), msg)
+                self.assertAlmostEqual(self.reported[-1][1],
+                                       objf(sol, self.D), msg=msg)
+                
+                # the solution does not depend on the callback
+                self.assertEqual(sol, call_init(self.points, self.D, self.d,
+                    self.C, None, None, "EXACT_2D", False, minimize_K))
+
+if __name__ == '__main__':
+    unittest.main()
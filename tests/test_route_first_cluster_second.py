@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+""" This file implements tests checking that the giant tour is split optimally
+into routes by the route-first-cluster-second heuristic.
+"""
+###############################################################################
+
+# Written in Python 2.7, but try to maintain Python 3+ compatibility
+from __future__ import print_function
+from __future__ import division
+
+import unittest
+import random
+
+import numpy as np
+
+from verypy.cvrp_io import generate_CVRP
+from verypy.cvrp_ops import validate_solution_feasibility
+from verypy.classic_heuristics.rfcs import _giant_tour_route_costs,\
+    _split_giant_tour, route_first_cluster_second_init
+from verypy.util import objf
+
+def _brute_force_split_cost(route_costs):
+    """ Tries all the ways to cut the cyclic giant tour into routes. """
+    horizon, n = route_costs.shape
+    best_cost = np.inf
+    for cuts in range(1, 2**n):
+        route_starts = [u for u in range(n) if cuts&(1<<u)]
+        cost = 0.0
+        for start, next_start in zip(route_starts,
+                                     route_starts[1:]+[route_starts[0]+n]):
+            b = next_start-start
+            cost += route_costs[b-1, start] if b<=horizon else np.inf
+        best_cost = min(best_cost, cost)
+    return best_cost
+
+class TestGiantTourSplit(unittest.TestCase):
+    def setUp(self):
+        random.seed(1)
+        np.random.seed(1)
+
+    def test_split_is_optimal(self):
+        for trial in range(20):
+            _, _, _, d, D, C, _ = generate_CVRP(9, 10.0, 4.0, 3.0)
+            giant_tour = list(range(1, len(D)))
+            random.shuffle(giant_tour)
+            L = None if trial%2==0 else 2*np.max(D[0])+np.median(D)
+            route_costs = _giant_tour_route_costs(D, d, C, L, giant_tour, 0.0)
+
+            partition = _split_giant_tour(route_costs)
+            covered = sorted((u+i)%len(giant_tour)
+                             for u, b in partition for i in range(b))
+            self.assertEqual(covered, list(range(len(giant_tour))))
+            split_cost = sum(route_costs[b-1, u] for u, b in partition)
+            self.assertAlmostEqual(split_cost,
+                                   _brute_force_split_cost(route_costs))
+
+    def test_route_costs_in_giant_tour_order(self):
+        _, _, _, d, D, C, _ = generate_CVRP(9, 10.0, 4.0, 3.0)
+        giant_tour = list(range(1, len(D)))
+        route_costs = _giant_tour_route_costs(D, d, C, None, giant_tour, 0.0)
+        for b in range(1, len(route_costs)+1):
+            for u in range(len(giant_tour)):
+                route = [0]+[giant_tour[(u+i)%len(giant_tour)]
+                             for i in range(b)]+[0]
+                if sum(d[n] for n in route)<=C or b==1:
+                    self.assertAlmostEqual(route_costs[b-1,u],objf(route,D))
+                else:
+                    self.assertEqual(route_costs[b-1,u], np.inf)
+
+    def test_giant_tour_order_partitioning(self):
+        _, _, _, d, D, C, _ = generate_CVRP(40, 10.0, 4.0, 3.0)
+        L = 3*np.max(D[0])
+        sol = route_first_cluster_second_init(D, d, C, L,
+                                              partition_tsp_opt_algo=None)
+        self.assertTrue(all(validate_solution_feasibility(sol, D, d, C, L)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+""" This file implements tests checking that the NumPy savings calculations
+give the savings in the same order as the original sorted lists of savings
+tuples.
+"""
+###############################################################################
+
+# Written in Python 2.7, but try to maintain Python 3+ compatibility
+from __future__ import print_function
+from __future__ import division
+
+import unittest
+from random import randint
+
+import numpy as np
+
+from verypy.classic_heuristics.parallel_savings import \
+    clarke_wright_savings_function, lazy_sorted_savings, \
+    upper_triangle_savings, _clarke_wright_row_savings
+from verypy.classic_heuristics.suppression_savings import \
+    supression_savings_function
+from verypy.classic_heuristics.gaskell_savings import \
+    gaskell_lambda_savings_function, gaskell_pi_savings_function
+from verypy.classic_heuristics.paessens_savings import \
+    paessens_savings_function, paessens_savings_terms
+
+def _sorted_savings_list(D, savings_f):
+    N = len(D)
+    savings = []
+    for i in range(1,N):
+        for j in range(i+1,N):
+            savings.append( (savings_f(D,i,j),-D[i,j],i,j) )
+    savings.sort(reverse=True)
+    return savings
+
+def _random_symmetric_D(N, integer):
+    # small integer distances to produce many ties
+    M = np.random.randint(0, 6, (N,N)) if integer else np.random.rand(N,N)
+    return M+M.T
+
+class TestLazySavings(unittest.TestCase):
+    def test_clarke_wright_savings(self):
+        cw_f = lambda D,i,j: D[i,0]+D[0,j]-D[i,j]
+        for N in [1, 2, 3, 10, 40]:
+            for integer in [True, False]:
+                D = _random_symmetric_D(N, integer)
+                self.assertEqual(list(clarke_wright_savings_function(D)),
+                                 _sorted_savings_list(D, cw_f))
+
+    def test_chunks(self):
+        cw_f = lambda D,i,j: D[i,0]+D[0,j]-D[i,j]
+        D = _random_symmetric_D(30, True)
+        savings_arrays = upper_triangle_savings(D, _clarke_wright_row_savings)
+        for _ in range(10):
+            self.assertEqual(
+                list(lazy_sorted_savings(*savings_arrays,
+                                         chunk_size=randint(1,50))),
+                _sorted_savings_list(D, cw_f))
+
+    def test_gaskell_savings(self):
+        pi_f = lambda D,i,j: D[i,0]+D[0,j]-2*D[i,j]
+        for N in [2, 3, 10, 40]:
+            for integer in [True, False]:
+                D = _random_symmetric_D(N, integer)
+                d_avg = np.average(D)
+                lambda_f = lambda D,i,j: (D[i,0]+D[0,j]-D[i,j])*\
+                                         (d_avg+abs(D[0,i]-D[0,j])-D[i,j])
+                self.assertEqual(list(gaskell_lambda_savings_function(D)),
+                                 _sorted_savings_list(D, lambda_f))
+                self.assertEqual(list(gaskell_pi_savings_function(D)),
+                                 _sorted_savings_list(D, pi_f))
+
+    def test_paessens_savings(self):
+        for integer in [True, False]:
+            D = _random_symmetric_D(30, integer)
+            # the terms are shared between the (g,f) parameter combinations
+            savings_terms = paessens_savings_terms(D)
+            for g in np.linspace(0.8, 2.0, num=7):
+                for f in [0.0, 0.3, 1.0]:
+                    gf_f = lambda D,i,j: D[i,0]+D[0,j]-g*D[i,j]+\
+                                         f*abs(D[i,0]-D[0,j])
+                    expected = _sorted_savings_list(D, gf_f)
+                    self.assertEqual(
+                        list(paessens_savings_function(D, g, f)), expected)
+                    self.assertEqual(
+                        list(paessens_savings_function(D, g, f,
+                                                       savings_terms)),
+                        expected)
+
+    def test_suppression_savings(self):
+        D = _random_symmetric_D(20, True)
+        suppressed = set()
+        savings_cache = []
+        for _ in range(30):
+            expected_suppressed = set(suppressed)
+            # the suppressed merges have a savings value of 0
+            suppression_f = lambda D,i,j: 0 if (i,j) in expected_suppressed\
+                                          else max(0, D[i,0]+D[0,j]-D[i,j])
+            expected = _sorted_savings_list(D, suppression_f)
+            savings = list(supression_savings_function(D, suppressed,
+                                                       savings_cache))
+            self.assertEqual(savings, expected)
+            # the best merge is suppressed on the next call
+            expected_suppressed.add( tuple(expected[0][2:]) )
+            self.assertEqual(suppressed, expected_suppressed)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+""" This file implements tests checking that the solution cache is keyed by
+all of the problem data and the solve options, and that the least recently
+used solutions are removed when the cache grows too large.
+"""
+###############################################################################
+
+# Written in Python 2.7, but try to maintain Python 3+ compatibility
+from __future__ import print_function
+from __future__ import division
+
+import os
+import shutil
+import unittest
+from tempfile import mkdtemp
+
+import numpy as np
+
+import verypy
+from verypy import algo_name_aliases, get_algorithms
+import verypy.VeRyPy as VeRyPy
+import verypy.cvrp_io as cvrp_io
+import verypy.shared_cli as shared_cli
+from verypy.cvrp_io import generate_CVRP
+from verypy.solution_cache import SolutionCache, solution_cache_key
+from verypy.classic_heuristics.parallel_savings import get_ps_algorithm
+
+EXAMPLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, "examples")
+
+class TestSolutionCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = mkdtemp()
+        _, self.points, _, self.d, self.D, self.C, _ = \
+            generate_CVRP(10, 10.0, 5.0, 2.0)
+        self.key_args = [self.points, self.D, self.d, self.C, None, None,
+                         "ps", False, False]
+    
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        
+    def test_key_covers_all_arguments(self):
+        key = solution_cache_key(*self.key_args)
+        self.assertEqual(key, solution_cache_key(*self.key_args))
+        D2 = self.D.copy()
+        D2[1,2]+=1.0
+        d2 = list(self.d)
+        d2[3]+=1.0
+        for i, changed in enumerate([self.points[::-1], D2, d2, self.C+1, 
+                                     100.0, 2.0, "ss", True, True]):
+            changed_args = list(self.key_args)
+            changed_args[i] = changed
+            self.assertNotEqual(key, solution_cache_key(*changed_args))
+        # the number types do not matter
+        changed_args = list(self.key_args)
+        changed_args[3] = np.int64(self.C)
+        self.assertEqual(key, solution_cache_key(*changed_args))
+        
+        # the solutions of the other VeRyPy versions are not used
+        original_version = verypy.__version__
+        try:
+            verypy.__version__ = original_version+".dev0"
+            self.assertNotEqual(key, solution_cache_key(*self.key_args))
+        finally:
+            verypy.__version__ = original_version
+        
+    def test_get_and_put(self):
+        cache = SolutionCache(self.tmp_dir)
+        key = solution_cache_key(*self.key_args)
+        self.assertIsNone(cache.get(key))
+        cache.put(key, [0,1,2,0,3,0])
+        self.assertEqual(cache.get(key), [0,1,2,0,3,0])
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        
+        disabled_cache = SolutionCache(None)
+        disabled_cache.put(key, [0,1,0])
+        self.assertIsNone(disabled_cache.get(key))
+    
+    def test_least_recently_used_are_removed(self):
+        cache = SolutionCache(self.tmp_dir)
+        cache.put("a", [0,1,2,3,0])
+        file_size = os.path.getsize(os.path.join(self.tmp_dir, "a.json"))
+        cache.max_size = 2*file_size
+        cache.put("b", [0,3,2,1,0])
+        # make sure "a" is older than "b" and then use it
+        os.utime(os.path.join(self.tmp_dir, "a.json"), (0, 0))
+        cache.get("a")
+        os.utime(os.path.join(self.tmp_dir, "b.json"), (1, 1))
+        cache.put("c", [0,2,1,3,0])
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("c"))
+    
+    def test_read_and_solve_a_problem(self):
+        pfn = os.path.join(EXAMPLES_PATH, "E-n51-k5.vrp")
+        _, _, call_init = get_ps_algorithm()
+        caches = []
+        def temporary_cache():
+            caches.append(SolutionCache(self.tmp_dir))
+            return caches[-1]
+        # also the compiled problem must not go to the real problem cache
+        original_read = cvrp_io.read_compiled_CVRP
+        def read_with_temporary_cache(file_name):
+            return original_read(file_name, cache_dir=self.tmp_dir)
+        original_cache = shared_cli.SolutionCache
+        try:
+            shared_cli.SolutionCache = temporary_cache
+            cvrp_io.read_compiled_CVRP = read_with_temporary_cache
+            solved = shared_cli.read_and_solve_a_problem(
+                pfn, call_init, False, algorithm_abbreviation="ps")
+            cached = shared_cli.read_and_solve_a_problem(
+                pfn, call_init, False, algorithm_abbreviation="ps")
+            self.assertEqual(cached[:3], solved[:3])
+            self.assertEqual(caches[1].hits, 1)
+            
+            shared_cli.read_and_solve_a_problem(
+                pfn, call_init, False, algorithm_abbreviation="ps",
+                use_cache=False)
+            self.assertEqual(caches[2].hits+caches[2].misses, 0)
+        finally:
+            shared_cli.SolutionCache = original_cache
+            cvrp_io.read_compiled_CVRP = original_read
+
+    def test_runner_use_cache(self):
+        pfn = os.path.join(EXAMPLES_PATH, "E-n51-k5.vrp")
+        problem = VeRyPy._read_problem(pfn, cache_dir=None)
+        _, _, algo_f = get_ps_algorithm()
+        caches = []
+        def temporary_cache():
+            caches.append(SolutionCache(self.tmp_dir))
+            return caches[-1]
+        original_cache = VeRyPy.SolutionCache
+        try:
+            VeRyPy.SolutionCache = temporary_cache
+            uncached = VeRyPy._solve_problem(problem, algo_f, None, False,
+                                             False)
+            self.assertEqual(len(caches), 0)
+            solved = VeRyPy._solve_problem(problem, algo_f, None, False,
+                                           False, cache_as="ps")
+            cached = VeRyPy._solve_problem(problem, algo_f, None, False,
+                                           False, cache_as="ps")
+        finally:
+            VeRyPy.SolutionCache = original_cache
+        self.assertFalse(uncached.from_cache)
+        self.assertFalse(solved.from_cache)
+        self.assertTrue(cached.from_cache)
+        self.assertEqual(caches[1].hits, 1)
+        self.assertEqual(cached.sol, solved.sol)
+        self.assertEqual(cached.sol, uncached.sol)
+
+    def test_cli_names_are_abbreviated(self):
+        # the CLI caches the solutions with the same key as the web GUI
+        for abbreviation, name, _, _ in get_algorithms('all'):
+            self.assertEqual(algo_name_aliases[name.lower()], abbreviation)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+""" This file implements tests checking that the SolveJobPool of the web GUI
+server runs the jobs to completion, reuses the worker of a cancelled job, and
+fails the job (and replaces the worker) if the worker crashes or its result
+cannot be received. Also, a solve cancelled while sending an improving
+solution must not cut the message.
+"""
+###############################################################################
+
+# Written in Python 2.7, but try to maintain Python 3+ compatibility
+from __future__ import print_function
+from __future__ import division
+
+import os
+import sys
+import pickle
+import signal
+import shutil
+import unittest
+from time import time
+from tempfile import mkdtemp
+
+import numpy as np
+
+if sys.version_info[0] >= 3:
+    import verypy.gui.backend.server as server
+    from verypy.gui.backend.server import SolveJobPool, read_problem
+
+JOB_TIMEOUT = 60.0
+
+class _UnreadableConnection(object):
+    """ Wraps a worker connection so that the result cannot be unpickled. """
+    def __init__(self, conn):
+        self._conn = conn
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+    def recv(self):
+        self._conn.recv()
+        raise pickle.UnpicklingError("truncated message")
+
+class _InterruptedWhileSendingConnection(object):
+    """ Gets a SIGINT (a cancel) in the middle of sending each message. """
+    def __init__(self):
+        self.started = 0
+        self.sent = []
+    def send(self, message):
+        self.started += 1
+        os.kill(os.getpid(), signal.SIGINT)
+        self.sent.append(message)
+
+def _random_problem(N, algorithm):
+    np.random.seed(1)
+    return read_problem({
+        'coordinates': (np.random.rand(N+1, 2)*1000).tolist(),
+        'customer_demands': [0]+[1]*N,
+        'capacity': 10,
+        'algorithm': algorithm,
+        'use_cache': False})
+
+@unittest.skipIf(sys.version_info[0] < 3, "the GUI server requires Python 3")
+class TestSolveJobPool(unittest.TestCase):
+    def setUp(self):
+        # the workers must not use the real solution cache
+        self.tmp_dir = mkdtemp()
+        self.original_home = os.environ.get('HOME')
+        os.environ['HOME'] = self.tmp_dir
+        self.pool = SolveJobPool(workers=1)
+        
+    def tearDown(self):
+        self.pool.close()
+        if self.original_home is None:
+            del os.environ['HOME']
+        else:
+            os.environ['HOME'] = self.original_home
+        shutil.rmtree(self.tmp_dir)
+        
+    def _wait_until_finished(self, job_id):
+        job, _, _ = self.pool.wait_for_progress(job_id, timeout=0)
+        start = time()
+        while job['finished'] is None and time()-start<JOB_TIMEOUT:
+            job, _, _ = self.pool.wait_for_progress(job_id, timeout=1.0)
+        self.assertIsNotNone(job['finished'], "the job did not finish")
+        return job
+    
+    def _wait_until_solving(self, job_id):
+        # the first improving solution tells that the algorithm is running
+        job, seq, progress = self.pool.wait_for_progress(
+            job_id, timeout=JOB_TIMEOUT)
+        self.assertEqual(job['status'], 'running')
+        self.assertEqual(seq, 1)
+        return progress
+    
+    def test_submitted_job_is_done(self):
+        job = self.pool.submit(_random_problem(30, 'ps'))
+        self.assertEqual(job['status'], 'queued')
+        job = self._wait_until_finished(job['job_id'])
+        self.assertEqual(job['status'], 'done')
+        self.assertIsNone(job['error'])
+        self.assertEqual(sorted(n for r in job['result']['routes'] for n in r
+                                if n!=0), list(range(1, 31)))
+        self.assertEqual(self.pool.get(job['job_id'])['status'], 'done')
+        self.assertIsNone(self.pool.get("0123abc"))
+        
+    def test_cancelled_worker_is_reused(self):
+        pid = self.pool._workers[0].process.pid
+        job = self.pool.submit(_random_problem(2000, 'swp'))
+        self._wait_until_solving(job['job_id'])
+        self.pool.cancel(job['job_id'])
+        job = self._wait_until_finished(job['job_id'])
+        self.assertEqual(job['status'], 'cancelled')
+        # the best solution so far is given
+        self.assertIsNotNone(job['result'])
+        
+        job = self.pool.submit(_random_problem(30, 'ps'))
+        self.assertEqual(self._wait_until_finished(job['job_id'])['status'],
+                         'done')
+        self.assertEqual(self.pool._workers[0].process.pid, pid)
+        
+    def test_crashed_worker_fails_the_job(self):
+        pid = self.pool._workers[0].process.pid
+        job = self.pool.submit(_random_problem(2000, 'swp'))
+        self._wait_until_solving(job['job_id'])
+        os.kill(pid, signal.SIGKILL)
+        job = self._wait_until_finished(job['job_id'])
+        self.assertEqual(job['status'], 'failed')
+        self.assertIsNotNone(job['error'])
+        
+        # the worker is replaced
+        self.assertNotEqual(self.pool._workers[0].process.pid, pid)
+        job = self.pool.submit(_random_problem(30, 'ps'))
+        self.assertEqual(self._wait_until_finished(job['job_id'])['status'],
+                         'done')
+    
+    def test_unreadable_result_fails_the_job(self):
+        with self.pool._lock:
+            worker = self.pool._workers[0]
+            worker.conn = _UnreadableConnection(worker.conn)
+        job = self.pool.submit(_random_problem(30, 'ps'))
+        job = self._wait_until_finished(job['job_id'])
+        self.assertEqual(job['status'], 'failed')
+        self.assertIn("truncated message", job['error'])
+        
+        # the dispatcher is still running
+        self.assertIsNot(self.pool._workers[0], worker)
+        job = self.pool.submit(_random_problem(30, 'ps'))
+        self.assertEqual(self._wait_until_finished(job['job_id'])['status'],
+                         'done')
+
+@unittest.skipIf(sys.version_info[0] < 3, "the GUI server requires Python 3")
+class TestCancelWhileSendingProgress(unittest.TestCase):
+    def setUp(self):
+        self.original_handler = signal.signal(signal.SIGINT,
+                                              server._interrupt_if_solving)
+    
+    def tearDown(self):
+        signal.signal(signal.SIGINT, self.original_handler)
+    
+    def test_cancelled_after_the_message(self):
+        conn = _InterruptedWhileSendingConnection()
+        status, response_data = server.solve_problem(
+            _random_problem(200, 'swp'),
+            lambda progress: server._send_progress(conn, progress))
+        # the message was sent in full before the solve was cancelled
+        self.assertEqual(conn.started, 1)
+        self.assertEqual(len(conn.sent), 1)
+        self.assertEqual(conn.sent[0][0], 'progress')
+        self.assertEqual(status, 'cancelled')
+        self.assertIsNotNone(response_data)
+        self.assertEqual(response_data['objective'],
+                         conn.sent[0][1]['objective'])
+        self.assertFalse(server._worker_is_solving)
+        self.assertFalse(server._worker_interrupt_pending)
+
+if __name__ == '__main__':
+    unittest.main()
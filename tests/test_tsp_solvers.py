@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+""" This file implements tests for the helpers of the TSP solvers that are
+used to route the customers of a single route.
+"""
+###############################################################################
+
+# Written in Python 2.7, but try to maintain Python 3+ compatibility
+from __future__ import print_function
+from __future__ import division
+
+import unittest
+from itertools import permutations
+
+
+from verypy.cvrp_io import generate_CVRP
+from verypy.tsp_solvers.tsp_solver_ropt import solve_tsp_3opt
+from verypy.tsp_solvers.tsp_cache import RouteTSPCache
+from verypy.tsp_solvers.tsp_path import solve_path_tsp
+from verypy.util import objf
+from verypy.classic_heuristics.sweep import sweep_init
+
+class TestRouteTSPCache(unittest.TestCase):
+    def setUp(self):
+        _, self.pts, _, self.d, self.D, self.C, _ = \
+            generate_CVRP(30, 10, 5, 2)
+        self.tsp_calls = []
+
+    def _counting_tsp(self, D, selected_idxs):
+        self.tsp_calls.append(list(selected_idxs))
+        return solve_tsp_3opt(D, selected_idxs)
+
+    def test_same_node_set_is_solved_once(self):
+        cache = RouteTSPCache(self._counting_tsp)
+        route, cost = cache(self.D, [0,3,5,7])
+        self.assertEqual((route, cost), solve_tsp_3opt(self.D, [0,3,5,7]))
+
+        # the order does not matter, but the end point does
+        self.assertEqual(cache(self.D, [0,7,3,5]), (route, cost))
+        self.assertEqual(cache(self.D, [0,5,7,3,0]), (route, cost))
+        self.assertEqual(len(self.tsp_calls), 1)
+        cache(self.D, [3,0,5,7])
+        self.assertEqual(len(self.tsp_calls), 2)
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+
+        # modifying the returned route must not affect the cached one
+        route.reverse()
+        self.assertNotEqual(cache(self.D, [0,3,5,7])[0], route)
+
+    def test_order_is_respected(self):
+        cache = RouteTSPCache(self._counting_tsp, ignore_order=False)
+        cache(self.D, [0,3,5,7])
+        cache(self.D, [0,3,5,7])
+        cache(self.D, [0,7,3,5])
+        self.assertEqual(len(self.tsp_calls), 2)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_least_recently_used_are_dropped(self):
+        cache = RouteTSPCache(self._counting_tsp, max_size=2)
+        cache(self.D, [0,1,2])
+        cache(self.D, [0,3,4])
+        cache(self.D, [0,1,2])
+        cache(self.D, [0,5,6])
+        self.assertEqual(len(cache), 2)
+        cache(self.D, [0,1,2])
+        self.assertEqual(len(self.tsp_calls), 3)
+        cache(self.D, [0,3,4])
+        self.assertEqual(len(self.tsp_calls), 4)
+
+    def test_sweep_solves_each_route_once(self):
+        sweep_init(self.pts, self.D, self.d, self.C,
+                   routing_algo=self._counting_tsp)
+        # the node order is respected to keep the sweeps independent
+        solved = [tuple(nodes) for nodes in self.tsp_calls]
+        self.assertEqual(len(solved), len(set(solved)))
+
+        # the cache can also be given directly
+        self.tsp_calls = []
+        cache = RouteTSPCache(self._counting_tsp)
+        sweep_init(self.pts, self.D, self.d, self.C, routing_algo=cache)
+        self.assertEqual(len(self.tsp_calls), cache.misses)
+        self.assertTrue(cache.hits>0)
+
+class TestPathTSP(unittest.TestCase):
+    def setUp(self):
+        _, _, _, _, self.D, _, _ = generate_CVRP(12, 10, 5, 2)
+        self.D.flags.writeable = False
+
+    def test_end_points_are_fixed(self):
+        for from_node, to_node in [(0,5), (5,0), (3,8)]:
+            through_nodes = [n for n in range(1,9) if n not in
+                             (from_node, to_node)]
+            path, cost = solve_path_tsp(self.D, from_node, to_node,
+                                        through_nodes)
+            self.assertEqual(path[0], from_node)
+            self.assertEqual(path[-1], to_node)
+            self.assertEqual(sorted(path[1:-1]), sorted(through_nodes))
+            self.assertAlmostEqual(cost, objf(path, self.D))
+
+            # 3-opt should find the shortest path for so few nodes
+            shortest = min(objf([from_node]+list(p)+[to_node], self.D)
+                           for p in permutations(through_nodes[:5]))
+            _, cost = solve_path_tsp(self.D, from_node, to_node,
+                                     through_nodes[:5])
+            self.assertAlmostEqual(cost, shortest)
+
+    def test_degenerate_paths(self):
+        self.assertEqual(solve_path_tsp(self.D, 2, 3, []),
+                         ([2,3], self.D[2,3]))
+        path, cost = solve_path_tsp(self.D, 0, 0, [4,2,6])
+        self.assertEqual((path[0], path[-1]), (0, 0))
+        self.assertEqual(cost, objf(path, self.D))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -13,18 +13,22 @@ from __future__ import division
 
 import sys
 import pickle
+import signal
 from argparse import ArgumentParser
 from os import path
 from time import time
-from collections import defaultdict
+from collections import defaultdict, namedtuple
+from multiprocessing import Pool, Event
 import numpy as np
 
 from verypy import algo_name_aliases
 from verypy import get_algorithms
+from verypy.config import PROBLEM_CACHE_DIR
 
 import verypy.cvrp_io as cvrp_io
 import verypy.cvrp_ops as cvrp_ops
 import verypy.shared_cli as shared_cli
+from verypy.solution_cache import SolutionCache, solution_cache_key
 import verypy.classic_heuristics as classic_heuristics
 
 from verypy.local_search import do_local_search
@@ -54,6 +58,249 @@ def _build_algorithm_help():
         htxt+=key+" : "+algo_name+" : "+algo_desc+"\n"
     return htxt
 
+# pre_ls_sol_q is the quality before an improving post-optimization (or None)
+SolveResult = namedtuple('SolveResult', ['sol', 'sol_q', 'sol_K', 'pre_ls_sol_q',
+                                         'elapsed_t', 'feasible',
+                                         'interrupted', 'error', 'from_cache'])
+
+def _read_problem(pfn, dist_weight_format=None, cache_dir=PROBLEM_CACHE_DIR):
+    """ Reads the problem from a .vrp/.tsp/.pickle file and returns it as a
+    tuple (N, points, d, D, D_c, C, L, st, ewt), where D_c has the service
+    times baked in. The TSPLIB files are read through the compiled problem
+    cache in cache_dir (None disables the cache). """
+    if path.splitext(pfn)[1].lower()==".pickle":
+        with open(pfn, "rb") as fh:
+            N, points, dd_points, d, D, C, ewt, K, L, st = pickle.load(fh)
+    else:
+        # parsed only once, later reads memory map D from the compiled file
+        (N, points, dd_points, d, D, C, ewt), (K, L, st) = \
+            cvrp_io.read_compiled_CVRP(pfn, cache_dir)
+    
+    # We do not have point coodrinates, but we have D! 
+    if points is None:
+        if dd_points is not None:
+            points = dd_points
+        else:
+            points, ewt = cvrp_ops.generate_missing_coordinates(D)
+    
+    if dist_weight_format == "TRUNCATE":
+        D = np.floor(D)
+        ewt = "FLOOR_2D"
+    if dist_weight_format == "ROUND":
+        D = np.int(D)
+        ewt = "EUC_2D"
+        
+    # Bake service time to D (if needed)
+    D_c = cvrp_ops.D2D_c(D, st) if st else D
+    
+    return N, points, d, D, D_c, C, L, st, ewt
+
+def _solve_problem(problem, algo_f, ls_ops, minimize_K, single,
+                   show_solution_cost=False, simulate=False, cache_as=None):
+    """ Solves the problem (as returned by _read_problem) with algo_f and
+    post-optimizes the solution with the local search operators ls_ops.
+    Returns a SolveResult. If the local search is interrupted, the solution
+    of algo_f is returned (interrupted=True).
+    
+    If cache_as (the abbreviation of the algorithm) is given, the solution of
+    algo_f is looked up from (and stored to) the SolutionCache. Then, the
+    elapsed_t of a cached solution does not include the time to solve it. """
+    N, points, d, D, D_c, C, L, st, ewt = problem
+    
+    start_t = time()
+    sol = None
+    interrupted = False
+    error = None
+    cache_key = None
+    if cache_as and not simulate:
+        cache = SolutionCache()
+        cache_key = solution_cache_key(points, D, d, C, L, st, cache_as,
+                                       minimize_K, single)
+        sol = cache.get(cache_key)
+    from_cache = sol is not None
+    try:
+        if not (simulate or from_cache):
+            sol = algo_f(points, D_c, d, C, L, st, ewt,
+                         single, minimize_K)
+    except (KeyboardInterrupt, Exception) as e:
+        if type(e) is KeyboardInterrupt:
+            interrupted = True
+            # if interrupted on initial sol gen, return the best of those
+            if len(e.args)>0 and type(e.args[0]) is list:
+                sol = e.args[0]
+        else:
+            error = e
+            sol = None
+    
+    pre_ls_sol_q = None
+    feasible = False
+    if sol:
+        sol = cvrp_ops.normalize_solution(sol)
+        if cache_key and not (from_cache or interrupted):
+            cache.put(cache_key, sol)
+        if show_solution_cost:
+            sol_q = cvrp_ops.recalculate_objective(sol, D_c)
+        else:
+            sol_q = cvrp_ops.recalculate_objective(sol, D)
+        sol_K = sol.count(0)-1
+        
+        ls_sol = None
+        if ls_ops:
+            try:
+                ls_sol = do_local_search(ls_ops, sol, D, d, C, L)
+            except KeyboardInterrupt:
+                interrupted = True
+        if ls_sol:
+            ls_sol = cvrp_ops.normalize_solution(ls_sol)
+                
+            if show_solution_cost:
+                ls_sol_q = cvrp_ops.recalculate_objective(ls_sol, D_c)
+            else:
+                ls_sol_q = cvrp_ops.recalculate_objective(ls_sol, D)
+            sol = ls_sol
+            if ls_sol_q<sol_q:
+                pre_ls_sol_q = sol_q
+                sol_q = ls_sol_q
+                sol_K = sol.count(0)-1
+        feasible = all( cvrp_ops.validate_solution_feasibility( sol,D_c,d,C,L,st) )
+    else:
+        sol_q = float('inf')
+        sol_K = None
+    
+    elapsed_t = time()-start_t
+    return SolveResult(sol, sol_q, sol_K, pre_ls_sol_q, elapsed_t, feasible,
+                       interrupted, error, from_cache)
+
+def _solve_sequentially(files_to_solve, algos, solve_args,
+                        dist_weight_format=None, print_progress=True,
+                        use_cache=False):
+    """ Solves the problems with the algorithms one by one. Yields the
+    solved (problem file, algorithm, problem, SolveResult) tuples. If
+    use_cache is set, the solutions of the algorithms are cached (see
+    _solve_problem). """
+    for pfn in files_to_solve:
+        bn = path.basename(pfn).replace(".vrp","").replace(".tsp","").replace(".pickle","")
+        problem = _read_problem(pfn, dist_weight_format)
+        for algo in algos:
+            if print_progress:
+                print("Solving %s with %s"%(bn, algo[1]))
+            result = _solve_problem(problem, algo[3], *solve_args,
+                                    cache_as=algo[0] if use_cache else None)
+            yield pfn, algo, problem, result
+            if result.interrupted:
+                return
+
+# The worker process state when solving in parallel. Each worker keeps the
+#  problem it read last, so that it is loaded only once per worker when
+#  the same problem is solved with several algorithms.
+_worker_stop_event = None
+_worker_is_solving = False
+_worker_problem_cache = {}
+_worker_algorithm_cache = {}
+
+def _interrupt_if_solving(signum, frame):
+    # An idle worker ignores Ctrl-C, a solving worker lets the algorithm
+    #  return the solution it has this far.
+    if _worker_is_solving:
+        raise KeyboardInterrupt()
+    
+def _init_solve_worker(stop_event):
+    global _worker_stop_event
+    _worker_stop_event = stop_event
+    signal.signal(signal.SIGINT, _interrupt_if_solving)
+
+def _solve_task(task):
+    """ Solves one (problem file, algorithm) pair in a worker process. The
+    problem is read by the worker if it is not given in the task. Returns
+    None if the solving was already interrupted. """
+    global _worker_is_solving
+    (pfn, algo_abbreviation, problem,
+     dist_weight_format, solve_args, use_cache) = task
+    if _worker_stop_event.is_set():
+        return None
+    
+    if problem is not None:
+        _worker_problem_cache.clear()
+        _worker_problem_cache[pfn] = problem
+    elif pfn not in _worker_problem_cache:
+        _worker_problem_cache.clear()
+        _worker_problem_cache[pfn] = _read_problem(pfn, dist_weight_format)
+    if algo_abbreviation not in _worker_algorithm_cache:
+        algo_f = get_algorithms(algo_abbreviation)[0][3]
+        _worker_algorithm_cache[algo_abbreviation] = algo_f
+    
+    _worker_is_solving = True
+    try:
+        result = _solve_problem(_worker_problem_cache[pfn],
+                                _worker_algorithm_cache[algo_abbreviation],
+                                *solve_args,
+                                cache_as=algo_abbreviation if use_cache else None)
+    except KeyboardInterrupt:
+        # Interrupted outside of the algorithm and the local search. The
+        #  exception must not escape, as the pool would wait for the result
+        #  of the task forever.
+        result = SolveResult(None, float('inf'), None, None, 0.0, False,
+                             True, None, False)
+    finally:
+        _worker_is_solving = False
+    if result.interrupted:
+        _worker_stop_event.set()
+    # the exceptions may not be picklable
+    if result.error is not None:
+        result = result._replace(error=str(result.error))
+    return result
+
+def _solve_in_parallel(files_to_solve, algos, solve_args, jobs,
+                       dist_weight_format=None, load_problems=True,
+                       use_cache=False):
+    """ Solves the (problem file, algorithm) pairs in a pool of jobs worker
+    processes. Yields the results in the same order as _solve_sequentially.
+    If load_problems is set, each problem is read only once, by this process,
+    and handed to the workers. Otherwise, the workers read the problems and
+    None is given in place of the problem. 
+    
+    On Ctrl-C, the running algorithms are interrupted and their (partial)
+    solutions are yielded, but the pairs that were not yet started are not
+    solved at all."""
+    # The pool consumes the tasks lazily (in its own thread), so that only
+    #  the problems that are being solved are kept in memory.
+    problems = {}
+    def generate_tasks():
+        for pfn in files_to_solve:
+            problem = None
+            if load_problems:
+                problem = _read_problem(pfn, dist_weight_format)
+                problems[pfn] = problem
+            for algo in algos:
+                yield (pfn, algo[0], problem,
+                       dist_weight_format, solve_args, use_cache)
+    
+    stop_event = Event()
+    pool = Pool(jobs, initializer=_init_solve_worker, initargs=(stop_event,))
+    try:
+        task_results = pool.imap(_solve_task, generate_tasks())
+        prev_pfn = None
+        for pfn, algo in ((pfn, algo) for pfn in files_to_solve
+                                      for algo in algos):
+            if prev_pfn!=pfn:
+                problems.pop(prev_pfn, None)
+                prev_pfn = pfn
+            while True:
+                try:
+                    result = next(task_results)
+                    break
+                except KeyboardInterrupt:
+                    # Stop starting new tasks, but wait for the interrupted
+                    #  ones to return their solutions.
+                    stop_event.set()
+            if result is None:
+                continue
+            yield pfn, algo, problems.get(pfn), result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
 def main(overridden_args=None):
     ## 1. parse arguments
     
@@ -73,6 +320,8 @@ def main(overridden_args=None):
     parser.add_argument('--forbid', dest='forbid_algorithms', help="Forbid applying algorithms (argument can set multiple times to forbid multiple algorithms)", action='append')    
     parser.add_argument('--recursive', dest='recursive', help="Find .vrp problems to solve recursively", action="store_true")
     parser.add_argument('--simulate', dest='simulate', help="Do not really invoke algorithms, can be used e.g. to test scripts", action="store_true")
+    parser.add_argument('--use-cache', dest='use_cache', help="Use the cached solutions of the algorithms (see config.SOLUTION_CACHE_DIR) and cache the new ones. The cached solutions bypass the current code and their elapsed times (marked with 'c') are not solve times", action="store_true")
+    parser.add_argument('--jobs', dest='jobs', help="Solve the problem and algorithm combinations in parallel with JOBS worker processes (default is 1)", type=int, default=1)
     
     #TODO: consider adding more LS opts e.g. 2optstart, 3optstart
     parser.add_argument('--post-optimize', dest='local_search_operators', choices=['2opt', '3opt'], help="Do post-optimization with local search operator(s) (can set multiple)", action='append')
@@ -147,135 +396,90 @@ def main(overridden_args=None):
     instance_data = dict()
 
     interrupted = False
-    for pfn in files_to_solve:
+    solve_args = (ls_ops, minimize_K, run_single_iteration,
+                  app_args.show_solution_cost, app_args.simulate)
+    if app_args.jobs>1:
+        solved = _solve_in_parallel(files_to_solve, algos, solve_args,
+                                    app_args.jobs, app_args.dist_weight_format,
+                                    load_problems=not app_args.minimal_output,
+                                    use_cache=app_args.use_cache)
+    else:
+        solved = _solve_sequentially(files_to_solve, algos, solve_args,
+                                     app_args.dist_weight_format,
+                                     print_progress=not app_args.minimal_output,
+                                     use_cache=app_args.use_cache)
+    
+    for pfn, (algo_abbreviation, algo_name, _, _), problem, result in solved:
         bn = path.basename(pfn).replace(".vrp","").replace(".tsp","").replace(".pickle","")
+        sol, sol_q, sol_K = result.sol, result.sol_q, result.sol_K
+        elapsed_t = result.elapsed_t
+        if result.interrupted:
+            interrupted = True
         
-        try:
-           N, points, dd_points, d, D, C, ewt, K, L, st = pickle.load( open( pfn, "rb" ) )
-        except:
-           N, points, dd_points, d, D, C, ewt = cvrp_io.read_TSPLIB_CVRP(pfn)
-           K, L, st = cvrp_io.read_TSBLIB_additional_constraints(pfn)
-        
-        # We do not have point coodrinates, but we have D! 
-        if points is None:
-            if dd_points is not None:
-                points = dd_points
-            else:
-                points, ewt = cvrp_ops.generate_missing_coordinates(D)
-        
-        if app_args.dist_weight_format == "TRUNCATE":
-            D = np.floor(D)
-            ewt = "FLOOR_2D"
-        if app_args.dist_weight_format == "ROUND":
-            D = np.int(D)
-            ewt = "EUC_2D"
-            
-        # Bake service time to D (if needed)
-        D_c = cvrp_ops.D2D_c(D, st) if st else D
-        
-        for algo_abbreviation, algo_name, _, algo_f in algos:
-            if not app_args.minimal_output:
+        if not app_args.minimal_output:
+            N, points, d, D, D_c, C, L, st, ewt = problem
+            if app_args.jobs>1:
                 print("Solving %s with %s"%(bn, algo_name))
-            start_t = time()
-            sol = None
-            try:
-                if not app_args.simulate:
-                    sol = algo_f(points, D_c, d, C, L, st, ewt,
-                                 run_single_iteration, minimize_K)
-            except (KeyboardInterrupt, Exception) as e:
-                if type(e) is KeyboardInterrupt:
-                    interrupted = True
-                    # if interrupted on initial sol gen, return the best of those
-                    if len(e.args)>0 and type(e.args[0]) is list:
-                        sol = e.args[0]
-                    if not app_args.minimal_output:
-                        print("WARNING: Interrupted solving %s with %s"%
-                              (bn, algo_abbreviation), file=sys.stderr)
+            if result.interrupted:
+                print("WARNING: Interrupted solving %s with %s"%
+                      (bn, algo_abbreviation), file=sys.stderr)
+            if result.error is not None:
+                print("ERROR: Failed to solve %s with %s because %s"%
+                      (bn, algo_abbreviation, str(result.error) ), file=sys.stderr)
+            if sol and app_args.local_search_operators:
+                print("Postoptimize with %s ..."%
+                      ", ".join(app_args.local_search_operators),end="")
+                if result.pre_ls_sol_q is not None:
+                    print(" improved by %.2f%%."%(1-sol_q/result.pre_ls_sol_q))
                 else:
-                    if not app_args.minimal_output:
-                        print("ERROR: Failed to solve %s with %s because %s"%
-                              (bn, algo_abbreviation, str(e) ), file=sys.stderr)
-                    sol = None
-            
+                    print(" did not find improving moves.")
+        
+        if app_args.minimal_output:
+            print("%s;%s"%(algo_abbreviation, bn),end="")
+            timecap_symbol = "*" if result.interrupted else ""
+            if result.from_cache:
+                timecap_symbol += "c"
             if sol:
-                sol = cvrp_ops.normalize_solution(sol)
-                if app_args.show_solution_cost:
-                    sol_q = cvrp_ops.recalculate_objective(sol, D_c)
-                else:
-                    sol_q = cvrp_ops.recalculate_objective(sol, D)
-                sol_K = sol.count(0)-1
+                print(";%s;%.2f;%d;%.2f%s"%
+                      (str(result.feasible), sol_q, sol_K, elapsed_t, timecap_symbol))
+            else:
+                print(";False;inf;inf;%.2f%s"%(elapsed_t, timecap_symbol))
                 
-                if app_args.local_search_operators:
-                    if not app_args.minimal_output:
-                        print("Postoptimize with %s ..."%
-                              ", ".join(app_args.local_search_operators),end="")
-                    sol = do_local_search(ls_ops, sol, D, d, C, L)
-                    sol = cvrp_ops.normalize_solution(sol)
-                        
-                    if app_args.show_solution_cost:
-                        ls_sol_q = cvrp_ops.recalculate_objective(sol, D_c)
-                    else:
-                        ls_sol_q = cvrp_ops.recalculate_objective(sol, D)
-                    if ls_sol_q<sol_q:
-                        if not app_args.minimal_output:
-                            print(" improved by %.2f%%."%(1-ls_sol_q/sol_q))
-                        sol_q = ls_sol_q
-                        sol_K = sol.count(0)-1
-                    else:
-                        if not app_args.minimal_output:
-                            print(" did not find improving moves.")
+        elif sol:
+            # Minimal output is not enabled, print like crazy :)
+            
+            if app_args.print_elapsed_time and result.from_cache:
+                print("Algorithm solution was read from the cache in %.3f s\n"%
+                      (elapsed_t))
+            elif app_args.print_elapsed_time:
+                print("Algorithm produced a solution in %.3f s\n"%(elapsed_t))
             else:
-                sol_q = float('inf')
-
- 
-            elapsed_t = time()-start_t
-            if app_args.minimal_output:
-                print("%s;%s"%(algo_abbreviation, bn),end="")
-                timecap_symbol = "*" if interrupted else ""
-                if sol:
-                    feasible = all( cvrp_ops.validate_solution_feasibility( sol,D_c,d,C,L,st) )
-                    print(";%s;%.2f;%d;%.2f%s"%
-                          (str(feasible), sol_q, sol_K, elapsed_t, timecap_symbol))
-                else:
-                    print(";False;inf;inf;%.2f%s"%(elapsed_t, timecap_symbol))
-                    
-            elif sol:
-                # Minimal output is not enabled, print like crazy :)
+                #just a newline
+                print()
                 
-                if app_args.print_elapsed_time:
-                    print("Algorithm produced a solution in %.3f s\n"%(elapsed_t))
-                else:
-                    #just a newline
-                    print()
-                    
-                tightness = None
-                if C and sol_K:
-                    tightness = (sum(d)/(C*sol_K))
-                if not bn in instance_data or sol_K<instance_data[bn][1]:
-                    #"N K C tightness L st"
-                    instance_data[bn] = (N,sol_K,C,"%.3f"%tightness,L,st)
-                    
-                shared_cli.print_problem_information(
-                    points, D_c, d, C, L, st, tightness,
-                    verbosity=app_args.verbosity)
+            tightness = None
+            if C and sol_K:
+                tightness = (sum(d)/(C*sol_K))
+            if not bn in instance_data or sol_K<instance_data[bn][1]:
+                #"N K C tightness L st"
+                instance_data[bn] = (N,sol_K,C,"%.3f"%tightness,L,st)
                 
-                solution_print_verbosity = 3 if app_args.print_route_stat else 1
-                shared_cli.print_solution_statistics(sol, D, D_c, d,
-                                                     C, L, st,
-                                                     solution_print_verbosity)
-                    
-                if app_args.print_vrph_sol:
-                    print("SOLUTION IN VRPH FORMAT:")
-                    print(" ".join( str(n) for n in cvrp_io.as_VRPH_solution(sol)))
-                print("\n")
+            shared_cli.print_problem_information(
+                points, D_c, d, C, L, st, tightness,
+                verbosity=app_args.verbosity)
+            
+            solution_print_verbosity = 3 if app_args.print_route_stat else 1
+            shared_cli.print_solution_statistics(sol, D, D_c, d,
+                                                 C, L, st,
+                                                 solution_print_verbosity)
                 
-            short_algo_name = algo_name
-            results[bn][short_algo_name] = sol_q
+            if app_args.print_vrph_sol:
+                print("SOLUTION IN VRPH FORMAT:")
+                print(" ".join( str(n) for n in cvrp_io.as_VRPH_solution(sol)))
+            print("\n")
             
-            if interrupted:
-                break # algo loop
-        if interrupted:
-                break # problem file loop
+        short_algo_name = algo_name
+        results[bn][short_algo_name] = sol_q
             
     ## Print collected results 
     sys.stdout.flush()
@@ -10,38 +10,41 @@ algo_name_aliases = {
                      "clarkewright":"ps",
         "gpl":"gpl", "ga67-ps":"gpl","ga67-ps|pi":"gpl","ga67-ps|lambda":"gpl",
                      "gaskellpi":"gpl", "gaskelllambda":"gpl",
+                     "ga67-ps|pi+lamda":"gpl",
         "ss":"ss",   "we64-ss":"ss", "sequentialsavings":"ss",
         
         "gps":"gps", "pa88-ps":"gps","generalizedsavings":"gps",
                      "generalizedparallelsavings":"gps",
-                     "paessens":"gps",
+                     "paessens":"gps", "pa88-ps|g2p":"gps",
         "ims":"ims", "hp76-ps":"ims","hp76-ps|ims":"ims",
                      "suppression":"ims",
                      "iterativemergesuppression":"ims",
                      "mergesuppressionsavings":"ims",
         "ps2o":"ps2o", "rt79-ps":"ps2o", "cawlip":"ps2o",
-                     "savingswith2opt":"ps2o", 
+                     "savingswith2opt":"ps2o", "rt79-cawlip":"ps2o",
         
         # insertion heuristics
         "si":"si",   "ci":"si",
                      "cheapestinsertion":"si",
-                     "sequentialinsertion":"si",
+                     "sequentialinsertion":"si", "vb94-si":"si",
         "mj":"mj",   "mj76-si":"si",
                      "molejameson":"mj","molejamesoninsertion":"mj",
+                     "mj76-ins":"mj",
         "pi":"pi",   "parallelinsertion":"pi", "parallelcheapestinsertion":"pi",
+                     "vb94-pi":"pi",
         
         # maximum mathcing heuristics
         "mbsa":"mbsa",   "dv89-mbsa":"mbsa", "matching":"mbsa",
                      "maximummatching":"mbsa", "mm":"mbsa",
-                     "desrochersverhoog":"mbsa",
+                     "desrochersverhoog":"mbsa", "dv89-mm":"mbsa",
         
         # the 2-phase heuristic
         "cmt":"cmt", "cmt79-2p":"cmt","tp":"cmt","twophase":"cmt",
                      "cmt2p":"cmt","cmt2phase":"cmt","cmttwophase":"cmt",
         
-        "sn":"sn", "nn":"sn","snn":"sn", # parallel nearest neighbour
-        "pn":"pn", "pnn":"pn", # parallel nearest neighbour
-        "ty":"ty",   "ty68-snn":"ty","tyagi":"ty", # tyagi nearest neighbour
+        "sn":"sn", "nn":"sn","snn":"sn", "vb95-snn":"sn", # parallel nearest neighbour
+        "pn":"pn", "pnn":"pn", "vb95-pnn":"pn", # parallel nearest neighbour
+        "ty":"ty",   "ty68-snn":"ty","ty68-nn":"ty","tyagi":"ty", # tyagi nearest neighbour
         
         "swp":"swp", "sweep":"swp", # plain sweep
         "wh":"wh",   "wh72-swls":"wh", "whs":"wh", "whswp":"wh",
@@ -57,10 +60,12 @@ algo_name_aliases = {
         "gap":"gap", "fj81-gap":"gap", "fisherjaikumar":"gap",
         
         # set covering "petal" heuristic
-        "ptl":"ptl", "fr76-ptl":"ptl", "petal":"ptl", "fosterryan":"ptl",
+        "ptl":"ptl", "fr76-ptl":"ptl", "fr76-1ptl":"ptl", "petal":"ptl",
+                     "fosterryan":"ptl",
         
         # lagrangian relaxation 3-opt* heuristic
-        "lr3o":"lr3o", "sg82-lr3opt":"lr3o", "lr3opt":"lr3o",
+        "lr3o":"lr3o", "sg82-lr3opt":"lr3o", "sg84-lr3opt":"lr3o",
+                       "lr3opt":"lr3o",
         
         # TO ENABLE THEM ALL!
         "all":"all",
@@ -17,12 +17,15 @@ from __future__ import division
 from builtins import range
 
 from collections import namedtuple
-from heapq import heappush, heappop
+from heapq import heappush, heappop, heapify
 from logging import log, DEBUG, WARNING
 
+import numpy as np
+
 from verypy.util import objf, routes2sol
 from verypy.config import COST_EPSILON as S_EPS
 from verypy.config import CAPACITY_EPSILON as C_EPS
+from verypy.config import INSERTION_BATCH_SIZE
 
 # One of the few non standard-lib additions, a doubly linked list. Used to make
 #  insertions constant time operations. Install it e.g. with:
@@ -47,7 +50,13 @@ __status__ = "Development"
 
 class _EmergingRouteData:
     """ A data structure to keep all of the data of the route that is being
-    constructed in the same place. """
+    constructed in the same place.
+    
+    Instead of all (customer, edge) insertion candidates, only the best
+    insertion of each customer to the route is kept (the insertion_* arrays).
+    The potential_insertions is a heap of (sorting_key, customer, version)
+    entries, where an entry is stale if the version of the insertion record
+    of the customer has changed after the entry was pushed. """
     def __init__(self, seed_customers, D, d):
         self.potential_insertions = []
         if seed_customers:
@@ -60,6 +69,39 @@ class _EmergingRouteData:
             self.used_capacity = 0
             self.cost = 0
             
+        N = len(D)
+        self.insertions_initialized = False
+        self.has_insertion = np.zeros(N, dtype=bool)
+        self.insertion_keys = np.zeros((N,3))
+        self.insertion_edges = np.zeros((N,2), dtype=int)
+        self.insertion_versions = np.zeros(N, dtype=int)
+        # (after,before) -> customers for which insert_callback refused it
+        self.rejected_insertions = {}
+        self.update_edges()
+            
+    def update_edges(self):
+        """ Update the edge arrays and node lookups after the route changes """
+        nodes = [self.route.first]
+        while nodes[-1]!=self.route.last:
+            nodes.append(nodes[-1].next)
+        values = [node.value for node in nodes]
+        
+        self.edge_from = np.array(values[:-1], dtype=int)
+        self.edge_to = np.array(values[1:], dtype=int)
+        self.successors = np.full(len(self.has_insertion), -1, dtype=int)
+        self.successors[self.edge_from] = self.edge_to
+        # the depot is both the first and the last node of the route
+        self.after_nodes = dict(zip(values[:-1], nodes[:-1]))
+        self.before_nodes = dict(zip(values[1:], nodes[1:]))
+        
+    def release_insertions(self):
+        """ The route is complete, free the memory of the insertion data """
+        self.potential_insertions = []
+        self.has_insertion = self.insertion_keys = None
+        self.insertion_edges = self.insertion_versions = None
+        self.rejected_insertions = {}
+        self.successors = self.after_nodes = self.before_nodes = None
+        
     @staticmethod
     def export_solution(route_datas):
         sol = []
@@ -95,62 +137,190 @@ def _initialize_new_route(seed_customers, unrouted, D, d):
 
 Insertion = namedtuple('Insertion', ['customer', 'after_node', 'before_node',
                                      'cost_delta', 'demand_delta'])
-def _new_potential_insertions(unrouted, D, d, C, L, rd, after, before,
-                              insertion_strain_callback):
-    for customer in unrouted:
-        # do not add infeasible insertions (note that the insertions, however,
-        #  can become infeasible later!)
-        l_delta =  -D[after.value, before.value]\
-                   +D[after.value, customer]\
-                   +D[customer, before.value]
+
+def _insertion_sorting_keys(customers, after_values, before_values, rd,
+                            D, d, C, L, insertion_strain_callback,
+                            only_profitable):
+    """ Calculates the sorting keys (-strain, secondary_criterion, l_saving)
+    of inserting the customers between the (after,before) edges with NumPy.
+    Returns the three keys as len(customers) x len(edges) arrays, and a mask
+    telling which of the insertions are feasible. """
+    us = customers[:,np.newaxis]
+    l_delta = -D[after_values, before_values]\
+              +D[after_values, us]\
+              +D[us, before_values]
+    
+    # do not add infeasible insertions (note that the insertions, however,
+    #  can become infeasible later!)
+    feasible = np.ones(l_delta.shape, dtype=bool)
+    if C:
+        feasible &= ~(rd.used_capacity+d[us]-C_EPS>C)
+    if L:
+        feasible &= ~(rd.cost+l_delta-S_EPS > L)
+    l_saving = l_delta-D[0,us]-D[us,0]
+    if only_profitable:
+        # these would be rejected by _try_insert_and_update anyway
+        feasible &= ~(l_saving > 0)
+    for ei, edge in enumerate(zip(after_values.tolist(),
+                                  before_values.tolist())):
+        if edge in rd.rejected_insertions:
+            feasible[:,ei] &= ~np.isin(customers,
+                                       list(rd.rejected_insertions[edge]))
+    
+    strain, secondary_criterion = insertion_strain_callback(
+        D, after_values, us, before_values)
+    sorting_keys = [np.broadcast_to(-strain, l_delta.shape),
+                    np.broadcast_to(secondary_criterion, l_delta.shape),
+                    l_saving]
+    #sorting_key = (-strain, l_saving, secondary_criterion)
+    #sorting_key = (-strain, +D[after.value, customer]
+    #                        +D[customer, before.value], -customer)
+    return sorting_keys, feasible
+
+def _lexicographic_argmin(sorting_keys, feasible):
+    """ Returns the column index of the feasible insertion with the smallest
+    sorting key on each row and a mask of the rows that have one. """
+    candidates = feasible
+    for key in sorting_keys:
+        masked_key = np.where(candidates, key, np.inf)
+        candidates = candidates&(masked_key==masked_key.min(axis=1,
+                                                            keepdims=True))
+    return np.argmax(candidates, axis=1), candidates.any(axis=1)
+
+def _new_potential_insertions(customers, after_values, before_values,
+                              rd, D, d, C, L, insertion_strain_callback,
+                              only_profitable, replace=False):
+    """ Updates the best insertions of the customers with the insertions
+    between the given (after,before) edges. If replace is set, the edges
+    are all of the edges of the route, and the best insertion is replaced
+    even if it is worse than the current one (e.g. after its edge is
+    removed). The batches are at most INSERTION_BATCH_SIZE insertions. """
+    batch_size = max(1, INSERTION_BATCH_SIZE//max(1,len(after_values)))
+    for batch_start in range(0, len(customers), batch_size):
+        batch = customers[batch_start:batch_start+batch_size]
+        sorting_keys, feasible = _insertion_sorting_keys(
+            batch, after_values, before_values, rd, D, d, C, L,
+            insertion_strain_callback, only_profitable)
+        best_idxs, found = _lexicographic_argmin(sorting_keys, feasible)
+        rows = np.arange(len(batch))
+        best_keys = np.column_stack([key[rows, best_idxs]
+                                     for key in sorting_keys])
+        
+        if replace:
+            invalidated = batch[~found]
+            rd.has_insertion[invalidated] = False
+            rd.insertion_versions[invalidated] += 1
+            update = found
+        else:
+            # only strictly better insertions replace the current best
+            prev_keys = rd.insertion_keys[batch]
+            is_better = best_keys[:,2]<prev_keys[:,2]
+            for ki in (1,0):
+                is_better = (best_keys[:,ki]<prev_keys[:,ki])|\
+                            ((best_keys[:,ki]==prev_keys[:,ki])&is_better)
+            update = found&(is_better|~rd.has_insertion[batch])
         
+        updated = batch[update]
+        rd.has_insertion[updated] = True
+        rd.insertion_keys[updated] = best_keys[update]
+        rd.insertion_edges[updated,0] = after_values[best_idxs[update]]
+        rd.insertion_edges[updated,1] = before_values[best_idxs[update]]
+        rd.insertion_versions[updated] += 1
+        
+        new_entries = [tuple(key)+(u,version) for key, u, version in zip(
+            best_keys[update].tolist(), updated.tolist(),
+            rd.insertion_versions[updated].tolist())]
+        if len(new_entries)*8>len(rd.potential_insertions):
+            rd.potential_insertions.extend(new_entries)
+            heapify(rd.potential_insertions)
+        else:
+            for entry in new_entries:
+                heappush(rd.potential_insertions, entry)
+
+def _compact_potential_insertions(rd, unrouted_mask):
+    """ Drops the stale entries from the insertion heap to keep its size
+    linear in the number of customers. """
+    live = np.flatnonzero(rd.has_insertion&unrouted_mask)
+    rd.potential_insertions = [tuple(key)+(u,version) for key, u, version in
+        zip(rd.insertion_keys[live].tolist(), live.tolist(),
+            rd.insertion_versions[live].tolist())]
+    heapify(rd.potential_insertions)
+    
+def _update_potential_insertions(rd, new_edges, unrouted_mask, D, d, C, L,
+                                 insertion_strain_callback, only_profitable):
+    """ Updates the best insertions after the route has changed. new_edges
+    are the (from_node, to_node) edges that the insert_callback added. """
+    rd.update_edges()
+    new_from = np.array([from_node.value for from_node, _ in new_edges],
+                        dtype=int)
+    new_to = np.array([to_node.value for _, to_node in new_edges], dtype=int)
+    # the insertions to new edges are new candidates even if rejected before
+    for edge in zip(new_from.tolist(), new_to.tolist()):
+        rd.rejected_insertions.pop(edge, None)
+    
+    customers = np.flatnonzero(unrouted_mask)
+    
+    # the best insertions to the removed edges have to be looked for again
+    edges = rd.insertion_edges[customers]
+    removed = rd.has_insertion[customers]&\
+              (rd.successors[edges[:,0]]!=edges[:,1])
+    if removed.any():
+        _new_potential_insertions(customers[removed],
+                                  rd.edge_from, rd.edge_to, rd, D, d, C, L,
+                                  insertion_strain_callback, only_profitable,
+                                  replace=True)
+    if len(new_edges)>0:
+        _new_potential_insertions(customers, new_from, new_to,
+                                  rd, D, d, C, L, insertion_strain_callback,
+                                  only_profitable)
+        
+    if len(rd.potential_insertions)>2*len(unrouted_mask):
+        _compact_potential_insertions(rd, unrouted_mask)
+
+def _pop_best_insertion(rd, unrouted, D, d, C):
+    """ Pops the best insertion from the heap of potential insertions while
+    skipping the stale entries. Returns None if no insertion seems valid. """
+    while len(rd.potential_insertions)>0:
+        entry = heappop(rd.potential_insertions)
+        customer, version = entry[3], entry[4]
+        
+        # The insertion has been superseded by a better one or the node has
+        #  been already inserted somewhere
+        if version!=rd.insertion_versions[customer] or\
+           not customer in unrouted:
+            continue
+        rd.has_insertion[customer] = False
+        
+        # Also the available capacity may have changed,
+        #  check if inserting would break a constraint
         d_delta = 0.0
         if C:
             d_delta = d[customer]
             if rd.used_capacity+d_delta-C_EPS>C:
+                if __debug__:
+                    log(DEBUG-3,"Insertion of n%d would break C constraint."%
+                                customer)
                 continue
-        if L:
-            if rd.cost+l_delta-S_EPS > L:                
-                continue
-        
-        # Build the insertion for the heap
-        insertion = Insertion(customer, after, before, l_delta, d_delta)
-        strain, secondary_criterion = insertion_strain_callback(D, after.value,customer,before.value)
-        l_saving =  l_delta-D[0,customer]-D[customer,0]
         
-        sorting_key = (-strain, secondary_criterion, l_saving)
-        #sorting_key = (-strain, l_saving, secondary_criterion)
-        #sorting_key = (-strain, +D[after.value, customer]
-        #                        +D[customer, before.value], -customer)
-        
-        heappush( rd.potential_insertions, (sorting_key, id(insertion), insertion) )
-      
+        after, before = rd.insertion_edges[customer].tolist()
+        l_delta =  -D[after, before]\
+                   +D[after, customer]\
+                   +D[customer, before]
+        return Insertion(customer, rd.after_nodes[after],
+                         rd.before_nodes[before], l_delta, d_delta)
+    return None
 
-def _seems_valid_insertion(insertion, route_current_d, unrouted, D, d, C):  
-    # The node has been already inserted somewhere
-    if not insertion.customer in unrouted:
-        if __debug__:
-            log(DEBUG-3,"Customer n%d is already routed."%insertion.customer)
-        return False
-    
-    # Something else has already been inserted here, ignore
-    if insertion.after_node.next != insertion.before_node:
-        if __debug__:
-            log(DEBUG-3,"Chain n%d-n%d-n%d is no longer possible."%
-                      (insertion.after_node.value, insertion.customer, insertion.before_node.value))
-        return False
+def _reject_insertion(insertion, rd, D, d, C, L, insertion_strain_callback,
+                      only_profitable):
+    """ The insert_callback refused to make the insertion. Remember it and
+    look for the next best insertion of the customer. """
+    edge = (insertion.after_node.value, insertion.before_node.value)
+    rd.rejected_insertions.setdefault(edge, set()).add(insertion.customer)
+    _new_potential_insertions(np.array([insertion.customer]),
+                              rd.edge_from, rd.edge_to, rd, D, d, C, L,
+                              insertion_strain_callback, only_profitable,
+                              replace=True)
     
-    # Also the available capacity may have changed,
-    #  check if inserting would break a constraint
-    if C:
-        d_inc = d[insertion.customer]
-        if route_current_d+d_inc-C_EPS>C:
-            if __debug__:
-                log(DEBUG-3,"Insertion of n%d would break C constraint."%insertion.customer)
-            return False
-    
-    return True
-
 def _try_insert_and_update(insertion, rd, D, L, minimize_K):
     if not minimize_K:
         # Compared to a solution where the customer is served individually
@@ -245,7 +415,10 @@ def cheapest_insertion_init(D, d, C, L=None, minimize_K=False,
      
      Parameters for building extensions:
      * insertion_strain_callback calculates the insertion "cost". Must return
-        two values. One is the strain, second is the secondary sorting criteria
+        two values. One is the strain, second is the secondary sorting criteria.
+        The insertion costs are calculated for many insertions at once, and,
+        thus, the callback is called with NumPy index arrays i, u, and j that
+        have to be broadcast together (see parametrized_insertion_criteria).
      * insert_callback can be used to change which operations are done when a 
         new customer is inserted on the route. Can be used e.g. to optimize
         the route after the insertion. Note, that the _EmergingRouteData
@@ -254,6 +427,11 @@ def cheapest_insertion_init(D, d, C, L=None, minimize_K=False,
         insertion strain is calculated with insertion_strain_callback. Check
         _try_insert_and_update for an example.
     
+    Only the best insertion of each unrouted customer is kept for each of the
+    emerging routes. When the route changes, the best insertions are updated
+    with the insertions to the new edges, and those that were to the removed
+    edges are recalculated over the entire route.
+    
     Therefore:
       \lambda = 2, \mu = 1 | Generalized Clarke and Wright criterion
       \lambda = 0, \mu = 1 | Minimum strain criterion
@@ -310,6 +488,15 @@ def cheapest_insertion_init(D, d, C, L=None, minimize_K=False,
         for ri, rd in enumerate(route_datas):
             log(DEBUG, "Initialized a new route #%d %s"%(ri, str(list(rd.route))))
     
+    # the insertion costs are calculated with NumPy for many customers at once
+    unrouted_mask = np.zeros(len(D), dtype=bool)
+    unrouted_mask[list(unrouted)] = True
+    d_array = np.array(d) if C else None
+    # the default insert_callback rejects insertions that are more expensive
+    #  than serving the customer individually, do not even queue these
+    only_profitable = (not minimize_K) and\
+                      (insert_callback is _try_insert_and_update)
+    
     try:
         # while there are nodes to insert
         route_index = -1
@@ -323,29 +510,25 @@ def cheapest_insertion_init(D, d, C, L=None, minimize_K=False,
             if __debug__:
                 log(DEBUG, "Inserting to route #%d %s"%(route_index, str(list(rd.route))))
             
-            # Generate the list of insertion candidates just-in-time
+            # Generate the best insertion candidates just-in-time
             # (this avoids adding unnecessary candidates).
-            if len(rd.potential_insertions)==0:
-                initial_after = rd.route.first
-                while initial_after!=rd.route.last:
-                    _new_potential_insertions(unrouted, D, d, C, L, rd,
-                                              initial_after, initial_after.next,
-                                              insertion_strain_callback)
-                    initial_after = initial_after.next
+            if not rd.insertions_initialized:
+                _new_potential_insertions(np.flatnonzero(unrouted_mask),
+                                          rd.edge_from, rd.edge_to,
+                                          rd, D, d_array, C, L,
+                                          insertion_strain_callback,
+                                          only_profitable, replace=True)
+                rd.insertions_initialized = True
                     
-            while len(rd.potential_insertions)>0:
-                insertion_succesfull = False
-                # unpack a best candidate from the insertion queue
-                _, _, insertion = heappop(rd.potential_insertions)
-                
-                # Check if it *seems* OK to insert
-                # - The node has been already inserted somewhere
-                # - Something else has already been inserted here, ignore
-                # - And check if inserting would break the C constraint
-                is_ok =  _seems_valid_insertion(insertion, rd.used_capacity,
-                                                unrouted, D, d, C)
-                if not is_ok:
-                    continue
+            while True:
+                # get the best candidate from the insertion queue that
+                # *seems* OK to insert
+                # - The node has not been already inserted somewhere
+                # - The best insertion of the node has not changed
+                # - And inserting would not break the C constraint
+                insertion = _pop_best_insertion(rd, unrouted, D, d, C)
+                if insertion is None:
+                    break
                 
                 if __debug__:
                     log(DEBUG-2,"Try insertion %d-%d-%d with l_delta %.2f"% (
@@ -359,11 +542,12 @@ def cheapest_insertion_init(D, d, C, L=None, minimize_K=False,
                     
                 if insertion_succesfull:
                     unrouted.remove(insertion.customer)
-                    for from_node, to_node in new_edges:
-                        # insertion changes the route -> new insertions possible
-                        _new_potential_insertions(unrouted, D, d, C, L, rd,
-                                                  from_node, to_node,
-                                                  insertion_strain_callback)
+                    unrouted_mask[insertion.customer] = False
+                    # insertion changes the route -> new insertions possible
+                    _update_potential_insertions(rd, new_edges, unrouted_mask,
+                                                 D, d_array, C, L,
+                                                 insertion_strain_callback,
+                                                 only_profitable)
                 
                     if __debug__:
                         log(DEBUG,"Chose to insert n%d resulting in route %s (%.2f)"%
@@ -373,15 +557,19 @@ def cheapest_insertion_init(D, d, C, L=None, minimize_K=False,
                     if __debug__:
                         log(DEBUG-3,"Insertion of n%d would break L constraint."%
                             insertion.customer)
+                    _reject_insertion(insertion, rd, D, d_array, C, L,
+                                      insertion_strain_callback,
+                                      only_profitable)
                     continue
                         
             # if are not able to add any more customers to the route,
             #  so start a new route
-            insertions_exhausted = len(rd.potential_insertions)==0
+            insertions_exhausted = insertion is None
             if insertions_exhausted and len(unrouted)>0:
                 if __debug__:
                     log(DEBUG,"Route #%d finished as %s (%.2f)"%
                         (route_index, str(list(rd.route)), rd.cost))
+                rd.release_insertions()
                 complete_routes.append(rd)
 
                 # Some seed initializations rely on the state of the completed
@@ -396,6 +584,7 @@ def cheapest_insertion_init(D, d, C, L=None, minimize_K=False,
                                             "customers were routed")
                 
                 rd = _initialize_new_route(seed_customers, unrouted, D, d)
+                unrouted_mask[list(rd.route)] = False
                 if __debug__:
                     log(DEBUG, "Initialized a new route #%d %s"%
                                (route_index, str(list(rd.route))))
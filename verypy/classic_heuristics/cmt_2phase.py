@@ -37,7 +37,8 @@ except ImportError:
           "Relying on internal TSP solver and the results may differ from those that were published.", file=stderr)
     from verypy.tsp_solvers.tsp_solver_ropt import solve_tsp_ropt as solve_tsp
 
-from verypy.util import is_better_sol, routes2sol, without_empty_routes, objf
+from verypy.util import is_better_sol, routes2sol, without_empty_routes, objf,\
+    progress_reporter
 from verypy.config import COST_EPSILON as S_EPS
 from verypy.config import CAPACITY_EPSILON as C_EPS
 
@@ -419,7 +420,8 @@ def cmt_2phase_init(D, d, C, L=None, minimize_K=False,
                     phase1_seed_selection_method = "farthest",
                     phase2_choose_most_associated_route = True,
                     phase2_repeated_association_with_n_routes = 1,
-                    number_of_randomized_retries = None):
+                    number_of_randomized_retries = None,
+                    progress_callback = None):
     
     """ Implementation of the Christofides, Mingozzi & Toth (1979) two phase
     heuristic. In the first phase a customer is selected to act as a seed node 
@@ -498,6 +500,10 @@ def cmt_2phase_init(D, d, C, L=None, minimize_K=False,
                            many seed customer configurations to second phase 
                            in case second phase is unable to produce feasible
                            solutions.
+    
+    * progress_callback   an optional function (sol, sol_f, sol_K, elapsed)
+                           that is called with the improving solutions, e.g.,
+                           already with the first phase solution.
     """
     
     if phase1_seed_selection_method=="first":
@@ -515,6 +521,7 @@ def cmt_2phase_init(D, d, C, L=None, minimize_K=False,
     best_f = None
     best_K = None
     interrupted = False
+    report = progress_reporter(progress_callback, minimize_K)
     
     while (rr is None) or (rr>0):
         
@@ -525,6 +532,7 @@ def cmt_2phase_init(D, d, C, L=None, minimize_K=False,
             phase1_seeds, phase1_sol, phase1_f, rr = \
                 _phase_one(lambda_multiplier,D,d,C,L, seed_f, rr)
             phase1_K = len(phase1_seeds)
+            report(phase1_sol, phase1_f, phase1_K)
             
             # extension to CMT, option to associate customers multiple times 
             #  (to other routes, starting from the route with minimal eps).
@@ -565,6 +573,7 @@ def cmt_2phase_init(D, d, C, L=None, minimize_K=False,
                 best_sol = phase2_sol
                 best_f = phase2_f
                 best_K = phase2_K
+        report(best_sol, best_f, best_K)
         
         if interrupted:
             # pass on the current best solution
@@ -584,8 +593,10 @@ def cmt_2phase_init(D, d, C, L=None, minimize_K=False,
 def get_cmt2p_algorithm():
     algo_name = "CMT79-2P"
     algo_desc = "Christofides, Mingozzi & Toth (1979) two phase heuristic"
-    def call_init(points, D, d, C, L, st, wtt, single, minimize_K):
-        return cmt_2phase_init(D, d, C, L, minimize_K)
+    def call_init(points, D, d, C, L, st, wtt, single, minimize_K,
+                  progress_callback=None):
+        return cmt_2phase_init(D, d, C, L, minimize_K,
+                               progress_callback=progress_callback)
     call_init.__doc__ = cmt_2phase_init.__doc__
     return (algo_name, algo_desc, call_init)
     
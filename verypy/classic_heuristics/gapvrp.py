@@ -38,8 +38,9 @@ except ImportError:
 
 
 from verypy.classic_heuristics.sweep import get_sweep_from_cartesian_coordinates, bisect_angle
+from verypy.tsp_solvers.tsp_cache import RouteTSPCache
 from verypy.cvrp_io import calculate_D
-from verypy.util import is_better_sol, totald
+from verypy.util import is_better_sol, totald, progress_reporter
 from verypy.config import MAX_MIP_SOLVER_RUNTIME, MIP_SOLVER_THREADS
 from verypy.config import CAPACITY_EPSILON as C_EPS
 from verypy.config import COST_EPSILON as S_EPS
@@ -601,7 +602,8 @@ def gap_init(points, D, d, C, L=None, st=None, K=None, minimize_K=True,
              seed_method="cones",
              seed_edge_weight_type='EUC_2D',
              use_adaptive_L_constraint_weights=True,
-             increase_K_on_failure=False):
+             increase_K_on_failure=False,
+             progress_callback=None):
              #REMOVEME, disable!
              #increase_K_on_failure=True):
     """ An implementation of a three phase cluster-first-route-second CVRP
@@ -685,6 +687,8 @@ def gap_init(points, D, d, C, L=None, st=None, K=None, minimize_K=True,
      location and another GAP solution attempt is made. K is allowed to
      increased temporarely up to 10% of the mimimum K allowed (or 1, whichever
      is larger).
+    * progress_callback is an optional function (sol, sol_f, sol_K, elapsed)
+     that is called with the improving solutions as the seeds are tried.
     
     Note2: logger controls the debug level but running the script with
      Python -O option disables all debug output.
@@ -737,9 +741,15 @@ def gap_init(points, D, d, C, L=None, st=None, K=None, minimize_K=True,
     #  costs for GAP objective function
     D_0 = np.copy( D[0,:] )
     
+    # The seed trials and the adaptive L multiplier produce many identical
+    #  GAP assignments. Route each assigned customer set only once (keyed
+    #  by the node order so that the routes do not depend on the cache).
+    route_tsp = RouteTSPCache(solve_tsp, ignore_order=False)
+    
     best_sol = None
     best_f = None
     best_K = None
+    report = progress_reporter(progress_callback, minimize_K)
     seed_trial = 0
     incK = 0
     maxKinc = max(startK+1, int(startK*INCREASE_K_ON_FAILURE_UPTO))
@@ -811,7 +821,7 @@ def gap_init(points, D, d, C, L=None, st=None, K=None, minimize_K=True,
                         for route_nodes in assignments:
                             if not route_nodes:
                                 continue
-                            route,route_l = solve_tsp(D, [0]+route_nodes)
+                            route,route_l = route_tsp(D, [0]+route_nodes)
                         
                             # Check for feasibility violations due to feasrelax
                             if L:
@@ -909,6 +919,7 @@ def gap_init(points, D, d, C, L=None, st=None, K=None, minimize_K=True,
                         best_f = sol_f
                         best_K = sol_K
                         found_improving_solution_for_this_K = True
+                        report(best_sol, best_f, best_K)
                 else:
                     # No feasible solution was found for this trial (max route cost 
                     #  or capacity constraint was violated).            
@@ -941,6 +952,10 @@ def gap_init(points, D, d, C, L=None, st=None, K=None, minimize_K=True,
     except KeyboardInterrupt: #or SIGINT
         #  pass on the current best_sol
         raise KeyboardInterrupt(best_sol)
+    
+    if __debug__:
+        log(DEBUG, "Route TSP cache had %d hits and %d misses"%
+                   (route_tsp.hits, route_tsp.misses))
         
     return best_sol                
 
@@ -949,12 +964,14 @@ def gap_init(points, D, d, C, L=None, st=None, K=None, minimize_K=True,
 def get_gap_algorithm(seed_method="cones"):
     algo_name = "FJ81-GAP"
     algo_desc = "Fisher & Jaikumar (1981) generalized assignment problem heuristic"
-    def call_init(points, D, d, C, L, st, wtt, single, minimize_K):
+    def call_init(points, D, d, C, L, st, wtt, single, minimize_K,
+                  progress_callback=None):
         return gap_init(points, D, d, C, L=L, st=st,
                         K=None, minimize_K=minimize_K,
                         seed_edge_weight_type=wtt,
                         find_optimal_seeds=(not single),
-                        seed_method=seed_method)
+                        seed_method=seed_method,
+                        progress_callback=progress_callback)
     call_init.__doc__ = gap_init.__doc__
     return (algo_name, algo_desc, call_init)
     
@@ -17,7 +17,8 @@ from builtins import range
 
 import numpy as np
 from verypy.util import objf, is_better_sol
-from verypy.classic_heuristics.parallel_savings import parallel_savings_init
+from verypy.classic_heuristics.parallel_savings import parallel_savings_init,\
+    upper_triangle_savings, lazy_sorted_savings
 
 __author__ = "Jussi Rasku"
 __copyright__ = "Copyright 2022, Jussi Rasku"
@@ -28,32 +29,30 @@ __email__ = "jussi.rasku@gmail.com"
 __status__ = "Development"
 
 
+def _gaskell_lambda_row_savings(D, i, js, d_avg):
+    D_ij = D[i,js]
+    s_AB = D[i,0]+D[0,js]-D_ij
+    lambda_AB = s_AB*(d_avg+np.abs(D[0,i]-D[0,js])-D_ij)
+    return lambda_AB, -D_ij
+
+def _gaskell_pi_row_savings(D, i, js):
+    D_ij = D[i,js]
+    pi_AB = D[i,0]+D[0,js]-2*D_ij
+    return pi_AB, -D_ij
+
 def gaskell_lambda_savings_function(D):
-    n = len(D)-1
-    savings = [None]*int((n*n-n)/2)
-    idx = 0
+    """ Returns the Gaskell (1967) lambda savings in the descending order.
+    Note that the savings are generated lazily. """
     d_avg = np.average(D[0:])
-    for i in range(1,n+1):
-        for j in range(i+1,n+1):
-            s_AB = D[i,0]+D[0,j]-D[i,j]
-            lambda_AB = s_AB*(d_avg+abs(D[0,i]-D[0,j])-D[i,j])
-            savings[idx] = (lambda_AB, -D[i,j], i,j)
-            idx+=1            
-    savings.sort(reverse=True)
-
-    return savings 
+    row_savings_f = lambda D, i, js: _gaskell_lambda_row_savings(D, i, js,
+                                                                 d_avg)
+    return lazy_sorted_savings(*upper_triangle_savings(D, row_savings_f))
 
 def gaskell_pi_savings_function(D):
-    n = len(D)-1
-    savings = [None]*int((n*n-n)/2)
-    idx = 0
-    for i in range(1,n+1):
-        for j in range(i+1,n+1):
-            pi_AB = D[i,0]+D[0,j]-2*D[i,j]
-            savings[idx] = (pi_AB, -D[i,j], i,j)
-            idx+=1            
-    savings.sort(reverse=True)    
-    return savings 
+    """ Returns the Gaskell (1967) pi savings in the descending order.
+    Note that the savings are generated lazily. """
+    return lazy_sorted_savings(
+        *upper_triangle_savings(D, _gaskell_pi_row_savings))
     
 def gaskell_savings_init(D,d,C,L, minimize_K=False, savings_method="both"):
     """ Savings algorithm with Gaskell (1967) pi and lambda savings criteria.
@@ -18,6 +18,7 @@ from __future__ import division
 
 import numpy as np
 from logging import log, DEBUG
+from functools import partial
 
 from verypy.routedata import RouteData
 from verypy.util import produce_nn_list
@@ -26,9 +27,12 @@ from verypy.classic_heuristics.sweep import _step,sweep_init,BEST_ALTERNATIVE
 
 from verypy.config import CAPACITY_EPSILON as C_EPS
 from verypy.config import COST_EPSILON as S_EPS
+from verypy.config import SWEEP_JOBS
 
 #from verypy.tsp_solvers.tsp_solver_gurobi import solve_tsp_gurobi as solve_tsp
 from verypy.tsp_solvers.tsp_solver_ropt import solve_tsp_3opt as solve_tsp
+from verypy.tsp_solvers.tsp_cache import RouteTSPCache
+from verypy.tsp_solvers.tsp_path import solve_path_tsp
 
 __author__ = "Jussi Rasku"
 __copyright__ = "Copyright 2022, Jussi Rasku"
@@ -41,45 +45,24 @@ __status__ = "Development"
 
 
 def _shortest_path_through_nodes(D, from_node, to_node, through_nodes):
-    # make sure to_node is the last by setting the distance between the end
-    # points to 0.0. Also, instead of copying (potentially large) D, just.
-    #  switch out the values in the D for the TSP algorithm.
-    if not through_nodes:
-        return [from_node,to_node], D[from_node, to_node]
-
-    old_path_end_distance = D[from_node, to_node]
-    D[from_node, to_node] = 0.0
-    D[to_node, from_node] = 0.0
-    route,cost = solve_tsp(D, [from_node]+list(through_nodes)+[to_node])
-    # restore original weights
-    D[from_node, to_node] = old_path_end_distance
-    D[to_node, from_node] = old_path_end_distance
-    
-    # contingency plan for the special case where there are nodes that overlap 
-    #  the depot. Check for it and fix it with a simple swap if needed.
-    if (route):
-        if route[-2]!=to_node:
-            last_node_idx = route.index(to_node)
-            route[last_node_idx]=route[-2]
-            route[-2]=to_node     
-            if __debug__:
-                log(DEBUG-1, "WARNING: the chain does not end to node "+
-                           "(%d). Swapped two nodes to get route %s"%
-                           (to_node,route))
-                
-    return route[:-1], cost
+    # D is not modified, which allows sharing it between the sweep workers
+    return solve_path_tsp(D, from_node, to_node, through_nodes, solve_tsp)
     
-def _pack_datastructures_callback(D,d,C,L,sweep_phi_rho_nodes):
+def _pack_datastructures_callback(D,d,C,L,sweep_phi_rho_nodes,
+                                  routing_algo=solve_tsp):
     """ This callback is called in the beginning of the the sweep(...) 
     the heuristic (in our case Gillett and Miller improvement heuristic)
     can then pick, choose and preprocess the data. Again, in this case 
     a nearest neighbor list in constructed only once, and the same data 
-    structure can then be used in all route improvement calls.
+    structure can then be used in all route improvement calls. The
+    routing_algo is used to route the candidate routes (give the
+    RouteTSPCache of the sweep to share the TSP solutions).
     """
     pos_to_node = dict((i,int(n)) for i,n in enumerate(sweep_phi_rho_nodes[2]))
     node_to_pos = dict((int(n),i) for i,n in enumerate(sweep_phi_rho_nodes[2]))
     avr = np.average( sweep_phi_rho_nodes[1] )
-    return (len(D), D,produce_nn_list(D),d,C,L,node_to_pos,pos_to_node, avr)
+    return (len(D), D,produce_nn_list(D),d,C,L,node_to_pos,pos_to_node, avr,
+            routing_algo)
     
 def _improvement_callback(route_data, callback_datastructures,
                           sweep_rhos, sweep_phis,
@@ -90,7 +73,8 @@ def _improvement_callback(route_data, callback_datastructures,
     of Gillett and Miller (1974). """
 
     # unpack callback data structures (packed in pack_datastructures)
-    N, D, NN_D, d, C, L, node_to_pos, pos_to_node, avr = callback_datastructures
+    N, D, NN_D, d, C, L, node_to_pos, pos_to_node, avr, routing_algo = \
+        callback_datastructures
     
     # do not try to improve, if the J node is already routed (already Swept
     #  full circle)
@@ -146,7 +130,7 @@ def _improvement_callback(route_data, callback_datastructures,
     D2_route_nodes = OrderedSet(D1_nodes)
     D2_route_nodes.remove(to_remove_node_KII)
     D2_route_nodes.add(candidate_node_JJX)
-    D2_route,D2 = solve_tsp(D, list(D2_route_nodes))
+    D2_route,D2 = routing_algo(D, list(D2_route_nodes))
     D2_demand = D1_demand-d[to_remove_node_KII]+d[candidate_node_JJX] if C else 0  
     
     ## G&M Step 9    
@@ -253,7 +237,7 @@ def _improvement_callback(route_data, callback_datastructures,
         # construct and route to get the modified route cost D2
         D5_route_nodes = D2_route_nodes
         D5_route_nodes.add(candidate_node_JII)
-        D5_route,D5 = solve_tsp(D, list(D5_route_nodes))
+        D5_route,D5 = routing_algo(D, list(D5_route_nodes))
         D5_demand = D2_demand+d[candidate_node_JII] if C else 0  
         if not ((L and D5-S_EPS<L) and (C and D5_demand-C_EPS<=C)):
             if __debug__:
@@ -301,7 +285,8 @@ def _improvement_callback(route_data, callback_datastructures,
                ignored_nodes, False
 
 def gillet_miller_init(points, D, d, C, L=None, minimize_K=False, 
-                       direction="both", seed_node=BEST_ALTERNATIVE):
+                       direction="both", seed_node=BEST_ALTERNATIVE,
+                       jobs=SWEEP_JOBS):
     """ This is an implementation of the Giller and Miller (1974) Sweep
     algorithm. The basic scheme is similar to Sweep, but there is an
     online intra-route improvement heuristic, that looks ahead on the sweep and
@@ -320,13 +305,18 @@ def gillet_miller_init(points, D, d, C, L=None, minimize_K=False,
                     closest to the depot
                  - SMALLEST_ANGLE selects the (somewhat arbitary) customer
                     that has the smallest polar coordinate phi.
+    * jobs is the number of worker processes used to do the sweeps in
+                 parallel (see sweep_init).
     """
     if not points:
         raise ValueError("The algorithm requires 2D coordinates for the points")
     
+    # the same routes are tried from many start positions, solve them once
+    route_tsp = RouteTSPCache(solve_tsp, ignore_order=False)
     return sweep_init(points, D, d, C, L, minimize_K,
-               direction, seed_node, routing_algo=solve_tsp,
-               prepare_callback_datastructures=_pack_datastructures_callback,
+               direction, seed_node, routing_algo=route_tsp, jobs=jobs,
+               prepare_callback_datastructures=partial(
+                   _pack_datastructures_callback, routing_algo=route_tsp),
                intra_route_improvement=_improvement_callback)
 
 # ---------------------------------------------------------------------
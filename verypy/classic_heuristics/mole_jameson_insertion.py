@@ -95,14 +95,12 @@ def _try_insert_2opt_and_update(insertion, rd, D, L, minimize_K):
     if applied_2opt_moves:
         # this is very ineffective, but as the dllist nodes and next/prev
         #  are read only, and the llist module does not offer a sequence 
-        #  reversing functionality (!) we have no choice but scrap the entire 
-        #  insertion queue and calculate the insertions all over for the 
-        #  updated route. :(
+        #  reversing functionality (!) we have no choice but replace the
+        #  route and report all of its edges as new. Then the insertions are
+        #  calculated all over for the updated route. :(
         #
         #TODO: an improvement would be to use an another doubly-linked-list 
         # implementaiton that allows manipulation of the nodes / list
-        del rd.potential_insertions[:]
-        
         updated_dllist = dllist(route_2opt_improved)
         new_edges = []
         prev_node = updated_dllist.first
@@ -20,10 +20,15 @@ from __future__ import division
 from logging import log, DEBUG
 from operator import itemgetter
 from collections import deque
+
+import numpy as np
+from scipy.spatial import cKDTree
+
 from verypy.util import objf, without_empty_routes, is_better_sol, routes2sol
 
 from verypy.config import CAPACITY_EPSILON as C_EPS
 from verypy.config import COST_EPSILON as S_EPS
+from verypy.config import NEAREST_NEIGHBOR_BLOCK_SIZE
 
 __author__ = "Jussi Rasku"
 __copyright__ = "Copyright 2022, Jussi Rasku"
@@ -33,6 +38,10 @@ __maintainer__ = "Jussi Rasku"
 __email__ = "jussi.rasku@gmail.com"
 __status__ = "Development"
 
+# D is a non-decreasing function of the Euclidean distance between the points
+#  with these edge weight types, and the nearest neighbors can be looked up
+#  from a k-d tree
+EUCLIDEAN_EDGE_WEIGHT_TYPES = ("EUC_2D", "EXACT_2D", "CEIL_2D", "FLOOR_2D")
 
 class _PeekQueue:
     """ This is a helper data strucure, that allows peeking into a list. It is
@@ -83,6 +92,115 @@ class _PeekQueue:
         self.posright-=1
         return self.l[self.posright]
 
+class _NearestNeighborQueue(_PeekQueue):
+    """ A _PeekQueue of the (node, distance) tuples of the nearest neighbors
+    of the node i in the order of the distance (ties broken by the node
+    index). Instead of sorting the entire row of D, the queue is filled
+    lazily with blocks of nearest neighbors as they are consumed. The blocks
+    are found with np.argpartition from the row of D or, if a k-d tree of the
+    points is given, with an incremental k-nearest query.
+    
+    Only the popleft end is filled lazily. Peeking or popping from the right
+    fills the entire queue.
+    """
+    
+    def __init__(self, i, D, kdtree=None):
+        self.posleft = -1
+        self.posright = 0
+        self.l = []
+        self.i = i
+        self.D = D
+        self.kdtree = kdtree
+        self.block_size = NEAREST_NEIGHBOR_BLOCK_SIZE
+        # all the neighbors within this distance are already in the queue
+        self.filled_distance = None
+        
+    def __len__(self):
+        return len(self.D)-(self.posleft+1)+(self.posright)
+    
+    def __getitem__(self, idx):
+        if idx>=len(self):
+            raise IndexError
+        self._fill(self.posleft+2+idx)
+        return self.l[self.posleft+1+idx]
+        
+    def peekleft(self):
+        return self[0]
+
+    def popleft(self):
+        nearest = self[0]
+        self.posleft+=1
+        return nearest
+    
+    def peekright(self):
+        self._fill(len(self.D))
+        return _PeekQueue.peekright(self)
+
+    def popright(self):
+        self._fill(len(self.D))
+        return _PeekQueue.popright(self)
+    
+    def _fill(self, size):
+        while len(self.l)<size:
+            self._fill_block()
+            
+    def _fill_block(self):
+        N = len(self.D)
+        k = min(N, len(self.l)+self.block_size)
+        self.block_size*=2
+        
+        if self.kdtree is None:
+            row = np.asarray(self.D[self.i])
+            candidates = np.arange(N)
+            if k<N:
+                next_distance = np.partition(row, k-1)[k-1]
+            else:
+                next_distance = np.inf
+        else:
+            _, nearest = self.kdtree.query(self.kdtree.data[self.i], k=k)
+            nearest = np.atleast_1d(nearest)
+            # the node itself and the depot may have no service time
+            candidates = np.union1d(nearest, [0, self.i])
+            row = np.full(N, np.inf)
+            row[candidates] = self.D[self.i, candidates]
+            if k<N:
+                # the distance to the k:th nearest point is a lower bound
+                #  for the distances to the points that were not returned
+                bound = row[nearest[-1]]
+                bound -= S_EPS*max(1.0, abs(bound))
+                inside = row[candidates][row[candidates]<bound]
+                if len(inside)==0:
+                    return
+                next_distance = np.max(inside)
+            else:
+                next_distance = np.inf
+        
+        # all the ties are added to keep the queue in the node index order
+        new = candidates[row[candidates]<=next_distance]
+        if self.filled_distance is not None:
+            new = new[row[new]>self.filled_distance]
+        new = new[np.lexsort((new, row[new]))]
+        self.l.extend(zip(new.tolist(), row[new].tolist()))
+        self.filled_distance = next_distance
+
+def _build_nearest_neighbor_queues(D, points=None):
+    """ Builds a nearest neighbor _PeekQueue for each node. The queue of the 
+    depot is complete, because the route seed nodes are taken from its both
+    ends. The queues of the customers are filled lazily. If the points are
+    given, D has to be a non-decreasing function of the Euclidean distance
+    between the points (e.g. EUC_2D), possibly with the service times
+    added. """
+    N = len(D)
+    kdtree = None if points is None else cKDTree(np.asarray(points))
+    node_nearest_neighbors = [None]*N
+    node_nearest_neighbors[0] = _PeekQueue( sorted(enumerate(D[0][:]),
+                                                   key=itemgetter(1)) )
+    for i in range(1,N):
+        node_nearest_neighbors[i] = _NearestNeighborQueue(i, D, kdtree)
+    for i in range(N):
+        node_nearest_neighbors[i].popleft() # pop reference to self
+    return node_nearest_neighbors
+
 def get_seed_node(seed_mode, D, node_nearest_neighbors, served):
     N = len(node_nearest_neighbors)
     seed_node = None
@@ -121,7 +239,8 @@ def nearest_neighbor_init(D, d, C, L=None,
                           initialize_routes_with="farthest",
                           add_only_to_end=False,
                           forbidden_nodes=None,
-                          route_improvement_callback=None):
+                          route_improvement_callback=None,
+                          points=None):
     """ A greedy nearest neighbor algorithm for solving symmetric CVRPs. 
     The general idea of the heuristic has been proposed e.g. in (Tyagi 1967).
     The nearest unrouted node is added to a route until a constraint (C or L)
@@ -152,6 +271,11 @@ def nearest_neighbor_init(D, d, C, L=None,
     Route data is a 4-tuple (or similar), with 
       (route, route_demand, route_cost, None)
     
+    The nearest neighbors of the nodes are looked up lazily in the order of
+    distance. If the coordinate points are given, D has to be a
+    non-decreasing function of the Euclidean distance between the points (see
+    EUCLIDEAN_EDGE_WEIGHT_TYPES), and a k-d tree is used for the lookups.
+    
     TODO: implement other route seeding methods (now only "closest" and "farthest")
     TODO: find a lit. ref. for sequential and parallel
      esp. check what the parallel lit. algo does when a route is full...
@@ -162,11 +286,7 @@ def nearest_neighbor_init(D, d, C, L=None,
     
     # build the nearest neighbor lists
     N = len(D)
-    node_nearest_neighbors = [None]*N
-    for i in range(N):
-        node_nearest_neighbors[i] = _PeekQueue( sorted(enumerate(D[i][:]),
-                                                        key=itemgetter(1)) )
-        node_nearest_neighbors[i].popleft() # pop reference to self
+    node_nearest_neighbors = _build_nearest_neighbor_queues(D, points)
         
     # bookkeeping on the nodes that we have already served
     served = [False]*N
@@ -331,6 +451,10 @@ def nearest_neighbor_init(D, d, C, L=None,
  
 # ---------------------------------------------------------------------
 # Wrapper for the command line user interface (CLI)
+def _euclidean_points(points, wtt):
+    """ The k-d tree can be used only if D is calculated from the points """
+    return points if wtt in EUCLIDEAN_EDGE_WEIGHT_TYPES else None
+
 def get_snn_algorithm():
     algo_name = "vB95-SNN"
     algo_desc = "van Breedam (1994) Sequential Nearest Neighbor construction "+\
@@ -340,7 +464,8 @@ def get_snn_algorithm():
             raise NotImplementedError("Nearest neighbor algorithm does "+
                                           " not support minimizing the number"+
                                           " of vehicles")
-        return nearest_neighbor_init(D,d,C,L, emerging_route_count=1)
+        return nearest_neighbor_init(D,d,C,L, emerging_route_count=1,
+                                     points=_euclidean_points(points, wtt))
     call_init.__doc__ = nearest_neighbor_init.__doc__   
     return (algo_name, algo_desc, call_init)
 
@@ -355,7 +480,9 @@ def get_pnn_algorithm(emerging_route_count="auto"):
                                           " not support minimizing the number"+
                                           " of vehicles")
               
-            sol_snn = nearest_neighbor_init(D, d, C, L, emerging_route_count=1)            
+            euclidean_points = _euclidean_points(points, wtt)
+            sol_snn = nearest_neighbor_init(D, d, C, L, emerging_route_count=1,
+                                            points=euclidean_points)
             if single:
                 return sol_snn
             
@@ -366,7 +493,8 @@ def get_pnn_algorithm(emerging_route_count="auto"):
             best_f = objf(sol_snn,D)
             best_K = auto_route_count
             for k in range(2,auto_route_count+1):
-                sol = nearest_neighbor_init(D, d, C, L, emerging_route_count=k)
+                sol = nearest_neighbor_init(D, d, C, L, emerging_route_count=k,
+                                            points=euclidean_points)
                 sol = without_empty_routes(sol)
                 sol_f = objf(sol,D)
                 sol_K = sol.count(0)-1
@@ -384,7 +512,8 @@ def get_pnn_algorithm(emerging_route_count="auto"):
                 raise NotImplementedError("Nearest neighbor algorithm does "+
                                           " not support minimizing the number"+
                                           " of vehicles")
-            return nearest_neighbor_init(D, d, C, L, emerging_route_count)
+            return nearest_neighbor_init(D, d, C, L, emerging_route_count,
+                                         points=_euclidean_points(points, wtt))
     else:
         raise ValueError("Not a valid emerging_route_count value "+
                          "(%s) for parallel algorithm"%
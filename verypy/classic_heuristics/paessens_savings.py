@@ -15,11 +15,16 @@ scipy for reading and preparing the problem instance."""
 # Written in Python 2.7, but try to maintain Python 3+ compatibility
 from builtins import range
 
-from verypy.classic_heuristics.parallel_savings import parallel_savings_init
+from signal import signal, SIGINT, SIG_IGN
+from multiprocessing import Pool, current_process
+
+from verypy.classic_heuristics.parallel_savings import parallel_savings_init,\
+    lazy_sorted_savings
 import numpy as np
 from verypy.local_search import LSOPT, do_local_search
 from verypy.local_search.intra_route_operators import do_3opt_move 
 from verypy.util import objf, without_empty_routes, is_better_sol
+from verypy.config import PAESSENS_JOBS
 
 __author__ = "Jussi Rasku"
 __copyright__ = "Copyright 2022, Jussi Rasku"
@@ -34,27 +39,62 @@ M4_FINETUNE_STEP = 0.1
 def _cartesian_product(nparray1, nparray2):
     return np.array(np.meshgrid(nparray1,nparray2)).T.reshape(-1,2)
 
-def paessens_savings_function(D, g_multiplier, f_multiplier):
+def paessens_savings_terms(D):
+    """ Calculates the terms of the Paessens (1988) savings function for all
+    the customer pairs i<j at once. These do not depend on the g and f
+    multipliers, and, thus, can be shared between the parameter combinations.
+    Returns a tuple of arrays (D_i0+D_0j, D_ij, |D_i0-D_0j|, i, j). """
+    N = len(D)
+    i_idxs, j_idxs = np.triu_indices(N-1, 1)
+    i_idxs = (i_idxs+1).astype(np.int32)
+    j_idxs = (j_idxs+1).astype(np.int32)
+    D_i0 = D[i_idxs, 0]
+    D_0j = D[0, j_idxs]
+    return (D_i0+D_0j, D[i_idxs, j_idxs], np.abs(D_i0-D_0j), i_idxs, j_idxs)
+
+def paessens_savings_function(D, g_multiplier, f_multiplier,
+                              savings_terms=None):
     """ The Paessens 1988 Savings function
     0.0<g<=3.0
     0.0<=f<=1.0
+    
+    The savings are calculated from the savings_terms of
+    paessens_savings_terms (calculated if not given) and generated lazily in
+    the descending order.
     """
-    N = len(D);
-    n = N-1
-    savings = [None]*int((n*n-n)/2)
-    idx = 0
-    for i in range(1,N):
-        for j in range(i+1,N):
-            s = D[i,0]+D[0,j]\
-                -g_multiplier*D[i,j]\
-                +f_multiplier*abs(D[i,0]-D[0,j])
-            savings[idx] = (s,-D[i,j],i,j)
-            idx+=1
-    savings.sort(reverse=True)
-    return savings 
+    if savings_terms is None:
+        savings_terms = paessens_savings_terms(D)
+    sum_D_i0_0j, D_ij, abs_D_i0_0j, i_idxs, j_idxs = savings_terms
+    savings = sum_D_i0_0j-g_multiplier*D_ij+f_multiplier*abs_D_i0_0j
+    return lazy_sorted_savings(savings, -D_ij, i_idxs, j_idxs)
+
+def _paessens_savings_solution(gf_args, g, f):
+    """ Solves the problem with the Paessens savings multipliers g and f.
+    Returns a (sol, sol_f, sol_K) tuple. """
+    D, d, C, L, minimize_K, do_3opt, savings_terms = gf_args
+    gf_savings = lambda D: paessens_savings_function(D, g, f, savings_terms)
+    sol = parallel_savings_init(D,d,C,L,minimize_K, gf_savings)
+    if do_3opt:
+        sol = do_local_search([do_3opt_move], sol, D, d, C, L,
+                              LSOPT.BEST_ACCEPT)
+    # 3-opt may make some of the routes empty
+    sol = without_empty_routes(sol)
+    return sol, objf(sol, D), sol.count(0)-1
+
+# The worker processes get the shared arguments (incl. D) only once
+_worker_gf_args = None
+def _init_paessens_worker(gf_args):
+    global _worker_gf_args
+    _worker_gf_args = gf_args
+    # the interrupts are handled in the main process
+    signal(SIGINT, SIG_IGN)
+    
+def _paessens_worker_task(params):
+    g, f = params
+    return _paessens_savings_solution(_worker_gf_args, g, f)
 
 def paessens_savings_init(D,d,C,L, minimize_K=False,
-                          strategy="M4", do_3opt=True):
+                          strategy="M4", do_3opt=True, jobs=PAESSENS_JOBS):
     """
     This implements the Paesses (1988) variant of the parallel savings
      algorithm of Clarke and Wright (1964). The savings function of
@@ -75,6 +115,10 @@ def paessens_savings_init(D,d,C,L, minimize_K=False,
            with a parameter combinations +/- 0.1 around the best of these four. 
         - or a list of (g,f) value tuples.
     * do_3opt (default True) optimize the resulting routes to 3-optimality
+    * jobs (default PAESSENS_JOBS of config.py) is the number of worker
+       processes used to try the parameter combinations in parallel. The
+       solutions are compared in the order of the parameters, and, thus, the
+       result is the same regardless of the number of jobs.
     
     Note: Due to the use of modern computer, and low priority in computational
      efficiency of this implementation, not all of the tecninques specified in
@@ -94,50 +138,59 @@ def paessens_savings_init(D,d,C,L, minimize_K=False,
     best_sol = None
     best_f = None
     best_K = None
-    interrupted = False
     
-    params_idx = 0
-    while params_idx<len(parameters):
-        g,f = parameters[params_idx]
-        
-        # Note: this is not a proper closure. Variables g and f are shared
-        #  over all iterations. It is OK like this, but do not use/store the 
-        #  lambda after this loop.
-        gf_savings = lambda D: paessens_savings_function(D, g, f)
-        
-        sol, sol_f, sol_K = None, float('inf'), float('inf')
-        try:
-            sol = parallel_savings_init(D,d,C,L,minimize_K, gf_savings)
-            if do_3opt:
-                sol = do_local_search([do_3opt_move], sol, D, d, C, L,
-                                      LSOPT.BEST_ACCEPT)
-            # 3-opt may make some of the routes empty
-            sol = without_empty_routes(sol)
-        except KeyboardInterrupt as e: # or SIGINT
-            # some parameter combination was interrupted
-            if len(e.args)>0 and type(e.args[0]) is list:
-                sol = e.args[0]
-                interrupted = True
-        if sol:
+    # the savings function terms are calculated only once for all (g,f)
+    savings_terms = paessens_savings_terms(D)
+    gf_args = (D, d, C, L, minimize_K, do_3opt, savings_terms)
+    
+    # a daemonic process (e.g. a worker of a pool) cannot have child processes
+    parallel = jobs>1 and len(parameters)>1 and not current_process().daemon
+    
+    pool = None
+    try:
+        if parallel:
+            pool = Pool(jobs, _init_paessens_worker, (gf_args,))
+            
+        stage_parameters = parameters
+        while stage_parameters:
+            if parallel:
+                gf_sols = pool.imap(_paessens_worker_task, stage_parameters)
+            else:
+                gf_sols = (_paessens_savings_solution(gf_args, g, f)
+                           for g, f in stage_parameters)
+            
+            # the solutions are compared in the same order in both cases
+            for (g,f), (sol, sol_f, sol_K) in zip(stage_parameters, gf_sols):
+                if is_better_sol(best_f, best_K, sol_f, sol_K, minimize_K):
+                    best_sol = sol
+                    best_f = sol_f
+                    best_K = sol_K
+                    best_params = (g,f)
+            
+            stage_parameters = None
+            # after the best of 4 for the M4 is found, check 4 more around it
+            if strategy=="M4" and len(parameters)==4:
+                g_prime, f_prime = best_params
+                stage_parameters = [(g_prime-M4_FINETUNE_STEP, f_prime),
+                                    (g_prime+M4_FINETUNE_STEP, f_prime),
+                                    (g_prime, f_prime-M4_FINETUNE_STEP ),
+                                    (g_prime, f_prime+M4_FINETUNE_STEP )]
+                parameters.extend(stage_parameters)
+                
+    except KeyboardInterrupt as e: # or SIGINT
+        # some parameter combination was interrupted
+        if len(e.args)>0 and type(e.args[0]) is list:
+            sol = without_empty_routes(e.args[0])
             sol_f = objf(sol, D)
             sol_K = sol.count(0)-1
-        if is_better_sol(best_f, best_K, sol_f, sol_K, minimize_K):
-            best_sol = sol
-            best_f = sol_f
-            best_K = sol_K
-            best_params = (g,f)
-        
-        if interrupted:
-            raise KeyboardInterrupt(best_sol)
-        
-        params_idx+=1
-        # after the best of 4 for the M4 is found, check 4 more around it
-        if params_idx==4 and strategy=="M4":
-            g_prime, f_prime = best_params
-            parameters.extend( [(g_prime-M4_FINETUNE_STEP, f_prime),
-                                (g_prime+M4_FINETUNE_STEP, f_prime),
-                                (g_prime, f_prime-M4_FINETUNE_STEP ),
-                                (g_prime, f_prime+M4_FINETUNE_STEP )] )
+            if is_better_sol(best_f, best_K, sol_f, sol_K, minimize_K):
+                best_sol = sol
+        raise KeyboardInterrupt(best_sol)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+            
     return best_sol
             
 
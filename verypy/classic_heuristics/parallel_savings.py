@@ -19,9 +19,13 @@ from __future__ import division
 from builtins import range
 
 from logging import log, DEBUG
+
+import numpy as np
+
 from verypy.util import routes2sol, objf
 from verypy.config import CAPACITY_EPSILON as C_EPS
 from verypy.config import COST_EPSILON as S_EPS
+from verypy.config import SAVINGS_CHUNK_SIZE
 
 __author__ = "Jussi Rasku"
 __copyright__ = "Copyright 2022, Jussi Rasku"
@@ -32,18 +36,77 @@ __email__ = "jussi.rasku@gmail.com"
 __status__ = "Development"
 
 
-def clarke_wright_savings_function(D):
+def upper_triangle_savings(D, row_savings_f):
+    """ Calculates the savings for each customer pair i<j with NumPy. The
+    row_savings_f(D, i, js) should return a 2-tuple of arrays (the savings
+    and the secondary sorting criterion) for the merges (i,j) for all j in
+    the index array js. Returns 4 arrays: the savings, the secondary criteria,
+    and the i and j of the merges. """
     N = len(D)
     n = N-1
-    savings = [None]*int((n*n-n)/2)
+    M = int((n*n-n)/2)
+    i_idxs = np.empty(M, dtype=np.int32)
+    j_idxs = np.empty(M, dtype=np.int32)
+    savings = None
+    secondary = None
+    
     idx = 0
     for i in range(1,N):
-        for j in range(i+1,N):
-            s = D[i,0]+D[0,j]-D[i,j]
-            savings[idx] = (s,-D[i,j],i,j)
-            idx+=1
-    savings.sort(reverse=True)
-    return savings 
+        js = np.arange(i+1,N)
+        row_savings, row_secondary = row_savings_f(D, i, js)
+        if savings is None:
+            savings = np.empty(M, dtype=np.asarray(row_savings).dtype)
+            secondary = np.empty(M, dtype=np.asarray(row_secondary).dtype)
+        savings[idx:idx+len(js)] = row_savings
+        secondary[idx:idx+len(js)] = row_secondary
+        i_idxs[idx:idx+len(js)] = i
+        j_idxs[idx:idx+len(js)] = js
+        idx+=len(js)
+    
+    if savings is None:
+        savings = np.empty(0)
+        secondary = np.empty(0)
+    return savings, secondary, i_idxs, j_idxs
+
+def lazy_sorted_savings(savings, secondary, i_idxs, j_idxs,
+                        chunk_size=SAVINGS_CHUNK_SIZE):
+    """ A generator that yields the (s_ij,x_ij,i,j) savings tuples in the
+    same order as sorted(..., reverse=True) would. Instead of sorting all
+    the savings, the largest chunk_size savings (and the ones tied with them)
+    are selected with np.partition and only they are sorted. The chunk size
+    is doubled for each chunk. Thus, the work is not wasted on the small
+    savings that are never used, e.g., if the heuristic stops on the first
+    negative savings value. """
+    while len(savings)>0:
+        if len(savings)>chunk_size:
+            kth = len(savings)-chunk_size
+            threshold = np.partition(savings, kth)[kth]
+            in_chunk = savings>=threshold
+            chunk = (savings[in_chunk], secondary[in_chunk],
+                     i_idxs[in_chunk], j_idxs[in_chunk])
+            not_in_chunk = ~in_chunk
+            savings, secondary, i_idxs, j_idxs = (savings[not_in_chunk],
+                secondary[not_in_chunk], i_idxs[not_in_chunk],
+                j_idxs[not_in_chunk])
+            chunk_size*=2
+        else:
+            chunk = (savings, secondary, i_idxs, j_idxs)
+            savings = savings[:0]
+        
+        # the last key is the primary, the order is then reversed
+        order = np.lexsort(chunk[::-1])[::-1]
+        for saving in zip(*(a[order].tolist() for a in chunk)):
+            yield saving
+
+def _clarke_wright_row_savings(D, i, js):
+    D_ij = D[i,js]
+    return D[i,0]+D[0,js]-D_ij, -D_ij
+
+def clarke_wright_savings_function(D):
+    """ Returns the Clarke and Wright (1964) savings in the descending order.
+    Note that the savings are generated lazily. """
+    return lazy_sorted_savings(
+        *upper_triangle_savings(D, _clarke_wright_row_savings))
 
 def parallel_savings_init(D, d, C, L=None, minimize_K=False,
                           savings_callback=clarke_wright_savings_function):
@@ -76,6 +139,8 @@ def parallel_savings_init(D, d, C, L=None, minimize_K=False,
        (i,j) is made). This should be calculated for each i \in {1..n},
        j \\in {i+1..n}, where n is the number of customers. The x is a secondary
        sorting criterion but otherwise ignored by the savings heuristic.
+      Instead of a list, any iterable giving the savings in the same order can
+       be returned (see lazy_sorted_savings).
       The default is to use the Clarke Wright savings criterion.
         
     See clarke_wright_savings.py, gaskell_savings.py, yellow_savings.py etc.
@@ -25,6 +25,7 @@ from logging import log, DEBUG
 from gurobipy import Model, GRB, GurobiError, quicksum
 
 from verypy.classic_heuristics.sweep import do_one_sweep, get_sweep_from_cartesian_coordinates
+from verypy.tsp_solvers.tsp_cache import RouteTSPCache
 #from verypy.local_search import ITEROPT
 
 try:
@@ -39,7 +40,8 @@ except ImportError:
           "Relying on internal TSP solver and the results may differ from those that were published.", file=stderr)
     from verypy.tsp_solvers.tsp_solver_ropt import solve_tsp_ropt as solve_tsp
 
-from verypy.util import objf, totald, routes2sol, without_empty_routes, is_better_sol
+from verypy.util import objf, totald, routes2sol, without_empty_routes, is_better_sol,\
+    progress_reporter
 from verypy.routedata import RouteData
 
 from verypy.local_search.inter_route_operators import do_redistribute_move
@@ -294,10 +296,12 @@ def _generate_overconstrained_petals(
     extended_ptls = PetalSet([],[],[]) if generate_extended_ptls else None
     
     sweep = get_sweep_from_cartesian_coordinates(points) 
+    # with L, the route is routed also when checking if the next node fits
+    route_tsp = RouteTSPCache(solve_tsp, ignore_order=False)
     for direction in [1]:#, -1]:
         for start in range(0,N-1):
             # Use Sweep to generate petals.
-            route_datas = do_one_sweep(N, D, d, C, L, solve_tsp, 
+            route_datas = do_one_sweep(N, D, d, C, L, route_tsp, 
                                        sweep, start, direction,
                                        generate_alternative_first_routes = True)
                   
@@ -586,7 +590,8 @@ def petal_init(points, D, d, C, L, K=None,
                restricted_route_ratio=0.75,
                allow_infeasible = True,
                can_discard_multiple_customers='auto',
-               predefined_petals_generator=None):
+               predefined_petals_generator=None,
+               progress_callback=None):
     
     """ An implementation of Foster and Ryan (1976) Petal algorithm. The VRP
     is solved with a set covering formulation (SCP->MIP/LP). The decision 
@@ -658,6 +663,8 @@ def petal_init(points, D, d, C, L, K=None,
                        at most 3 for routes with more than 20 customers, 
                        at most 2 for routes with more than 30 customers, 
                        at most 1 for routes with more than 50 customers, 
+    * progress_callback is an optional function (sol, sol_f, sol_K, elapsed)
+       that is called with the improving feasible solutions of the SCP.
       
     Foster, B. A. and Ryan, D. M. (1976). An integer programming approach to
     the vehicle scheduling problem. JORS, 27(2):367-384.
@@ -729,6 +736,7 @@ def petal_init(points, D, d, C, L, K=None,
     best_sol_f = float('inf')
     best_sol_K = len(D)
     interrupted = False
+    report = progress_reporter(progress_callback, minimize_K)
     
     #TODO: the set covering solving with reduced, then extended (if no 
     # fesible set covering problem, all petals if still no feasible sol.),
@@ -905,6 +913,8 @@ def petal_init(points, D, d, C, L, K=None,
                 best_sol_f = petal_sol_f
                 best_sol_K = petal_sol_K
                 best_sol_feasible = sol_feasible
+                if sol_feasible:
+                    report(best_sol, best_sol_f, best_sol_K)
             elif ptl_set==PTL_SET.RESTRICTED:
                 # "The region is relaxed to the complete petal set when no 
                 #  further improvements can be found from the reduced set" 
@@ -995,16 +1005,19 @@ def petal_init(points, D, d, C, L, K=None,
 def get_ptl_algorithm():
     algo_name = "FR76-1PTL"
     algo_desc = "Foster & Ryan (1976) Petal set covering algorithm"
-    def call_init(points, D, d, C, L, st, wtt, single, minimize_K):
+    def call_init(points, D, d, C, L, st, wtt, single, minimize_K,
+                  progress_callback=None):
         if single:
             return petal_init(points, D,d,C,L,
                               minimize_K=minimize_K,
                               required_iterations=1,
-                              relaxe_SCP_solutions=False)
+                              relaxe_SCP_solutions=False,
+                              progress_callback=progress_callback)
             
         else:
             return petal_init(points, D,d,C,L,
-                              minimize_K=minimize_K)
+                              minimize_K=minimize_K,
+                              progress_callback=progress_callback)
                               #minimize_K=True)
     call_init.__doc__ = petal_init.__doc__
     return (algo_name, algo_desc, call_init)
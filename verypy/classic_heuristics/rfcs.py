@@ -33,6 +33,7 @@ except ImportError:
 # Always use built-in TSP solver to guarantee 2 and 3-optimality of single routes.
 from verypy.tsp_solvers.tsp_solver_ropt import solve_tsp_2opt, solve_tsp_3opt
 
+from verypy.util import objf
 from verypy.config import CAPACITY_EPSILON as C_EPS
 from verypy.config import COST_EPSILON as S_EPS
 
@@ -45,125 +46,183 @@ __maintainer__ = "Jussi Rasku"
 __email__ = "jussi.rasku@gmail.com"
 __status__ = "Development"
 
-def _partition_to_routes_with_cost_matrix(D, d, C, L, giant_tour,
-                                          route_cost_constant,
-                                          partition_tsp_opt_algo,
-                                          route_tsp_opt_algo):
-    """ Partitions the giant tour solution optimally to routes using
-    Floyd-Warshall algorithm.
+def _capacity_horizons(d, C, giant_tour):
+    """ Returns the maximum number of consecutive customers a route that
+    starts from each of the positions of the (cyclic) giant tour can serve
+    without violating the capacity constraint C. """
+    n = len(giant_tour)
+    if not C:
+        return np.full(n, n)
+    # the giant tour is doubled to allow the routes to wrap around
+    tour = np.concatenate((giant_tour, giant_tour))
+    cum_d = np.concatenate(([0.0], np.cumsum(np.asarray(d, dtype=float)[tour])))
+    last_ends = np.searchsorted(cum_d, cum_d[:n]+C+C_EPS, side='right')-1
+    # always allow the single customer routes, as there is no other way to
+    #  serve such a customer.
+    return np.clip(last_ends-np.arange(n), 1, n)
+    
+def _giant_tour_route_costs(D, d, C, L, giant_tour, route_cost_constant):
+    """ Calculates the costs of the routes that visit consecutive customers
+    of the (cyclic) giant tour in the giant tour order. Returns a matrix where
+    the cost of the route that starts from the giant tour position u and
+    serves the b customers at u, u+1, ..., u+b-1 is at [b-1,u]. The routes
+    that would violate the C or L constraints cost np.inf, and the matrix has
+    only as many rows as the longest feasible route has customers. """
+    n = len(giant_tour)
+    # the giant tour is doubled to allow the routes to wrap around
+    tour = np.concatenate((giant_tour, giant_tour))
+    starts = np.arange(n)
+    
+    from_depot_D = D[0, tour]
+    to_depot_D = D[tour, 0]
+    tour_edge_D = D[tour[:-1], tour[1:]]
+    horizons = _capacity_horizons(d, C, giant_tour)
+    
+    costs = []
+    path_l = from_depot_D[:n].astype(float)
+    feasible = np.ones(n, dtype=bool)
+    for b in range(1, n+1):
+        ends = starts+b-1
+        if b>1:
+            path_l = path_l+tour_edge_D[ends-1]
+        route_cost = path_l+to_depot_D[ends]
+        
+        # A route that violates a constraint cannot be made feasible by
+        #  adding customers. The single customer routes are always allowed.
+        feasible &= horizons>=b
+        if L and b>1:
+            feasible &= route_cost-S_EPS<=L
+        if not feasible.any():
+            break
+        costs.append(np.where(feasible, route_cost+route_cost_constant,
+                              np.inf))
+    return np.array(costs)
+
+def _tsp_route_costs(D, d, C, L, giant_tour, route_cost_constant,
+                     partition_tsp_opt_algo):
+    """ As _giant_tour_route_costs, but the cost of a route is the length of
+    the route optimized with partition_tsp_opt_algo. The route is extended
+    one customer at the time and reoptimized after each addition. """
+    n = len(giant_tour)
+    horizons = _capacity_horizons(d, C, giant_tour)
+    costs = [[] for u in range(n)]
+    for u in range(n):
+        # remember prev route to make local search initial solution better 
+        #  (and thus, convergence faster)
+        route_nodes = [0, 0]
+        for b in range(1, horizons[u]+1):
+            route_nodes[-1] = giant_tour[(u+b-1)%n]
+            route_nodes, route_cost = partition_tsp_opt_algo(D, route_nodes)
+            # L constraint would be violated
+            if L and b>1 and route_cost-S_EPS>L:
+                break
+            costs[u].append(route_cost+route_cost_constant)
+    
+    route_costs = np.full((max(len(uc) for uc in costs), n), np.inf)
+    for u, u_costs in enumerate(costs):
+        route_costs[:len(u_costs), u] = u_costs
+    return route_costs
+
+def _split_giant_tour(route_costs):
+    """ Finds the optimal partition of the cyclic giant tour to routes with the
+    shortest path split algorithm of Beasley (1983) using the route cost
+    matrix of _giant_tour_route_costs. Returns the partition as a list of
+    (u, b) tuples, where u is the giant tour position of the first customer of
+    a route and b the number of customers on the route. 
+    
+    Some route must serve the customer at position 0, and this route starts
+    from at most horizon-1 positions before it. The shortest paths (Bellman
+    1958) through the directed acyclic graph of the linear giant tour are
+    solved simultaneously for each of these start positions.
     """
+    horizon, n = route_costs.shape
+    start_positions = (n-np.arange(min(horizon, n)))%n
+    S = len(start_positions)
+    
+    # the shortest path to position t from each start, and the number of the
+    #  customers on the last route of that path
+    path_costs = np.full((S, n+1), np.inf)
+    path_costs[:,0] = 0.0
+    last_route_b = np.zeros((S, n+1), dtype=int)
+    for t in range(1, n+1):
+        bs = np.arange(1, min(horizon, t)+1)
+        # the routes that end to the position t-1 (for each start position)
+        route_starts = (start_positions[:,np.newaxis]+t-bs)%n
+        candidate_costs = path_costs[:,t-bs]+route_costs[bs-1, route_starts]
+        best_b_idxs = np.argmin(candidate_costs, axis=1)
+        path_costs[:,t] = candidate_costs[np.arange(S), best_b_idxs]
+        last_route_b[:,t] = bs[best_b_idxs]
+    
+    best_s_idx = np.argmin(path_costs[:,n])
+    if __debug__:
+        log(DEBUG-1, "The shortest split starts from the giant tour "+
+                     "position %d (%.2f)"%(start_positions[best_s_idx],
+                                           path_costs[best_s_idx,n]))
     
-    N = len(D) 
-    gtl = len(giant_tour)
+    # walk the shortest path backwards
+    s = start_positions[best_s_idx]
+    partition = []
+    t = n
+    while t>0:
+        b = last_route_b[best_s_idx,t]
+        partition.append( ((s+t-b)%n, b) )
+        t-=b
+    partition.reverse()
+    return partition
+
+def _partition_to_routes(D, d, C, L, giant_tour, route_cost_constant,
+                         partition_tsp_opt_algo, route_tsp_opt_algo):
+    """ Partitions the giant tour solution optimally to routes with the
+    shortest path split algorithm. The routes of the partition are then
+    optimized with route_tsp_opt_algo.
+    """
+    giant_tour = list(giant_tour)
     if giant_tour[0]==giant_tour[-1]:
-        gtl = gtl-1
+        giant_tour = giant_tour[:-1]
+    n = len(giant_tour)
     
-    # these are the dist and next tables of Floyd-Warshall algorithm
-    sequence_D = np.full((N,N), np.inf)
-    next_split = np.zeros((N,N), dtype='int')
     interrupted = False
+    route_costs = None
+    if partition_tsp_opt_algo is not None:
+        try:
+            route_costs = _tsp_route_costs(D, d, C, L, giant_tour,
+                                           route_cost_constant,
+                                           partition_tsp_opt_algo)
+        except KeyboardInterrupt:
+            # fall back to the (fast) giant tour order route costs
+            interrupted = True
+    if route_costs is None:
+        route_costs = _giant_tour_route_costs(D, d, C, L, giant_tour,
+                                              route_cost_constant)
+    partition = _split_giant_tour(route_costs)
     
-    try:
-        ## Build the feasible sequences of nodes on the giant tour
-        u_idx = 0
-        while True:
-            cum_demand = 0.0
-            
-            v_idx = u_idx+1
-            if v_idx==gtl:
-                v_idx = 0
-                
-            # remember prev route to make local search initial solution better 
-            #  (and thus, convergence faster)
-            route_nodes = [0, 0]
-            while True:
-                v = giant_tour[v_idx]
-                
-                # C constraint would be violated, increment u_idx
-                if (C and cum_demand+d[v]-C_EPS>C):
-                    break
-                
-                 # only start checking if the TSP giant tour would break the constraint
-                route_nodes[-1] = v
-                
-                # recycle the tsp result, to save few local search cycles
-                route_nodes, route_cost = partition_tsp_opt_algo(D, route_nodes)
-                
-                # L constraint would be violated, increment u_idx
-                if L and route_cost-S_EPS>L:
-                    break
-                if C: cum_demand+=d[v]
-                
-                # "cost of serving [u+1...v] **after** u"
-                sequence_D[u_idx,v_idx] = route_cost+route_cost_constant
-                next_split[u_idx,v_idx] = v_idx
-                
-                # leave out the last node of the giant tour (same as the first)
-                v_idx+=1
-                if v_idx==gtl:
-                    v_idx = 0
-                if v_idx==u_idx:
-                    break
-            
-            # leave out the last node of the giant tour (same as the first)
-            u_idx+=1
-            if u_idx==gtl:
-                break
-    except KeyboardInterrupt:
-        interrupted = True
-        
-    # Solve using Floyd's algorithm
-    #  note that we cannot use floyd_warshall from scipy.sparse.csgraph, as 
-    #  this initializes the i==i to 0, which is exactly the distance we are 
-    #  interested in!
-    for i in range(N):
-        for j in range(N):
-            for k in range(N):
-                if sequence_D[i,j] > sequence_D[i,k]+sequence_D[k,j]:
-                    sequence_D[i,j] = sequence_D[i,k]+sequence_D[k,j]
-                    next_split[i,j] = next_split[i,k]
-    
-    # build a solution based on the Floyd's algorithm *next* matrix for the 
-    #  least cost tour, 
-    best_start_idx = np.argmin(sequence_D.diagonal())
     sol = [0]
     sol_K = 0
     sol_f = 0.0
-    
-    u_idx = best_start_idx 
-    v_idx = next_split[u_idx, best_start_idx]
-    while True:
-        
-        # Build the route in same way as with the shortcut matrix i.e. adding 
-        # cusotmers to the existing TSP solution and re-optimizing it after 
-        # each step with partition_tsp_opt_algo. Also do it here to avoid a
-        # rare issue where e.g. 3-optimal first accept result may be worse than 
-        # the 2-optimal one for the shortcut matrix which may cause L constr.
-        # violation.
-        route = [0,0]
-        while len(route)==2 or u_idx!=v_idx:
-            if u_idx+1 == gtl:
-                u_idx = -1
-            route[-1] = giant_tour[u_idx+1]
-            if not interrupted:
-                route, _ = partition_tsp_opt_algo(D, route)
-            else:
-                route.append(0)
-            u_idx+=1
-        
+    for u, b in partition:
+        route = [0]+[giant_tour[(u+i)%n] for i in range(b)]+[0]
         if not interrupted:
-            route, route_cost = route_tsp_opt_algo(D, route )
-        
+            try:
+                if partition_tsp_opt_algo is not None:
+                    # Build the route in same way as with the cost matrix to
+                    #  avoid a rare issue where e.g. 3-optimal first accept
+                    #  result may be worse than the 2-optimal one, which may
+                    #  cause L constraint violation.
+                    route_nodes = [0, 0]
+                    for v in route[1:-1]:
+                        route_nodes[-1] = v
+                        route_nodes, _ = partition_tsp_opt_algo(D,route_nodes)
+                    route = route_nodes
+                route, _ = route_tsp_opt_algo(D, route)
+            except KeyboardInterrupt:
+                # record the rest of the routes as they are
+                interrupted = True
+                
         # record the route
         sol.extend(route[1:])
         sol_K += 1
-        sol_f += route_cost
-        
-        # take next route
-        u_idx = v_idx
-        v_idx = next_split[u_idx, best_start_idx]
-        if (u_idx==best_start_idx):
-            break
+        if __debug__:
+            sol_f += objf(route, D)
     
     if __debug__: 
         if not interrupted:
@@ -189,9 +248,13 @@ def route_first_cluster_second_init(D, d, C, L=None, minimize_K=False,
     Then the giant tour TSP solution is partitioned into paths of consecutive
     nodes that satisfy problem constraints e.g. the capacity constraint. From
     the all valid parititions the one with shortest total travel cost is
-    selected as the optimized solution. The method based on Floyd-Warshall
-    algorithm like in from Beasley (1983) is used to find a shortest path of 
-    "shortcuts" (i.e. VRP routes) through this giant tour.
+    selected as the optimized solution. Like in Beasley (1983), a shortest
+    path of "shortcuts" (i.e. VRP routes) through this giant tour is found.
+    The giant tour is cyclic, and the shortest path is solved with Bellman's
+    algorithm for each position the route that serves the first customer of
+    the giant tour can start from. The length of the routes in customers is
+    limited by the C and L constraints, which makes the partitioning linear
+    in the number of customers.
     
     The algorithm expects following parameters:
     
@@ -203,8 +266,14 @@ def route_first_cluster_second_init(D, d, C, L=None, minimize_K=False,
        
     Furthermore, the algorithm can be exdended by using a different giant tour
     generation algorithm tsp_gen_algo and a cluster routing algorihm
-    partition_opt_algo. Both have a signature of algo(D, node_idxs), where D is the 
-    (full) distance matrix and node_idxs a list of node indices to route.
+    partition_tsp_opt_algo. Both have a signature of algo(D, node_idxs), where
+    D is the (full) distance matrix and node_idxs a list of node indices to
+    route. The routes are optimized with partition_tsp_opt_algo before
+    evaluating their cost, which needs a TSP call for each possible route. If
+    partition_tsp_opt_algo is None, the cost of a route is the cost of
+    visiting the customers in the giant tour order, which is calculated for
+    all routes at once with numpy. Finally, the routes of the partition are
+    optimized with route_tsp_opt_algo.
     Giving a random giant tour initialization with 2-opt improvement step as
     tsp_gen_algo and 3-opt improvement as tsp_opt_algo the results of 
     Beasley (1983) can be replicated.
@@ -231,7 +300,7 @@ def route_first_cluster_second_init(D, d, C, L=None, minimize_K=False,
         log(DEBUG, "TSP tour solution %s (%.2f)"%(str(giant_tour_sol),giant_tour_l))
         
     route_cost_constant = giant_tour_l if minimize_K else 0.0    
-    return _partition_to_routes_with_cost_matrix(D, d, C, L,
+    return _partition_to_routes(D, d, C, L,
                                 giant_tour_sol, route_cost_constant, 
                                 partition_tsp_opt_algo, route_tsp_opt_algo)
 
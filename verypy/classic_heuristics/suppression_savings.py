@@ -20,7 +20,10 @@ from builtins import range
 
 from logging import log, DEBUG
 
-from verypy.classic_heuristics.parallel_savings import parallel_savings_init
+import numpy as np
+
+from verypy.classic_heuristics.parallel_savings import parallel_savings_init,\
+    upper_triangle_savings, lazy_sorted_savings
 from verypy.util import objf, is_better_sol
 
 __author__ = "Jussi Rasku"
@@ -33,6 +36,28 @@ __status__ = "Development"
 
 
 
+def _suppression_row_savings(D, i, js):
+    D_ij = D[i,js]
+    # Note,  Holmes & Parker (1976) do not use neg. values
+    return np.maximum(0, D[i,0]+D[0,js]-D_ij), -D_ij
+
+def _merge_sorted_savings(savings, suppressed_savings, suppressed):
+    """ Yields the savings from the two lists sorted in a descending order.
+    The savings in the first list that have been suppressed are skipped. """
+    remaining = iter(suppressed_savings)
+    next_suppressed = next(remaining, None)
+    for saving in savings:
+        if (saving[2], saving[3]) in suppressed:
+            continue
+        while next_suppressed is not None and next_suppressed>saving:
+            yield next_suppressed
+            next_suppressed = next(remaining, None)
+        yield saving
+    if next_suppressed is not None:
+        yield next_suppressed
+        for saving in remaining:
+            yield saving
+
 def supression_savings_function(D, suppressed, savings_cache=None):
     """
     This does the basic savings calculation:
@@ -40,51 +65,40 @@ def supression_savings_function(D, suppressed, savings_cache=None):
     but with a twist: A set of *suppressed* merges is kept, and these
     (i,j) pairs are set to have savings value of 0.0 in the savings list. To
     avoid recalculation of the savings values, an empty savings_cache (list
-    object) can be given. In subsequent iterations, it is then reused and
-    the *topmost* suppressed values (according to the suppressed set) are set
-    to savings value 0.0 and the savings list is then re-sorted."""
+    object) can be given. In subsequent iterations, it is then reused. The
+    sorted savings in the cache are never modified nor re-sorted. Instead,
+    the suppressed savings (with the value 0.0) are merged in from a small
+    separate sorted list when the savings are iterated over. Hence, the
+    returned savings are a generator.
+    
+    The first (best) savings merge is added to the suppressed set, and it
+    is suppressed on the next call."""
     
-    N = len(D);
-    n = N-1
     if not savings_cache:
+        sorted_savings = list(lazy_sorted_savings(
+            *upper_triangle_savings(D, _suppression_row_savings)))
         if type(savings_cache) is list:
-            savings_cache[:] = [None]*int((n*n-n)/2)
+            savings_cache[:] = sorted_savings
         else:
-            savings_cache = [None]*int((n*n-n)/2)
-        idx = 0
-        for i in range(1,N):
-            for j in range(i+1,N):
-                if (i,j) in suppressed:
-                    savings_cache[idx] = (0,-D[i,j],i,j)
-                else:
-                    # Note,  Holmes & Parker (1976) do not use neg. values
-                    s = max(0, D[i,0]+D[0,j]-D[i,j])
-                    savings_cache[idx] = (s,-D[i,j],i,j)
-                idx+=1
-        savings_cache.sort(reverse=True)
-    else:
-        # reuse the savings from the savings cache
-        modified_savings = False
-        si = 0
-        # remove all suppressed from the cache
-        while (savings_cache[si][2], savings_cache[si][3]) in suppressed:
-            # replace the savings record with one with suppressed value (0)
-            savings_cache[si] = (0, savings_cache[si][1],
-                         savings_cache[si][2], savings_cache[si][3],)
-            modified_savings = True
-            si+=1
-        if modified_savings:
-            savings_cache.sort(reverse=True)
-            
+            savings_cache = sorted_savings
+    
+    # The suppressed savings have a value of 0 and they are in the same order
+    #  they would be in the sorted list.
+    #  (a copy of the set is used, as the new suppression is not yet applied)
+    currently_suppressed = set(suppressed)
+    suppressed_savings = sorted(((0,-D[i,j],i,j) for i,j in suppressed),
+                                reverse=True)
     
-    first_savings = savings_cache[0]
+    first_savings = next(_merge_sorted_savings(savings_cache,
+                                               suppressed_savings,
+                                               currently_suppressed))
     suppress = (first_savings[2], first_savings[3])
     if __debug__:
         log(DEBUG, "Suppressing merge %s"%str(suppress))
     suppressed.add( suppress )
     
-    
-    return savings_cache 
+    return _merge_sorted_savings(savings_cache, suppressed_savings,
+                                 currently_suppressed)
 
 def suppression_savings_init(D,d,C,L, minimize_K=False, Lprime="auto"):
     """
@@ -20,17 +20,22 @@ from __future__ import division
     
 from math import pi
 from logging import log, DEBUG
+from signal import signal, SIGINT, SIG_IGN
+from multiprocessing import Pool, current_process
 
 import numpy as np
 
 #  the ordered property is used by wren_holliday (the routes are built in the
 #  order the nodes are added during the sweep).
 from verypy.util import OrderedDictSet as OrderedSet
-from verypy.util import objf, without_empty_routes, is_better_sol
+from verypy.util import objf, without_empty_routes, is_better_sol,\
+    progress_reporter
 from verypy.routedata import RouteData
+from verypy.tsp_solvers.tsp_cache import RouteTSPCache
 
 from verypy.config import CAPACITY_EPSILON as C_EPS
 from verypy.config import COST_EPSILON as S_EPS
+from verypy.config import SWEEP_JOBS
 
 
 __author__ = "Jussi Rasku"
@@ -373,9 +378,58 @@ def get_sweep_from_cartesian_coordinates(pts):
     return get_sweep_from_polar_coordinates(rhos,phis)
 
 
+def _route_in_sweep_order(D, node_set):
+    """ The default routing_algo of the sweep generates the route from the
+    list of nodes in the order they were swept. Assumes that the depot (0) is
+    the first of node_set. """
+    route = list(node_set)+[0]
+    return route, objf(route, D)
+
+def _do_one_sweep_solution(sweep_args, start, step_inc):
+    """ Does one sweep with do_one_sweep and returns the resulting solution
+    as a (sol, sol_f, sol_K) tuple. The sweep_args are the arguments that
+    are the same for all the sweeps of sweep_init. """
+    N, D, d, C, L, routing_algo, sweep, intra_route_callback,\
+        inter_route_callback, callback_data = sweep_args
+    if __debug__:
+        log(DEBUG, "\nDo a sweep from position %d (n%d) by steps of %d"%
+                     (start,sweep[2][start],step_inc))
+    
+    ## This does one sweep from one start location to one direction
+    routes = do_one_sweep(N, D, d, C, L, routing_algo,
+                               sweep, start, step_inc,
+                               False,
+                               intra_route_callback,
+                               inter_route_callback,
+                               callback_data)            
+        
+    sol = [n for rd in routes for n in rd.route[:-1]]+[0]
+    # LS of the callbacks may cause empty routes
+    sol = without_empty_routes(sol)
+    sol_f = objf( sol, D )   
+    sol_K = sol.count(0)-1
+
+    if __debug__:
+        log(DEBUG, "Previous sweep produced solution %s (%.2f)\n\n" %
+                     (str(sol),sol_f))
+    return sol, sol_f, sol_K
+
+# The sweep worker processes get the shared sweep arguments only once
+_worker_sweep_args = None
+def _init_sweep_worker(sweep_args):
+    global _worker_sweep_args
+    _worker_sweep_args = sweep_args
+    # the interrupts are handled in the main process
+    signal(SIGINT, SIG_IGN)
+    
+def _sweep_worker_task(task):
+    start, step_inc = task
+    return _do_one_sweep_solution(_worker_sweep_args, start, step_inc)
+
 def sweep_init(coordinates, D, d, C, L=None, minimize_K=False,
                direction="both", seed_node=BEST_ALTERNATIVE,
-               routing_algo=None, **callbacks):
+               routing_algo=None, jobs=SWEEP_JOBS, progress_callback=None,
+               **callbacks):
     """
     This algorithm was proposed in Wren (1971) and in Wren & Holliday
     (1972). Sweep was also proposed in Gillett and Miller (1974) who
@@ -423,6 +477,16 @@ def sweep_init(coordinates, D, d, C, L=None, minimize_K=False,
        staring id, or a positive integer explicitly specifying the node id to
        start from. Also, a list of indexes can be given. These are explicit
        sweep indexes and it is adviseable to give also the sweep parameter.
+    * routing_algo is an optional TSP solver function (D, node_list) ->
+       (route, cost) that is used to route the nodes. The solutions are
+       memoized with a RouteTSPCache (that can also be given directly to
+       share it with e.g. the improvement callbacks). The default is to
+       visit the nodes in the order they were swept.
+    * jobs is the number of worker processes used to do the sweeps from the
+       different start positions and directions in parallel. The solution is
+       the same as with a single process (jobs=1).
+    * progress_callback is an optional function (sol, sol_f, sol_K, elapsed)
+       that is called with the improving solutions as the sweeps are done.
     
     Wren, A. (1971), "Computers in Transport Planning and Operation", Ian 
       Allan, London.
@@ -469,10 +533,12 @@ def sweep_init(coordinates, D, d, C, L=None, minimize_K=False,
      
     ## Make sure there is a valid route improvement method
     if routing_algo is None:
-        # Default generates the route from the list of nodes in the order they
-        #  were swept. Assume that depot (0) is the first of node_set.
-        routing_algo = lambda D, node_set: (list(node_set)+[0],
-                                            objf(list(node_set)+[0],D))
+        routing_algo = _route_in_sweep_order
+    elif not isinstance(routing_algo, RouteTSPCache):
+        # The neighboring start positions produce mostly the same routes.
+        #  Solve each TSP only once. The order of the nodes is respected to
+        #  keep the sweeps independent of each other.
+        routing_algo = RouteTSPCache(routing_algo, ignore_order=False)
         
     ## for exteding Sweep with improvement heuristics
     callback_data = None
@@ -490,38 +556,45 @@ def sweep_init(coordinates, D, d, C, L=None, minimize_K=False,
     best_sol = None
     best_f = None  
     best_K = None
+    report = progress_reporter(progress_callback, minimize_K)
     
+    sweep_args = (N, D, d, C, L, routing_algo, sweep, intra_route_callback,
+                  inter_route_callback, callback_data)
+    tasks = [(start, step_inc) for step_inc in step_incs for start in starts]
+    # a daemonic process (e.g. a worker of a pool) cannot have child processes
+    parallel = jobs>1 and len(tasks)>1 and not current_process().daemon
+    
+    pool = None
     try:
-        for step_inc in step_incs:
-            for start in starts:
-                if __debug__:
-                    log(DEBUG, "\nDo a sweep from position %d (n%d) by steps of %d"%
-                                 (start,sweep[2][start],step_inc))
-                
-                ## This does one sweep from one start location to one direction
-                routes = do_one_sweep(N, D, d, C, L, routing_algo,
-                                           sweep, start, step_inc,
-                                           False,
-                                           intra_route_callback,
-                                           inter_route_callback,
-                                           callback_data)            
-                    
-                sol = [n for rd in routes for n in rd.route[:-1]]+[0]
-                # LS of the callbacks may cause empty routes
-                sol = without_empty_routes(sol)
-                sol_f = objf( sol, D )   
-                sol_K = sol.count(0)-1
+        if parallel:
+            # Contiguous chunks of start positions share many of the routes
+            #  (and the TSP cache of the worker).
+            chunksize = max(1, len(tasks)//(jobs*4))
+            pool = Pool(jobs, _init_sweep_worker, (sweep_args,))
+            sweep_sols = pool.imap(_sweep_worker_task, tasks, chunksize)
+        else:
+            sweep_sols = (_do_one_sweep_solution(sweep_args, start, step_inc)
+                          for start, step_inc in tasks)
         
-                if __debug__:
-                    log(DEBUG, "Previous sweep produced solution %s (%.2f)\n\n" %
-                                 (str(sol),sol_f))
-                    
-                if is_better_sol(best_f, best_K, sol_f, sol_K, minimize_K):
-                    best_sol = sol
-                    best_f = sol_f
-                    best_K = sol_K
+        # the solutions are compared in the same order in both cases
+        for sol, sol_f, sol_K in sweep_sols:
+            if is_better_sol(best_f, best_K, sol_f, sol_K, minimize_K):
+                best_sol = sol
+                best_f = sol_f
+                best_K = sol_K
+                report(best_sol, best_f, best_K)
     except KeyboardInterrupt: # or SIGINT
         raise KeyboardInterrupt(best_sol)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    
+    if __debug__:
+        # the workers have their own caches
+        if isinstance(routing_algo, RouteTSPCache) and not parallel:
+            log(DEBUG, "Route TSP cache had %d hits and %d misses"%
+                       (routing_algo.hits, routing_algo.misses))
         
     return best_sol
 
@@ -531,11 +604,13 @@ def sweep_init(coordinates, D, d, C, L=None, minimize_K=False,
 def get_swp_algorithm():
     algo_name = "Sweep"
     algo_desc = "Sweep algorithm without route improvement heuristics"
-    def call_init(points, D, d, C, L, st, wtt, single, minimize_K):
+    def call_init(points, D, d, C, L, st, wtt, single, minimize_K,
+                  progress_callback=None):
         seed_search = SMALLEST_ANGLE if single else BEST_ALTERNATIVE
         direction = "cw" if single else "both"
         return sweep_init(points, D, d, C, L, minimize_K,
-                          direction=direction, seed_node=seed_search)
+                          direction=direction, seed_node=seed_search,
+                          progress_callback=progress_callback)
     call_init.__doc__ = sweep_init.__doc__
     return (algo_name, algo_desc, call_init)
     
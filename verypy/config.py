@@ -13,6 +13,41 @@ DEBUG_VERBOSITY = 3
 COST_EPSILON = 1e-10
 CAPACITY_EPSILON = 1e-10
 
+# routes at least this long are evaluated with NumPy in the intra route local
+#  search operators (when the operator is called with vectorized=None)
+VECTORIZED_LS_MIN_ROUTE_LEN = 12
+# upper bound for the number of move deltas evaluated in one NumPy batch 
+VECTORIZED_LS_BATCH_SIZE = 2**18
+# upper bound for the number of insertion costs evaluated in one NumPy batch
+#  by the cheapest insertion heuristics
+INSERTION_BATCH_SIZE = 2**18
+# the number of nearest neighbours (k) used by the granular local search
+GRANULAR_NEIGHBORHOOD_SIZE = 10
+
+# how many nearest neighbours of a node are looked up at first by the nearest
+#  neighbor heuristics (the block size is doubled when they are consumed)
+NEAREST_NEIGHBOR_BLOCK_SIZE = 16
+# upper bound for the number of GEO, ATT and haversine distances calculated in
+#  one NumPy batch by cvrp_io.calculate_D
+DISTANCE_BATCH_SIZE = 2**18
+
+# how many of the largest savings are sorted at first by the lazy savings list
+SAVINGS_CHUNK_SIZE = 2**14
+
+# how many distance matrix rows the DistanceOracle keeps in memory
+DISTANCE_ORACLE_CACHED_ROWS = 1024
+
+# how many route TSP solutions the heuristics keep memoized (0 disables)
+ROUTE_TSP_CACHE_SIZE = 2**14
+
+# the number of worker processes the sweep heuristics use to try the start
+#  positions in parallel (1 is serial)
+SWEEP_JOBS = 1
+
+# the number of worker processes the Paessens savings uses to try the (g,f)
+#  parameter combinations in parallel (1 is serial)
+PAESSENS_JOBS = 1
+
 # how many seconds we give to a MIP solver
 MAX_MIP_SOLVER_RUNTIME = 60*10 # 10m
 
@@ -21,6 +56,15 @@ MIP_SOLVER_THREADS = 1 # 0 is automatic (parallel computing)
 # Set up some paths where to find benchmarks and external solvers
 HOME_PATH = path.expanduser("~")
 
+# compiled (binary) problem instances are cached here, set to None to disable
+PROBLEM_CACHE_DIR = path.join(HOME_PATH, ".cache", "verypy", "problems")
+# the solutions of the CLI and the web GUI solves are cached here, set to None
+#  to disable
+SOLUTION_CACHE_DIR = path.join(HOME_PATH, ".cache", "verypy", "solutions")
+# the least recently used solutions are removed when the solution cache grows
+#  larger than this (in bytes)
+SOLUTION_CACHE_MAX_SIZE = 2**26
+
 BENCHMARKS_BASEPATH = path.join(HOME_PATH, r"Research/VRPBenchmarks")
 
 LKH_EXE_PATH = path.join(HOME_PATH, r"Research/TSP/LKH-2.0.9/lkh"+exe_ext)
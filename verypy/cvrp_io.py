@@ -12,7 +12,10 @@ from builtins import range
 
 import os
 import re
+import json
 import random
+import hashlib
+import tempfile
 
 from collections import namedtuple
 from math import pi, radians, cos, sin, asin, sqrt, acos, modf
@@ -22,6 +25,8 @@ from sys import stderr
 import numpy as np
 from scipy.spatial.distance import pdist, cdist, squareform
 
+from verypy.config import PROBLEM_CACHE_DIR, DISTANCE_BATCH_SIZE
+
 __author__ = "Jussi Rasku"
 __copyright__ = "Copyright 2022, Jussi Rasku"
 __credits__ = ["Jussi Rasku"]
@@ -77,7 +82,62 @@ def _att(pt1,pt2):
     t = int(r)
     return t+1 if t<r else t
 
+def _haversine_rows(pts, opts):
+    """ Vectorized _haversine from each of the pts to each of the opts. """
+    degrees_to_radians = pi/180.0
+    lon1 = (pts[:,0]*degrees_to_radians)[:,np.newaxis]
+    lat1 = (pts[:,1]*degrees_to_radians)[:,np.newaxis]
+    lon2 = opts[:,0]*degrees_to_radians
+    lat2 = opts[:,1]*degrees_to_radians
+    a = np.sin((lat2-lat1)/2)**2 + \
+        np.cos(lat1)*np.cos(lat2)*np.sin((lon2-lon1)/2)**2
+    return 6367*(2*np.arcsin(np.sqrt(a)))
+
+def _geo_rows(pts, opts):
+    """ Vectorized _geo from each of the pts to each of the opts. """
+    RRR = 6378.388
+    latitude_i_rads = pts[:,0][:,np.newaxis]
+    longitude_i_rads = pts[:,1][:,np.newaxis]
+    latitude_j_rads = opts[:,0]
+    longitude_j_rads = opts[:,1]
+    
+    q1 = np.cos(longitude_i_rads - longitude_j_rads)
+    q2 = np.cos(latitude_i_rads - latitude_j_rads)
+    q3 = np.cos(latitude_i_rads + latitude_j_rads)
+    return np.trunc( RRR*np.arccos(0.5*((1.0+q1)*q2-(1.0-q1)*q3))+1.0 )
+
+def _att_rows(pts, opts):
+    """ Vectorized _att from each of the pts to each of the opts. """
+    dx = pts[:,0][:,np.newaxis]-opts[:,0]
+    dy = pts[:,1][:,np.newaxis]-opts[:,1]
+    r = np.sqrt(dx**2+dy**2)/10.0
+    t = np.trunc(r)
+    t[t<r]+=1.0
+    return t
+
+def _blockwise_D(row_distances, pts, opts):
+    """ Calculates the distance matrix from the pts to the opts in blocks of
+    rows with the vectorized row_distances function. The distances between
+    the pts are calculated if opts is None, and then the diagonal is 0 as
+    with pdist. """
+    pts = np.asarray(pts, dtype=float)
+    same_points = opts is None
+    opts = pts if same_points else np.asarray(opts, dtype=float)
+    D = np.empty( (len(pts), len(opts)) )
+    block_rows = max(1, DISTANCE_BATCH_SIZE//max(1, len(opts)))
+    for start in range(0, len(pts), block_rows):
+        D[start:start+block_rows] = row_distances(pts[start:start+block_rows],
+                                                  opts)
+    if same_points:
+        np.fill_diagonal(D, 0.0)
+    return D
+
 def calculate_D(pts, opts=None, tsplib_distances_type='EUC_2D'):
+    """ Calculates the distance matrix between the pts (or from the pts to the
+    opts) using the TSPLIB EDGE_WEIGHT_TYPE tsplib_distances_type. The GEO
+    points are expected to be in radians (as read by read_TSPLIB_CVRP). Also
+    the great circle distance in kilometers between the (longitude, latitude)
+    points in decimal degrees can be calculated with 'HAVERSINE'. """
     pdtype = 'euclidean'
     postprocess = lambda M: M
     
@@ -92,9 +152,11 @@ def calculate_D(pts, opts=None, tsplib_distances_type='EUC_2D'):
     elif tsplib_distances_type=='EUC_2D':
         postprocess = lambda D: np.round(D).astype(int)
     elif tsplib_distances_type=='ATT':
-        pdtype = lambda v,w : _att(v, w)
+        return _blockwise_D(_att_rows, pts, opts)
     elif tsplib_distances_type=='GEO':
-        pdtype = lambda v,w : _geo(v, w)
+        return _blockwise_D(_geo_rows, pts, opts)
+    elif tsplib_distances_type=='HAVERSINE':
+        return _blockwise_D(_haversine_rows, pts, opts)
     elif tsplib_distances_type=='EXACT_2D':
         pass
     else:
@@ -153,6 +215,52 @@ def read_OPT_CVRP(file_name):
     return solution, opt_f, opt_k
          
        
+# the (k, with_diagonal) arguments of np.tril_indices/np.triu_indices
+#  that produce the (row, col) pairs of a triangular EDGE_WEIGHT_FORMAT in the
+#  order they are listed in the file. Note that the column-wise lower triangle
+#  is the same sequence as the row-wise upper triangle.
+_TRIANGULAR_EDGE_WEIGHT_FORMATS = {
+    "LOWER_ROW":(np.tril_indices, -1),
+    "LOWER_DIAG_ROW":(np.tril_indices, 0),
+    "UPPER_ROW":(np.triu_indices, 1),
+    "LOWER_COL":(np.triu_indices, 1),
+    "UPPER_DIAG_ROW":(np.triu_indices, 0)}
+
+def _expand_edge_weight_section(lines, n, edge_weight_format, strict):
+    """ Converts the lines of an EDGE_WEIGHT_SECTION into a symmetric n x n
+    distance matrix. If the weights are given for both triangles
+    (FULL_MATRIX), the lower triangle is used. If the number of weights does
+    not match the format, None is returned when strict. Otherwise, the
+    missing weights are taken to be 0 and the extra ones are ignored. """
+    weights = np.fromstring(" ".join(lines), sep=" ")
+    
+    if edge_weight_format=="FULL_MATRIX":
+        weight_count = n*n
+    elif edge_weight_format in _TRIANGULAR_EDGE_WEIGHT_FORMATS:
+        diagonal = _TRIANGULAR_EDGE_WEIGHT_FORMATS[edge_weight_format][1]==0
+        weight_count = n*(n+1)//2 if diagonal else n*(n-1)//2
+    else:
+        return None if strict else np.zeros((n,n))
+    
+    if len(weights)!=weight_count:
+        if strict:
+            return None
+        padded_weights = np.zeros(weight_count)
+        padded_weights[:len(weights)] = weights[:weight_count]
+        weights = padded_weights
+    
+    if edge_weight_format=="FULL_MATRIX":
+        W = weights.reshape(n,n)
+        D = np.tril(W)
+        D += np.tril(W, -1).T
+    else:
+        tri_indices_f, k = _TRIANGULAR_EDGE_WEIGHT_FORMATS[edge_weight_format]
+        rows, cols = tri_indices_f(n, k)
+        D = np.zeros((n,n))
+        D[rows, cols] = weights
+        D[cols, rows] = weights
+    return D
+
 ProblemDefinition = namedtuple('ProblemDefinition',
     ['size', 'coordinate_points', 'display_coordinate_points',
      'customer_demands', 'distance_matrix', 'capacity_constraint', 'edge_weight_type'])
@@ -200,7 +308,6 @@ def read_TSPLIB_CVRP(file_name):
         
         section = None
         section_pos = 0
-        ij_section_pos = {'i':0,'j':0}
         N=0
         C=None
         
@@ -209,12 +316,13 @@ def read_TSPLIB_CVRP(file_name):
         demands = None
         D = None
         D_needs_update = False     
+        edge_weight_lines = None
         edge_weight_type = None
         edge_weight_format = None
         
         depot_ids = []
         
-        for l in fh.readlines():
+        for l in fh:
             line = l.strip()
 
             if not line:
@@ -248,13 +356,9 @@ def read_TSPLIB_CVRP(file_name):
             
                 if 'EDGE_WEIGHT_SECTION' in line:
                     section = 'EDGE_WEIGHT_SECTION'
-                    D = np.zeros((N+1,N+1))
-                    ij_section_pos = {'i':0,'j':0}
-                    if (edge_weight_format=="LOWER_ROW"):
-                        ij_section_pos['j']=1
-                    elif (edge_weight_format=="UPPER_ROW" or
-                        edge_weight_format=="LOWER_COL"):
-                        ij_section_pos['i']=1
+                    # the weights are converted in bulk after reading
+                    edge_weight_lines = []
+                    edge_weight_N = N
                 elif 'DEMAND_SECTION' in line:
                     demands = [None]*(N+1)
                     section = 'DEMAND_SECTION'
@@ -282,46 +386,7 @@ def read_TSPLIB_CVRP(file_name):
                     section = 'SVC_TIME_SECTION'
                 else:
                     if section == 'EDGE_WEIGHT_SECTION':
-                        distances = line.split() 
-                        #print distances, section_pos, edge_weight_format
-                        for d in distances: 
-                            
-                            D[ij_section_pos['i']][ij_section_pos['j']] = float(d)
-                            D[ij_section_pos['j']][ij_section_pos['i']] = float(d)   
-                            
-                            if (edge_weight_format=="LOWER_ROW"):
-                                # incrementer
-                                ij_section_pos['i']+=1
-                                if ij_section_pos['i']==ij_section_pos['j']:
-                                    ij_section_pos['i'] = 0
-                                    ij_section_pos['j'] += 1                            
-                            elif (edge_weight_format=="UPPER_ROW" or 
-                                  edge_weight_format=="LOWER_COL"):
-                                # incrementer
-                                ij_section_pos['i']+=1
-                                if ij_section_pos['i']==len(D):
-                                    ij_section_pos['j'] += 1
-                                    ij_section_pos['i'] = ij_section_pos['j']+1                                    
-                            elif (edge_weight_format=="FULL_MATRIX"):
-                                # incrementer
-                                ij_section_pos['i']+=1
-                                if ij_section_pos['i']==len(D):
-                                    ij_section_pos['j'] += 1
-                                    ij_section_pos['i'] = 0
-                            elif (edge_weight_format=="LOWER_DIAG_ROW"):
-                                # incrementer
-                                ij_section_pos['i']+=1
-                                if ij_section_pos['i']==ij_section_pos['j']+1:
-                                    ij_section_pos['i'] = 0
-                                    ij_section_pos['j'] += 1
-                            elif (edge_weight_format=="UPPER_DIAG_ROW"):
-                                # incrementer
-                                ij_section_pos['i']+=1
-                                if ij_section_pos['i']==len(D):
-                                    ij_section_pos['j'] += 1
-                                    ij_section_pos['i'] = ij_section_pos['j']                            
-                            
-                            
+                        edge_weight_lines.append(line)
                     elif section == 'NODE_COORD_SECTION':
                         coords = line.split()
                         x = float( coords [1] )
@@ -358,18 +423,12 @@ def read_TSPLIB_CVRP(file_name):
                             if len(depot_ids)>1:
                                 raise IOError("multi depot problems not supported")
                     
-        fh.close()
-        
-        if edge_weight_type=='EXPLICIT' and not (
-                ((edge_weight_format in ['FULL_MATRIX', 'LOWER_ROW', 'LOWER_DIAG_ROW']) and \
-                    ij_section_pos['i']==0 and ij_section_pos['j']==len(D)) or\
-                  (edge_weight_format in ['UPPER_ROW','LOWER_COL'] and \
-                    ij_section_pos['i']==len(D) and ij_section_pos['j']==len(D)-1) or\
-                  (edge_weight_format == 'UPPER_DIAG_ROW' and \
-                    ij_section_pos['i']==len(D) and ij_section_pos['j']==len(D))
-                ):
-            #print edge_weight_format, ij_section_pos 
-            raise IOError("Explicit distance matrix did not have enough values")
+    if edge_weight_lines is not None:
+        D = _expand_edge_weight_section(edge_weight_lines, edge_weight_N+1,
+                                        edge_weight_format,
+                                        edge_weight_type=='EXPLICIT')
+    if edge_weight_type=='EXPLICIT' and D is None:
+        raise IOError("Explicit distance matrix did not have enough values")
     
     if D_needs_update:
         D = calculate_D(points, None, edge_weight_type )
@@ -444,6 +503,154 @@ def read_TSBLIB_additional_constraints(custom_tsplib_file):
                 reading_service_time_section = True
                     
     return K, L, ST
+
+def build_CVRP(coordinates, demands=None, C=None, edge_weight_type='EUC_2D',
+               depot_node=1):
+    """ Builds the problem in memory from the node coordinates as
+    read_TSPLIB_CVRP would read it from a TSPLIB file with these
+    NODE_COORD_SECTION and DEMAND_SECTION. As in TSPLIB, the depot_node is
+    the 1-based index of the depot, and it is moved to the index 0. Also, the
+    GEO coordinates are in the degrees.minutes format. Returns a
+    ProblemDefinition namedtuple. Raises ValueError if the coordinates or the
+    demands are not valid.
+    """
+    points = np.asarray(coordinates, dtype=float)
+    if points.ndim!=2 or points.shape[1]!=2 or len(points)<1:
+        raise ValueError("The coordinates must be given as (x, y) pairs")
+    if demands is not None:
+        demands = [float(demand) for demand in demands]
+        if len(demands)!=len(points):
+            raise ValueError("There must be a demand for each node")
+    if not 1<=depot_node<=len(points):
+        raise ValueError("The depot node %d is not one of the nodes"%
+                         depot_node)
+    
+    # make sure depot is the 0
+    order = [depot_node-1]+[i for i in range(len(points)) if i!=depot_node-1]
+    points = points[order]
+    if demands is not None:
+        demands = [demands[i] for i in order]
+    if edge_weight_type=='GEO':
+        points = np.vectorize(_degrees_and_minutes_to_radians)(points)
+    D = calculate_D(points, None, edge_weight_type)
+    
+    points = points.tolist()
+    dd_points = None
+    if edge_weight_type=="GEO":
+        dd_points = points
+        points = None
+    return ProblemDefinition(len(D)-1, points, dd_points, demands, D, C,
+                             edge_weight_type)
+ 
+# bump this if the layout of the compiled problem files changes
+COMPILED_PROBLEM_FORMAT_VERSION = 1
+
+def _compiled_problem_paths(file_name, cache_dir):
+    """ The compiled problem is stored as two files: a small JSON header with
+    everything but the distance matrix, and the distance matrix as a raw .npy
+    file that can be memory mapped. The names are keyed on the hash of the
+    source file contents so that an edited file is recompiled. """
+    h = hashlib.sha1()
+    h.update(str(COMPILED_PROBLEM_FORMAT_VERSION).encode('ascii'))
+    with open(file_name, "rb") as fh:
+        for chunk in iter(lambda: fh.read(2**20), b''):
+            h.update(chunk)
+    base_name = os.path.splitext(os.path.basename(file_name))[0]
+    key = "%s-%s"%(base_name, h.hexdigest()[:20])
+    return (os.path.join(cache_dir, key+".json"),
+            os.path.join(cache_dir, key+".npy"))
+
+def _atomic_write(target_path, write_f, mode):
+    """ Write to a temporary file in the same directory and rename it over the
+    target to avoid (parallel) readers seeing a partially written file. """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target_path),
+                                    suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode) as fh:
+            write_f(fh)
+        os.replace(tmp_path, target_path)
+    except:
+        os.remove(tmp_path)
+        raise
+
+def _write_compiled_problem(file_name, cache_dir, pd, constraints):
+    K, L, ST = constraints
+    header_path, D_path = _compiled_problem_paths(file_name, cache_dir)
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    header = {'size':pd.size,
+              'coordinate_points':pd.coordinate_points,
+              'display_coordinate_points':pd.display_coordinate_points,
+              'customer_demands':pd.customer_demands,
+              'capacity_constraint':pd.capacity_constraint,
+              'edge_weight_type':pd.edge_weight_type,
+              'vehicle_count_constraint':K,
+              'maximum_route_cost_constraint':L,
+              'service_time_at_customer':ST,
+              'has_distance_matrix':pd.distance_matrix is not None}
+    # The header is written last as its presence marks a complete compile.
+    if pd.distance_matrix is not None:
+        _atomic_write(D_path,
+            lambda fh: np.save(fh, np.ascontiguousarray(pd.distance_matrix)),
+            "wb")
+    _atomic_write(header_path, lambda fh: json.dump(header, fh), "w")
+    return header_path
+
+def compile_TSPLIB_CVRP(file_name, cache_dir=PROBLEM_CACHE_DIR):
+    """ Parses the TSPLIB file (and the additional constraints in it) and
+    writes the compiled problem to the cache_dir. Returns the path of the
+    JSON header of the compiled problem. """
+    pd = read_TSPLIB_CVRP(file_name)
+    constraints = read_TSBLIB_additional_constraints(file_name)
+    return _write_compiled_problem(file_name, cache_dir, pd, constraints)
+
+def read_compiled_CVRP(file_name, cache_dir=PROBLEM_CACHE_DIR,
+                       mmap_mode='r'):
+    """ Reads a TSPLIB CVRP file through a cache of compiled problems. The
+    first read parses the file and stores the result in the cache_dir, the
+    later reads load the distance matrix with np.load(mmap_mode=mmap_mode).
+    The default read-only mode allows the operating system to share the
+    pages of D between processes solving the same problem. The algorithms
+    do not modify D, but if a caller must, use mmap_mode='c' (copy-on-write)
+    or copy D. Returns the ProblemDefinition,
+    as read_TSPLIB_CVRP would, and the (K, L, ST) tuple, as
+    read_TSBLIB_additional_constraints would.
+    
+    If cache_dir is None or the cache cannot be written, the file is
+    parsed as usual.
+    """
+    if cache_dir is None:
+        return (read_TSPLIB_CVRP(file_name),
+                read_TSBLIB_additional_constraints(file_name))
+    
+    header_path, D_path = _compiled_problem_paths(file_name, cache_dir)
+    try:
+        with open(header_path, "r") as fh:
+            header = json.load(fh)
+        D = None
+        if header['has_distance_matrix']:
+            D = np.load(D_path, mmap_mode=mmap_mode)
+    except (IOError, OSError, ValueError, KeyError):
+        # not compiled yet (or the compiled files are broken)
+        pd = read_TSPLIB_CVRP(file_name)
+        constraints = read_TSBLIB_additional_constraints(file_name)
+        try:
+            _write_compiled_problem(file_name, cache_dir, pd, constraints)
+        except (IOError, OSError) as e:
+            print("WARNING: could not write the compiled problem to %s (%s)"%
+                  (cache_dir, str(e)), file=stderr)
+        return pd, constraints
+    
+    pd = ProblemDefinition(header['size'],
+                           header['coordinate_points'],
+                           header['display_coordinate_points'],
+                           header['customer_demands'],
+                           D,
+                           header['capacity_constraint'],
+                           header['edge_weight_type'])
+    return pd, (header['vehicle_count_constraint'],
+                header['maximum_route_cost_constraint'],
+                header['service_time_at_customer'])
  
 def generate_CVRP(N, C, muC, sdC, regular=False, R=200.0):
     """ Generate new random CVRP with N customer points and capacity of C.
@@ -236,6 +236,10 @@ def D2D_c(D, st):
     if not st:
         raise ValueError("Service time not set")
     
+    # the lazily calculated distances (DistanceOracle) bake it in on demand
+    if hasattr(D, 'with_service_time'):
+        return D.with_service_time(st)
+    
     tst = D.dtype.type(st)
     if float(tst)!=float(st) or float(tst/2)!=float(st/2.0):
         D_c = D.astype('d')
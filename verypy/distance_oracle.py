@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+################################################################################
+""" This file implements a distance oracle that can be used in place of the
+dense distance matrix D for instances that are too large for it. The
+distances are calculated from the coordinates when they are needed and the
+most recently used rows of the matrix are cached.
+
+The oracle supports the usual D[i,j], D[i,:], D[i], len(D), D.shape and
+D.dtype access patterns and returns the same values than the dense matrix
+from cvrp_io.calculate_D (and cvrp_ops.D2D_c if service times are used).
+Heuristics that only read D this way (e.g. the savings, sweep and nearest
+neighbor construction heuristics) can be used with it as is. Writing to the
+oracle is not supported.
+"""
+
+# Written in Python 2.7, but try to maintain Python 3+ compatibility
+from __future__ import print_function
+from __future__ import division
+from builtins import range
+
+from collections import OrderedDict
+
+import numpy as np
+
+from verypy.cvrp_io import calculate_D
+from verypy.config import DISTANCE_ORACLE_CACHED_ROWS
+
+__author__ = "Jussi Rasku"
+__copyright__ = "Copyright 2022, Jussi Rasku"
+__credits__ = ["Jussi Rasku"]
+__license__ = "MIT"
+__maintainer__ = "Jussi Rasku"
+__email__ = "jussi.rasku@gmail.com"
+__status__ = "Development"
+
+################################################################################
+
+class DistanceOracle(object):
+    def __init__(self, points, edge_weight_type='EUC_2D',
+                 max_cached_rows=DISTANCE_ORACLE_CACHED_ROWS,
+                 service_time=None):
+        """ The points are the coordinates of the depot (index 0) and the
+        customers, and the edge_weight_type is any of the TSPLIB distance
+        types supported by cvrp_io.calculate_D (e.g. EUC_2D, CEIL_2D, GEO,
+        ATT). At most max_cached_rows rows of the distance matrix are kept in
+        memory. If service_time is given, it is baked into the distances the
+        same way cvrp_ops.D2D_c does. """
+        self.points = np.asarray(points, dtype=float)
+        self.edge_weight_type = edge_weight_type
+        self.max_cached_rows = max(1, max_cached_rows)
+        self.service_time = service_time
+        self.shape = (len(self.points), len(self.points))
+        self.ndim = 2
+        self._row_cache = OrderedDict()
+        # the most recently used row is checked before the cache
+        self._mru_idx = None
+        self._mru_row = None
+
+        self._st = None
+        self._halfst = None
+        self._st_as_float = False
+        D_row_type = self._calculate_rows([0])[0].dtype
+        if service_time:
+            tst = D_row_type.type(service_time)
+            if float(tst)!=float(service_time) or \
+               float(tst/2)!=float(service_time/2.0):
+                self._st_as_float = True
+                self._halfst = tst/2.0
+                D_row_type = np.dtype('d')
+            else:
+                self._halfst = int(tst/2)
+            self._st = tst
+        self.dtype = D_row_type
+
+    def __len__(self):
+        return self.shape[0]
+
+    def _calculate_rows(self, row_idxs):
+        """ Calculates the distance matrix rows as calculate_D would. """
+        rows = calculate_D(self.points[row_idxs], self.points,
+                           self.edge_weight_type)
+        row_idxs = np.asarray(row_idxs)
+        if self._st is not None:
+            # as in cvrp_ops.D2D_c
+            if self._st_as_float:
+                rows = rows.astype('d')
+            is_depot_row = (row_idxs==0)
+            rows[~is_depot_row, 1:]+=self._st
+            rows[~is_depot_row, 0]+=self._halfst
+            rows[is_depot_row, :]+=self._halfst
+        # the distance to self is 0 (also with e.g. GEO distances)
+        rows[np.arange(len(row_idxs)), row_idxs] = 0
+        return rows
+
+    def _get_rows(self, row_idxs):
+        """ Returns the (read-only) rows of the distance matrix as a list.
+        The rows that are not in the cache are calculated at one go. """
+        cache = self._row_cache
+        missing_idxs = [i for i in row_idxs if i not in cache]
+        if missing_idxs:
+            for i, row in zip(missing_idxs,
+                              self._calculate_rows(missing_idxs)):
+                row.flags.writeable = False
+                cache[i] = row
+
+        rows = []
+        for i in row_idxs:
+            # move to the most recently used end
+            row = cache.pop(i)
+            cache[i] = row
+            rows.append(row)
+        while len(cache)>self.max_cached_rows:
+            cache.popitem(last=False)
+        return rows
+
+    def row(self, i):
+        """ Returns the row i of the distance matrix as a read-only array. """
+        if i==self._mru_idx:
+            return self._mru_row
+        if i<0:
+            i+=self.shape[0]
+        if not 0<=i<self.shape[0]:
+            raise IndexError("index %d is out of bounds for the size %d"%
+                             (i, self.shape[0]))
+        cache = self._row_cache
+        if i in cache:
+            row = cache.pop(i)
+            cache[i] = row
+        else:
+            row = self._get_rows([i])[0]
+        self._mru_idx = i
+        self._mru_row = row
+        return row
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            if len(key)!=2:
+                raise IndexError("the distance matrix is 2-dimensional")
+            i, j = key
+        else:
+            i, j = key, slice(None)
+
+        if isinstance(i, (int, np.integer)):
+            return self.row(i)[j]
+
+        # The rows are selected with a slice, a mask or an index array. Get
+        #  the unique rows and use the numpy indexing rules on them.
+        row_idxs = np.arange(self.shape[0])[i]
+        unique_idxs, inverse = np.unique(row_idxs, return_inverse=True)
+        rows = np.array(self._get_rows([int(ui) for ui in unique_idxs]))
+        inverse = inverse.reshape(row_idxs.shape)
+        if isinstance(i, slice) and \
+           not isinstance(j, (slice, int, np.integer)):
+            # a slice and an index array select a block (not pairs)
+            inverse = inverse.reshape((-1,)+(1,)*np.ndim(j))
+        return rows[inverse, j]
+
+    def __setitem__(self, key, value):
+        raise TypeError("DistanceOracle does not support item assignment")
+
+    def __array__(self, dtype=None, copy=None):
+        """ Note that this builds the full dense distance matrix. """
+        return self.as_dense(dtype)
+
+    def as_dense(self, dtype=None, block_size=None):
+        """ Returns the full distance matrix as a numpy ndarray of the given
+        dtype (the default is the dtype of the oracle). The matrix is
+        calculated in blocks of rows, and, thus, e.g. dtype=np.float32
+        allows building a matrix of half the size without the intermediate
+        float64 matrix. The integer distances are exactly representable as
+        float32 up to 2**24."""
+        n = self.shape[0]
+        if dtype is None:
+            dtype = self.dtype
+        if block_size is None:
+            block_size = self.max_cached_rows
+        D = np.empty((n,n), dtype=dtype)
+        for block_start in range(0, n, block_size):
+            block_idxs = list(range(block_start, min(n, block_start+block_size)))
+            D[block_start:block_start+len(block_idxs)] = \
+                self._calculate_rows(block_idxs)
+        return D
+
+    def with_service_time(self, st):
+        """ Returns a new oracle with the service time st baked in. """
+        if self.service_time:
+            raise ValueError("The service time is already set")
+        return DistanceOracle(self.points, self.edge_weight_type,
+                              self.max_cached_rows, st)
@@ -1,82 +1,547 @@
 import os
-import tempfile
+import re
+import inspect
+import signal
 import json
+import gzip
+import base64
 import logging
-from http.server import SimpleHTTPRequestHandler, HTTPServer
-from socketserver import TCPServer
+import threading
+import multiprocessing
+from multiprocessing.connection import wait
+from collections import OrderedDict, deque
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
 from time import time
-from verypy.util import sol2routes
+from uuid import uuid4
+import numpy as np
+from verypy.util import sol2routes, objf
 from verypy.cvrp_ops import normalize_solution, recalculate_objective, validate_solution_feasibility, generate_missing_coordinates
 from verypy import get_algorithms
-from verypy.cvrp_io import read_TSPLIB_CVRP, read_TSBLIB_additional_constraints
+from verypy.cvrp_io import build_CVRP
+from verypy.solution_cache import SolutionCache, solution_cache_key
 
 PORT = 8000
 
+# How many solves can be in flight at the same time (the rest are queued)
+SOLVE_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+# How long (in seconds) a cancelled solve has to stop before its worker is
+#  terminated. Algorithms that are interrupted return their best solution.
+CANCEL_GRACE_PERIOD = 5.0
+# How many finished jobs are kept for the GET /jobs/<id> requests
+MAX_FINISHED_JOBS = 100
+# The improving solutions of a running job are sent to the GET
+#  /jobs/<id>/events streams at most this often (in seconds)
+PROGRESS_EVENT_INTERVAL = 0.25
+# How often (in seconds) a comment is sent to keep an idle event stream open
+EVENT_STREAM_KEEPALIVE = 15.0
+
+# The distance matrix is sent in the /run result only if it is requested in
+#  one of these formats (see encode_distance_matrix)
+DISTANCE_MATRIX_FORMATS = ('float32', 'gzip')
+
+JOB_PATH_RE = re.compile(r"^/jobs/([0-9a-f]+)$")
+JOB_EVENTS_PATH_RE = re.compile(r"^/jobs/([0-9a-f]+)/events$")
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
 logger = logging.getLogger()
 
-def create_temp_vrp_file(params):
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".vrp") as temp_vrp_file:
-        temp_vrp_file.write(f"NAME : temporary\n".encode())
-        temp_vrp_file.write(f"TYPE : {params.get('type', 'CVRP')}\n".encode())
-        temp_vrp_file.write(f"DIMENSION : {len(params['coordinates'])}\n".encode())
-        temp_vrp_file.write(f"EDGE_WEIGHT_TYPE : {params.get('edge_weight_type', 'EUC_2D')}\n".encode())
-        capacity = params.get('capacity', None)
-        if capacity is not None:
-            temp_vrp_file.write(f"CAPACITY : {capacity}\n".encode())
-        temp_vrp_file.write(f"NODE_COORD_SECTION\n".encode())
-        for i, coord in enumerate(params['coordinates']):
-            if len(coord) != 2:
-                logger.error(f"Invalid coordinate data: {coord}")
-                continue
-            temp_vrp_file.write(f"{i + 1} {coord[0]} {coord[1]}\n".encode())
-        customer_demands = params.get('customer_demands', None)
-        if customer_demands is not None:
-            temp_vrp_file.write(f"DEMAND_SECTION\n".encode())
-            for i, demand in enumerate(customer_demands):
-                temp_vrp_file.write(f"{i + 1} {demand}\n".encode())
-        depot_node = params.get('depot_node', 1)
-        temp_vrp_file.write(f"DEPOT_SECTION\n".encode())
-        temp_vrp_file.write(f"{depot_node}\n-1\nEOF\n".encode())
-
-        # Log the contents of the temporary .vrp file
-        temp_vrp_file.seek(0)
-        logger.info("Temporary .vrp file contents:\n" + temp_vrp_file.read().decode())
-
-        return temp_vrp_file.name
+def encode_distance_matrix(D, matrix_format):
+    """
+    Encodes the distance matrix compactly for the /run result. The matrix
+    is returned as a dict with the shape and the base64 encoded (row major,
+    little-endian) float32 data, which is also gzip compressed if the
+    matrix_format is 'gzip'.
+    """
+    data = np.ascontiguousarray(D, dtype='<f4').tobytes()
+    if matrix_format == 'gzip':
+        data = gzip.compress(data)
+    return {
+        'format': matrix_format,
+        'dtype': 'float32',
+        'shape': list(np.shape(D)),
+        'data': base64.b64encode(data).decode('ascii')
+    }
+
+def read_problem(params):
+    """
+    Builds the problem from the /run request parameters in memory. Returns
+    a dict with the parameters of the algorithm function (and the name of
+    the algorithm). Raises KeyError or ValueError if the parameters are
+    invalid.
+    """
+    if params.get('type', 'CVRP') not in ('CVRP', 'TSP'):
+        raise ValueError("Only CVRP and TSP problems are supported")
+    N, points, dd_points, customer_demands, distance_matrix, C, ewt = build_CVRP(
+        params['coordinates'], params.get('customer_demands', None),
+        params.get('capacity', None), params.get('edge_weight_type', 'EUC_2D'),
+        params.get('depot_node', 1))
+    logging.info(f"Built a problem with {N} customers ({ewt})")
+
+    if points is None:
+        if dd_points is not None:
+            points = dd_points
+        else:
+            points, ewt = generate_missing_coordinates(customer_demands)
+
+    matrix_format = params.get('distance_matrix_format', None)
+    if matrix_format is not None and matrix_format not in DISTANCE_MATRIX_FORMATS:
+        raise ValueError(f"Unknown distance matrix format {matrix_format}")
+
+    algorithm = params.get('algorithm', 'No algorithm selected')
+    if not any(algo[0] == algorithm for algo in get_algorithms('all')):
+        raise ValueError(f"Algorithm {algorithm} not found")
+
+    return {
+        'algorithm': algorithm,
+        'points': points,
+        'D': distance_matrix,
+        'd': customer_demands,
+        'C': params.get('capacity', None),
+        'L': params.get('L', None),
+        'st': None,
+        'single': params.get('single', False),
+        'minimize_K': params.get('minimize_K', False),
+        'distance_matrix_format': matrix_format,
+        'use_cache': params.get('use_cache', True)
+    }
+
+# The solves are run in worker processes. A worker is interrupted (SIGINT)
+#  to cancel a solve, and, as in the CLI, the algorithms then return the best
+#  solution found so far. The interrupt is ignored between the solves, and
+#  deferred while a progress message is sent, as a message cut in the middle
+#  would break the pipe to the dispatcher.
+_worker_is_solving = False
+_worker_is_sending_progress = False
+_worker_interrupt_pending = False
+
+def _interrupt_if_solving(signum, frame):
+    global _worker_interrupt_pending
+    if _worker_is_sending_progress:
+        _worker_interrupt_pending = True
+    elif _worker_is_solving:
+        raise KeyboardInterrupt()
+
+def _send_progress(conn, progress):
+    """ Sends the progress data of the solve to the conn. An interrupt that
+    comes while sending is raised only after the message has been sent. """
+    global _worker_is_sending_progress, _worker_interrupt_pending
+    _worker_is_sending_progress = True
+    try:
+        conn.send(('progress', progress, None))
+    finally:
+        _worker_is_sending_progress = False
+        interrupted = _worker_interrupt_pending
+        _worker_interrupt_pending = False
+    if interrupted:
+        raise KeyboardInterrupt()
+
+def solution_data(solution, problem):
+    """
+    Returns the JSON serializable routes, route costs and demands, and the
+    objective of the solution for the /run result and the progress events.
+    """
+    distance_matrix = problem['D']
+    customer_demands = problem['d']
+    routes = sol2routes(solution)
+    route_demands = None
+    if customer_demands is not None:
+        route_demands = [float(sum(customer_demands[n] for n in route)) for route in routes]
+    return {
+        'objective': int(recalculate_objective(solution, distance_matrix)),
+        'num_routes': len(routes),
+        'routes': routes,
+        'route_costs': [float(objf(route, distance_matrix)) for route in routes],
+        'route_demands': route_demands,
+        'points': problem['points'],
+        'customer_demands': customer_demands,
+        'capacity': problem['C']
+    }
+
+def solve_problem(problem, send_progress=None):
+    """
+    Solves the problem (as returned by read_problem) and returns a 2-tuple
+    of the job status ('done' or 'cancelled') and the response data with
+    the solution (None if the algorithm was cancelled before it had one).
+    The solution is looked up from the SolutionCache first, unless the
+    use_cache of the problem is False.
+
+    If the algorithm supports a progress_callback, its improving solutions
+    are passed to send_progress (at most every PROGRESS_EVENT_INTERVAL).
+    """
+    global _worker_is_solving
+
+    algos = get_algorithms('all')
+    selected_algorithm = next((algo for algo in algos if algo[0] == problem['algorithm']), None)
+    if not selected_algorithm:
+        raise ValueError(f"Algorithm {problem['algorithm']} not found")
+    _, algo_name, _, algorithm_function = selected_algorithm
+
+    points = problem['points']
+    distance_matrix = problem['D']
+    customer_demands = problem['d']
+    param_values = {
+        'points': points,
+        'D': distance_matrix,
+        'd': customer_demands,
+        'C': problem['C'],
+        'L': problem['L'],
+        'st': problem['st'],
+        'wtt': None,
+        'single': problem['single'],
+        'minimize_K': problem['minimize_K']
+    }
+    if send_progress is not None and \
+       'progress_callback' in inspect.signature(algorithm_function).parameters:
+        last_sent = [0.0]
+        def progress_callback(sol, sol_f, sol_K, elapsed):
+            if time() - last_sent[0] < PROGRESS_EVENT_INTERVAL:
+                return
+            last_sent[0] = time()
+            progress = solution_data(normalize_solution(sol), problem)
+            progress['elapsed_time'] = elapsed
+            send_progress(progress)
+        param_values['progress_callback'] = progress_callback
+
+    status = 'done'
+    start_time = time()
+    cache = SolutionCache()
+    cache_key = None
+    solution = None
+    if problem['use_cache']:
+        cache_key = solution_cache_key(points, distance_matrix, customer_demands, problem['C'],
+                                       problem['L'], problem['st'], problem['algorithm'],
+                                       problem['minimize_K'], problem['single'])
+        solution = cache.get(cache_key)
+    from_cache = solution is not None
+    if not from_cache:
+        try:
+            _worker_is_solving = True
+            solution = algorithm_function(**param_values)
+        except KeyboardInterrupt as e:
+            status = 'cancelled'
+            # if interrupted, the algorithms give the best solution found so far
+            solution = e.args[0] if len(e.args) > 0 and type(e.args[0]) is list else None
+        finally:
+            _worker_is_solving = False
+    elapsed_time = time() - start_time
+
+    if not solution:
+        return status, None
+
+    solution = normalize_solution(solution)
+    if cache_key and not from_cache and status == 'done':
+        cache.put(cache_key, solution)
+    response_data = solution_data(solution, problem)
+    response_data['elapsed_time'] = elapsed_time
+    response_data['from_cache'] = from_cache
+    response_data['feasibility'] = validate_solution_feasibility(
+        solution, distance_matrix, customer_demands, problem['C'], None, False)
+
+    logging.info(f"Solution with {response_data['num_routes']} routes and the objective {response_data['objective']}")
+    logging.debug(f"Routes: {response_data['routes']}")
+
+    # The O(n^2) distance matrix is sent only if asked for
+    if problem['distance_matrix_format'] is not None:
+        response_data['distance_matrix'] = encode_distance_matrix(
+            distance_matrix, problem['distance_matrix_format'])
+    return status, response_data
+
+def _solve_worker(conn):
+    """ The worker process loop: receives problems from the conn, solves
+    them and sends back (status, response_data, error) tuples. While solving,
+    the improving solutions are sent as ('progress', progress_data, None). """
+    signal.signal(signal.SIGINT, _interrupt_if_solving)
+    while True:
+        try:
+            problem = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if problem is None:
+            break
+        try:
+            status, response_data = solve_problem(problem, partial(_send_progress, conn))
+            conn.send((status, response_data, None))
+        except KeyboardInterrupt:
+            conn.send(('cancelled', None, None))
+        except Exception as e:
+            logging.error(f"Error running algorithm: {e}")
+            conn.send(('failed', None, f"Error running algorithm: {e}"))
+
+class _Worker:
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_solve_worker, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.job_id = None
+        self.cancelled_at = None
+
+class SolveJobPool:
+    """
+    Runs the solve jobs on a pool of worker processes. The jobs are queued
+    with submit and run in the submission order when a worker is free. The
+    status and the result of a job can be queried with get, and a job can be
+    cancelled with cancel. Both return a JSON serializable dict of the job
+    (or None if there is no such job). The latest improving solution of a
+    running job can be waited for with wait_for_progress.
+    """
+    def __init__(self, workers=SOLVE_WORKERS):
+        # spawn, as forking a process with (server) threads is unsafe
+        self._context = multiprocessing.get_context('spawn')
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._jobs = OrderedDict()
+        # job_id -> (sequence number, the latest progress data)
+        self._progress = {}
+        self._problems = {}
+        self._queue = deque()
+        self._workers = [_Worker(self._context) for _ in range(workers)]
+        self._closed = False
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, problem):
+        job_id = uuid4().hex
+        with self._lock:
+            self._jobs[job_id] = {
+                'job_id': job_id,
+                'status': 'queued',
+                'algorithm': problem['algorithm'],
+                'submitted': time(),
+                'started': None,
+                'finished': None,
+                'result': None,
+                'error': None
+            }
+            self._problems[job_id] = problem
+            self._queue.append(job_id)
+            return dict(self._jobs[job_id])
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def wait_for_progress(self, job_id, seen_seq=0, timeout=None):
+        """
+        Waits until the job has newer progress than seen_seq, it finishes,
+        or the timeout passes. Returns a 3-tuple of the job (None if there is
+        no such job), and the sequence number and the data of the latest
+        progress (0 and None if there is none yet).
+        """
+        with self._changed:
+            self._changed.wait_for(
+                lambda: job_id not in self._jobs or
+                        self._jobs[job_id]['finished'] is not None or
+                        self._progress.get(job_id, (0, None))[0] > seen_seq,
+                timeout)
+            job = self._jobs.get(job_id)
+            seq, progress = self._progress.get(job_id, (0, None))
+            return (dict(job) if job else None), seq, progress
+
+    def cancel(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job['status'] == 'queued':
+                self._queue.remove(job_id)
+                del self._problems[job_id]
+                self._finish(job, 'cancelled')
+            elif job['status'] == 'running':
+                worker = next(w for w in self._workers if w.job_id == job_id)
+                if worker.cancelled_at is None:
+                    logging.info(f"Cancelling job {job_id}")
+                    worker.cancelled_at = time()
+                    if os.name == 'nt':
+                        # no SIGINT for other processes on Windows
+                        self._replace_worker(worker, 'cancelled')
+                    else:
+                        os.kill(worker.process.pid, signal.SIGINT)
+            return dict(job)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            for worker in self._workers:
+                try:
+                    if worker.job_id is None:
+                        worker.conn.send(None)
+                    else:
+                        worker.process.terminate()
+                except (OSError, ValueError):
+                    pass
+        for worker in self._workers:
+            worker.process.join(timeout=CANCEL_GRACE_PERIOD)
+
+    def _finish(self, job, status, result=None, error=None):
+        job['status'] = status
+        job['result'] = result
+        job['error'] = error
+        job['finished'] = time()
+        self._progress.pop(job['job_id'], None)
+        # forget the oldest finished jobs
+        finished = [jid for jid, j in self._jobs.items() if j['finished'] is not None]
+        for jid in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[jid]
+        self._changed.notify_all()
+
+    def _replace_worker(self, worker, status, error=None):
+        """ Terminates the worker (and finishes its job) and starts a new
+        worker in its place. """
+        worker.process.terminate()
+        worker.process.join()
+        if worker.job_id in self._jobs:
+            self._finish(self._jobs[worker.job_id], status, error=error)
+        self._workers[self._workers.index(worker)] = _Worker(self._context)
+
+    def _dispatch(self):
+        while not self._closed:
+            with self._lock:
+                # start the queued jobs on the free workers
+                for worker in self._workers:
+                    if worker.job_id is None and self._queue:
+                        job_id = self._queue.popleft()
+                        worker.job_id = job_id
+                        worker.cancelled_at = None
+                        self._jobs[job_id]['status'] = 'running'
+                        self._jobs[job_id]['started'] = time()
+                        try:
+                            worker.conn.send(self._problems.pop(job_id))
+                        except Exception as e:
+                            logging.error(f"Could not send job {job_id} to a worker: {e}")
+                            self._replace_worker(worker, 'failed', f"Could not start the job: {e}")
+                # the algorithm did not react to the interrupt
+                for worker in list(self._workers):
+                    if worker.cancelled_at is not None and worker.job_id is not None and \
+                       time() - worker.cancelled_at > CANCEL_GRACE_PERIOD:
+                        logging.info(f"Terminating the worker of job {worker.job_id}")
+                        self._replace_worker(worker, 'cancelled')
+                busy_conns = [w.conn for w in self._workers if w.job_id is not None]
+
+            for conn in wait(busy_conns, timeout=0.1):
+                with self._lock:
+                    worker = next((w for w in self._workers if w.conn is conn), None)
+                    if worker is None or worker.job_id is None:
+                        continue
+                    try:
+                        status, result, error = conn.recv()
+                    except (EOFError, OSError):
+                        self._replace_worker(worker, 'failed', "The worker process exited unexpectedly")
+                        continue
+                    except Exception as e:
+                        # e.g. a message cut in the middle, the worker cannot
+                        #  be trusted to be in sync anymore
+                        logging.error(f"Could not receive the result of job {worker.job_id}: {e}")
+                        self._replace_worker(worker, 'failed', f"Could not receive the result: {e}")
+                        continue
+                    if status == 'progress':
+                        # an improving solution, the job is still running
+                        if worker.job_id in self._jobs:
+                            seq, _ = self._progress.get(worker.job_id, (0, None))
+                            self._progress[worker.job_id] = (seq + 1, result)
+                            self._changed.notify_all()
+                        continue
+                    if worker.job_id in self._jobs:
+                        self._finish(self._jobs[worker.job_id], status, result, error)
+                    logging.info(f"Job {worker.job_id} {status}")
+                    worker.job_id = None
+                    worker.cancelled_at = None
 
 class Handler(SimpleHTTPRequestHandler):
     """
     This class serves the index.html file on GET requests to the root URL
     and handles POST requests to the /run endpoint to run the VeRyPy algorithm
-    with the provided parameters.
+    with the provided parameters. The algorithm is run as a job on the
+    job_pool, and its status and result can be queried with GET requests to
+    /jobs/<id>. A DELETE request to /jobs/<id> cancels the job. The improving
+    solutions of the job are streamed as Server-Sent Events from
+    /jobs/<id>/events.
     """
+    job_pool = None
+
+    def send_json(self, status_code, data):
+        self.send_response(status_code)
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps(data).encode('utf-8'))
+
     def do_GET(self):
         if self.path == '/':
             self.path = '/index.html'
         elif self.path == '/algorithms':
             self.handle_algorithms()
             return
+        elif JOB_PATH_RE.match(self.path):
+            self.handle_job(self.job_pool.get)
+            return
+        elif JOB_EVENTS_PATH_RE.match(self.path):
+            self.handle_job_events()
+            return
         logging.info(f"GET request for {self.path}")
         return SimpleHTTPRequestHandler.do_GET(self)
 
+    def do_DELETE(self):
+        if JOB_PATH_RE.match(self.path):
+            self.handle_job(self.job_pool.cancel)
+        else:
+            self.send_json(404, {'error': f"Not found: {self.path}"})
+
+    def handle_job(self, job_operation):
+        job_id = JOB_PATH_RE.match(self.path).group(1)
+        job = job_operation(job_id)
+        if job is None:
+            self.send_json(404, {'error': f"Job {job_id} not found"})
+        else:
+            self.send_json(200, job)
+
+    def send_event(self, event, data):
+        self.wfile.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode('utf-8'))
+        self.wfile.flush()
+
+    def handle_job_events(self):
+        """
+        Streams the improving solutions of the job as 'progress' events
+        until the job finishes. Then, the job (with the result) is sent as
+        an event named after its status ('done', 'cancelled' or 'failed').
+        """
+        job_id = JOB_EVENTS_PATH_RE.match(self.path).group(1)
+        job, seq, progress = self.job_pool.wait_for_progress(job_id, timeout=0)
+        if job is None:
+            self.send_json(404, {'error': f"Job {job_id} not found"})
+            return
+        self.send_response(200)
+        self.send_header('Content-type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        sent_seq = 0
+        try:
+            while job is not None:
+                if seq > sent_seq:
+                    self.send_event('progress', progress)
+                    sent_seq = seq
+                elif job['finished'] is None:
+                    self.wfile.write(b": keep-alive\n\n")
+                    self.wfile.flush()
+                if job['finished'] is not None:
+                    self.send_event(job['status'], job)
+                    break
+                job, seq, progress = self.job_pool.wait_for_progress(
+                    job_id, sent_seq, EVENT_STREAM_KEEPALIVE)
+        except (BrokenPipeError, ConnectionResetError):
+            logging.info(f"The event stream of job {job_id} was closed")
+
     def handle_algorithms(self):
         try:
             # Get algorithms using get_algorithms function
             algos = get_algorithms('all')
             algorithms = [{'name': algo[1], 'value': algo[0], 'description': algo[2]} for algo in algos]
-
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps(algorithms).encode('utf-8'))
+            self.send_json(200, algorithms)
         except Exception as e:
             logging.error(f"Error getting algorithms: {e}")
-            self.send_response(500)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({'error': str(e)}).encode('utf-8'))
+            self.send_json(500, {'error': str(e)})
 
     def do_POST(self):
         if self.path == '/run':
@@ -85,111 +550,27 @@ class Handler(SimpleHTTPRequestHandler):
                 post_data = self.rfile.read(content_length)
                 params = json.loads(post_data.decode('utf-8'))
 
-                logging.info("Generating temporary .vrp file using provided parameters")
-                temp_vrp_file_path = create_temp_vrp_file(params)
-                problem = read_TSPLIB_CVRP(temp_vrp_file_path)
-                N, points, dd_points, customer_demands, distance_matrix, C, ewt = read_TSPLIB_CVRP(temp_vrp_file_path)
-                K, L, st = read_TSBLIB_additional_constraints(temp_vrp_file_path)
-                os.remove(temp_vrp_file_path)
-
-                if points is None:
-                    if dd_points is not None:
-                        points = dd_points
-                    else:
-                        points, ewt = generate_missing_coordinates(customer_demands)
-
-                algorithm = params.get('algorithm', 'No algorithm selected')
-
-                try:
-                    algos = get_algorithms('all')
-                    selected_algorithm = next((algo for algo in algos if algo[0] == algorithm), None)
-                    if not selected_algorithm:
-                        raise ValueError(f"Algorithm {algorithm} not found")
-
-                    _, algo_name, _, algorithm_function = selected_algorithm
-
-                    param_values = {
-                        'points': points,
-                        'D': distance_matrix,
-                        'd': customer_demands,
-                        'C': params.get('capacity', None),
-                        'L': params.get('L', None),
-                        'st': None,
-                        'wtt': None,
-                        'single': params.get('single', False),
-                        'minimize_K': params.get('minimize_K', False)
-                    }
-
-                    # logging.info(f"Running algorithm {algo_name} with parameters: {param_values}")
-
-                    start_time = time()
-                    solution = algorithm_function(**param_values)
-                    elapsed_time = time() - start_time
-
-                    solution = normalize_solution(solution)
-                    objective = recalculate_objective(solution, distance_matrix)
-                    K = solution.count(0) - 1
-                    feasibility = validate_solution_feasibility(solution, distance_matrix, customer_demands, params.get('capacity', None), None, False)
-                    routes = sol2routes(solution)
-
-                    logging.info(f"Solution: {solution}")
-                    logging.info(f"Routes: {routes}")
-
-                    # Convert distance_matrix to a list
-                    distance_matrix_list = distance_matrix.tolist()
-
-                    response_data = {
-                        'objective': int(objective),
-                        'num_routes': int(K),
-                        'elapsed_time': elapsed_time,
-                        'feasibility': feasibility,
-                        'routes': routes,
-                        'points': points,
-                        'distance_matrix': distance_matrix_list,
-                        'customer_demands': customer_demands,
-                        'capacity': params.get('capacity', None)  # Add capacity to the response
-                    }
-
-                    logging.info(f"Response data: {response_data}")
-
-                    self.send_response(200)
-                    self.send_header('Content-type', 'application/json')
-                    self.end_headers()
-                    self.wfile.write(json.dumps(response_data).encode('utf-8'))
-                except ImportError as e:
-                    logging.error(f"Error importing algorithm module: {e}")
-                    self.send_response(500)
-                    self.send_header('Content-type', 'application/json')
-                    self.end_headers()
-                    self.wfile.write(json.dumps({'error': f"Error importing algorithm module: {e}"}).encode('utf-8'))
-                except AttributeError as e:
-                    logging.error(f"Error accessing algorithm function: {e}")
-                    self.send_response(500)
-                    self.send_header('Content-type', 'application/json')
-                    self.end_headers()
-                    self.wfile.write(json.dumps({'error': f"Error accessing algorithm function: {e}"}).encode('utf-8'))
-                except Exception as e:
-                    logging.error(f"Error running algorithm: {e}")
-                    self.send_response(500)
-                    self.send_header('Content-type', 'application/json')
-                    self.end_headers()
-                    self.wfile.write(json.dumps({'error': f"Error running algorithm: {e}"}).encode('utf-8'))
+                problem = read_problem(params)
+                job = self.job_pool.submit(problem)
+                logging.info(f"Queued job {job['job_id']} ({problem['algorithm']})")
+                self.send_json(202, job)
             except (KeyError, ValueError) as e:
                 logging.error(f"Error handling /run request: {e}")
-                self.send_response(400)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({'error': str(e)}).encode('utf-8'))
+                self.send_json(400, {'error': str(e)})
             except Exception as e:
                 logging.error(f"Unexpected error: {e}")
-                self.send_response(500)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({'error': str(e)}).encode('utf-8'))
+                self.send_json(500, {'error': str(e)})
+        else:
+            self.send_json(404, {'error': f"Not found: {self.path}"})
 
 if __name__ == "__main__":
-    web_dir = os.path.join(os.path.dirname(__file__), '../frontend')
-    os.chdir(web_dir)
-    with HTTPServer(("", PORT), Handler) as httpd:
+    web_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../frontend')
+    Handler.job_pool = SolveJobPool()
+    with ThreadingHTTPServer(("", PORT), partial(Handler, directory=web_dir)) as httpd:
         logging.info(f"Serving at port {PORT}")
-        httpd.serve_forever()
\ No newline at end of file
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            Handler.job_pool.close()
@@ -133,14 +133,6 @@ document.getElementById("type").addEventListener("change", function () {
   }
 });
 
-function calculateRouteCost(route, distanceMatrix) {
-  let cost = 0;
-  for (let i = 0; i < route.length - 1; i++) {
-    cost += distanceMatrix[route[i]][route[i + 1]];
-  }
-  return cost;
-}
-
 function calculateUtilizationRate(route, customerDemands, capacity) {
   if (!customerDemands || !capacity) {
     return "N/A";
@@ -153,13 +145,7 @@ function calculateUtilizationRate(route, customerDemands, capacity) {
   return `${utilizationRate.toFixed(2)} %`;
 }
 
-function drawSolution(
-  routes,
-  points,
-  distanceMatrix,
-  customerDemands,
-  capacity
-) {
+function drawSolution(routes, points, routeCosts, customerDemands, capacity) {
   const canvas = document.getElementById("solution-canvas");
   const ctx = canvas.getContext("2d");
   ctx.clearRect(0, 0, canvas.width, canvas.height);
@@ -212,8 +198,8 @@ function drawSolution(
     ctx.closePath();
     ctx.stroke();
 
-    // Calculate and display route cost and utilization rate
-    const routeCost = calculateRouteCost(route, distanceMatrix);
+    // Display the route cost (calculated by the server) and utilization rate
+    const routeCost = routeCosts[routeIndex];
     const utilizationRate = calculateUtilizationRate(
       route,
       customerDemands,
@@ -324,7 +310,113 @@ document
   .getElementById("export-metrics")
   .addEventListener("click", exportMetrics);
 
+// The id of the job of the solve in progress (if any)
+let currentJobId = null;
+const JOB_POLL_INTERVAL_MS = 500;
+
+function handleJsonResponse(response) {
+  if (!response.ok) {
+    return response.json().then((error) => {
+      throw new Error(error.error);
+    });
+  }
+  return response.json();
+}
+
+function pollJob(jobId) {
+  return fetch(`/jobs/${jobId}`)
+    .then(handleJsonResponse)
+    .then((job) => {
+      if (job.status === "queued" || job.status === "running") {
+        return new Promise((resolve) =>
+          setTimeout(resolve, JOB_POLL_INTERVAL_MS)
+        ).then(() => pollJob(jobId));
+      }
+      return job;
+    });
+}
+
+// Shows the improving solutions of the job as they are found and resolves
+// with the finished job. Falls back to polling if the event stream fails.
+function waitForJob(jobId) {
+  if (!window.EventSource) {
+    return pollJob(jobId);
+  }
+  return new Promise((resolve) => {
+    const events = new EventSource(`/jobs/${jobId}/events`);
+    events.addEventListener("progress", (event) =>
+      showProgress(JSON.parse(event.data))
+    );
+    ["done", "cancelled", "failed"].forEach((status) =>
+      events.addEventListener(status, (event) => {
+        events.close();
+        resolve(JSON.parse(event.data));
+      })
+    );
+    events.onerror = () => {
+      events.close();
+      resolve(pollJob(jobId));
+    };
+  });
+}
+
+function showProgress(data) {
+  document.getElementById("total-distance").textContent = data.objective;
+  document.getElementById("num-routes").textContent = data.num_routes;
+  document.getElementById(
+    "computation-time"
+  ).textContent = `${data.elapsed_time.toFixed(4)} seconds (solving...)`;
+  drawSolution(
+    data.routes,
+    data.points,
+    data.route_costs,
+    data.customer_demands,
+    data.capacity
+  );
+}
+
+function showSolution(data) {
+  document.getElementById("total-distance").textContent = data.objective;
+  document.getElementById("num-routes").textContent = data.num_routes;
+  const cacheNote = data.from_cache ? " (from cache)" : "";
+  document.getElementById(
+    "computation-time"
+  ).textContent = `${data.elapsed_time.toFixed(4)} seconds${cacheNote}`;
+  document.getElementById("covering-feasibility").textContent = data
+    .feasibility[0]
+    ? "Feasible"
+    : "Infeasible";
+  document.getElementById("capacity-feasibility").textContent = data
+    .feasibility[1]
+    ? "Feasible"
+    : "Infeasible";
+  document.getElementById("route-cost-feasibility").textContent = data
+    .feasibility[2]
+    ? "Feasible"
+    : "Infeasible";
+
+  console.log(data);
+
+  // Draw the solution visualization
+  const routes = data.routes;
+  const points = data.points;
+  const routeCosts = data.route_costs;
+  const customerDemands = data.customer_demands;
+  const capacity = data.capacity;
+  drawSolution(routes, points, routeCosts, customerDemands, capacity);
+}
+
 document.getElementById("solve").addEventListener("click", function () {
+  if (currentJobId) {
+    // Cancelling returns the best solution found so far (if any)
+    fetch(`/jobs/${currentJobId}`, { method: "DELETE" }).catch((error) =>
+      console.error("Error cancelling the solve:", error)
+    );
+    this.textContent = "Cancelling...";
+    this.disabled = true;
+    return;
+  }
+
   const algorithm = document.getElementById("algorithm").value;
   let capacity = document.getElementById("capacity").value;
   const coordinates = document.getElementById("coordinates").value;
@@ -437,9 +529,9 @@ document.getElementById("solve").addEventListener("click", function () {
   const data = {
     algorithm: algorithm,
     capacity: capacity ? parseInt(capacity, 10) : null,
-    coordinates: coordinates
-      .split("\n")
-      .map((row) => row.split(" ").map(Number)),
+    coordinates: coordinatesArray.map((line) =>
+      line.trim().split(/\s+/).map(Number)
+    ),
     customer_demands: customerDemands ? customerDemandsArray : null,
     L: L ? parseInt(L, 10) : null,
     single: single,
@@ -458,48 +550,33 @@ document.getElementById("solve").addEventListener("click", function () {
     },
     body: JSON.stringify(data),
   })
-    .then((response) => {
-      if (!response.ok) {
-        return response.json().then((error) => {
-          throw new Error(error.error);
-        });
-      }
-      return response.json();
+    .then(handleJsonResponse)
+    .then((job) => {
+      // The solve runs in the background, the button cancels it
+      currentJobId = job.job_id;
+      solveButton.textContent = "Cancel";
+      solveButton.disabled = false;
+      return waitForJob(job.job_id);
     })
-    .then((data) => {
-      document.getElementById("total-distance").textContent = data.objective;
-      document.getElementById("num-routes").textContent = data.num_routes;
-      document.getElementById(
-        "computation-time"
-      ).textContent = `${data.elapsed_time.toFixed(4)} seconds`;
-      document.getElementById("covering-feasibility").textContent = data
-        .feasibility[0]
-        ? "Feasible"
-        : "Infeasible";
-      document.getElementById("capacity-feasibility").textContent = data
-        .feasibility[1]
-        ? "Feasible"
-        : "Infeasible";
-      document.getElementById("route-cost-feasibility").textContent = data
-        .feasibility[2]
-        ? "Feasible"
-        : "Infeasible";
-
-      console.log(data);
-
-      // Draw the solution visualization
-      const routes = data.routes;
-      const points = data.points;
-      const distanceMatrix = data.distance_matrix;
-      const customerDemands = data.customer_demands;
-      const capacity = data.capacity;
-      drawSolution(routes, points, distanceMatrix, customerDemands, capacity);
+    .then((job) => {
+      if (job.status === "failed") {
+        throw new Error(job.error);
+      }
+      if (job.result) {
+        showSolution(job.result);
+      }
+      if (job.status === "cancelled") {
+        document.getElementById("computation-time").textContent += job.result
+          ? " (cancelled)"
+          : "cancelled";
+      }
     })
     .catch((error) => {
       console.error("Error:", error);
       alert("An error occurred: " + error.message);
     })
     .finally(() => {
+      currentJobId = null;
       elementsToDisable.forEach((element) => (element.disabled = false));
       solveButton.textContent = "Solve";
       document.body.classList.remove("no-hover");
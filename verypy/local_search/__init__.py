@@ -24,9 +24,12 @@ else:
     from inspect import getargspec
     getfuncarglist = lambda f : getargspec(f)[0]
 
-from verypy.routedata import RouteData
+import numpy as np
+
+from verypy.routedata import RouteData, ArrayRouteData
 from verypy.util import objf, is_sorted
 from verypy.config import COST_EPSILON as S_EPS
+from verypy.config import GRANULAR_NEIGHBORHOOD_SIZE
 
 # enum like
 class LSOPT:
@@ -39,11 +42,93 @@ class ITEROPT(LSOPT):
 # All operators that are sensitive to route order must be added here.
 #  See inter_route_operations.py decorator for details.
 ROUTE_ORDER_SENSITIVE_OPERATORS = set()
+# The operators that take the candidate edges as the neighbors keyword
+#  argument (see granular_neighbor_lists) must be added here.
+GRANULAR_OPERATORS = set()
+
+def granular_neighbor_lists(D, k=GRANULAR_NEIGHBORHOOD_SIZE):
+    """ Returns the candidate edges of the granular local search operators
+    as a list of neighbor lists indexed by the node. The edge (i,j) is a
+    candidate if j is one of the k nearest neighbors of i or vice versa, and,
+    thus, the lists are symmetric. """
+    N = len(D)
+    k = min(k, N-1)
+    neighbors = [set() for i in range(N)]
+    if k<1:
+        return [[] for i in range(N)]
+    for i in range(N):
+        row = np.array(D[i], dtype=float)
+        row[i] = np.inf
+        for j in np.argpartition(row, k-1)[:k].tolist():
+            neighbors[i].add(j)
+            neighbors[j].add(i)
+    return [sorted(nbrs) for nbrs in neighbors]
+
+class _RouteNeighborhoodIndex(object):
+    """ Keeps count of the candidate edges (see granular_neighbor_lists)
+    between the customers of each pair of routes. The routes that share no
+    candidate edges are far apart and do not need to be combined in the inter
+    route operators. The counts are updated incrementally when routes change.
+    The depot is on every route and is not considered. """
+    def __init__(self, routes, neighbors):
+        self.neighbors = neighbors
+        self.node_to_route = {}
+        self.customer_counts = {}
+        self.edge_counts = defaultdict(Counter)
+        for ri, route in enumerate(routes):
+            self._add_route(ri, route)
+        
+    def _add_route(self, ri, route):
+        customers = route[1:-1]
+        self.customer_counts[ri] = len(customers)
+        for n in customers:
+            self.node_to_route[n] = ri
+        for n in customers:
+            for m in self.neighbors[n]:
+                rj = self.node_to_route.get(m)
+                if rj is not None and rj!=ri:
+                    self.edge_counts[ri][rj]+=1
+                    self.edge_counts[rj][ri]+=1
+                    
+    def _remove_route(self, ri, route):
+        customers = route[1:-1]
+        for n in customers:
+            for m in self.neighbors[n]:
+                rj = self.node_to_route.get(m)
+                if rj is not None and rj!=ri:
+                    self.edge_counts[ri][rj]-=1
+                    self.edge_counts[rj][ri]-=1
+        for n in customers:
+            del self.node_to_route[n]
+        self.customer_counts[ri] = 0
+        
+    def update_routes(self, changes):
+        """ Update the index after a move. The changes is a list of
+        (route index, old route, new route) tuples. """
+        for ri, old_route, _ in changes:
+            self._remove_route(ri, old_route)
+        for ri, _, new_route in changes:
+            self._add_route(ri, new_route)
+    
+    def are_neighbors(self, route_indices):
+        """ The routes are neighbors if they are connected by the candidate
+        edges. The moves to and from an empty route are always allowed. """
+        if any(self.customer_counts[ri]==0 for ri in route_indices):
+            return True
+        connected = set(route_indices[:1])
+        frontier = list(connected)
+        while frontier:
+            ri = frontier.pop()
+            for rj in route_indices:
+                if rj not in connected and self.edge_counts[ri][rj]>0:
+                    connected.add(rj)
+                    frontier.append(rj)
+        return len(connected)==len(set(route_indices))
 
 def do_local_search(ls_ops, sol, D, d, C, L=None,
                     operator_strategy=LSOPT.FIRST_ACCEPT,
                     iteration_strategy=ITEROPT.ALL_ACCEPT,
-                    max_iterations=None):
+                    max_iterations=None, prune_route_combinations=False):
     """ Repeatedly apply ls_ops until no more improvements can be made. The
     procedure keeps track of the changed routes and searches only combinations
     that have been changed.
@@ -74,10 +159,18 @@ def do_local_search(ls_ops, sol, D, d, C, L=None,
         found an improvement.
         
     Note that these may freely be combined with the operator_strategy.    
+    
+    If some of the ls_ops are granular (see GRANULAR_OPERATORS), the candidate
+    edges are calculated once with granular_neighbor_lists and given to them.
+    The granular inter route operators are not applied on the route pairs
+    whose customers share no candidate edges. If prune_route_combinations is
+    set, all inter route operators skip such far apart routes. Note that this
+    may miss some improving moves of the non-granular operators.
     """
     
     current_sol = sol
-    route_datas = RouteData.from_solution(sol, D, d)
+    # the auxiliary data of the routes is kept up to date over the moves
+    route_datas = ArrayRouteData.from_solution(sol, D, d)
     route_data_idxs = list(range(len(route_datas)))
 
     # We keep track of the operations to avoid search when it has already been
@@ -85,6 +178,14 @@ def do_local_search(ls_ops, sol, D, d, C, L=None,
     at_lsop_optimal = defaultdict(set)
     customer_to_at_lsopt_optimal = defaultdict(list)
     
+    granular_neighbors = None
+    route_neighborhoods = None
+    if prune_route_combinations or \
+       any(ls_op in GRANULAR_OPERATORS for ls_op in ls_ops):
+        granular_neighbors = granular_neighbor_lists(D)
+        route_neighborhoods = _RouteNeighborhoodIndex(
+            [rd.route for rd in route_datas], granular_neighbors)
+    
     iteration = 0
     improving_iteration = True
     while improving_iteration:
@@ -102,6 +203,13 @@ def do_local_search(ls_ops, sol, D, d, C, L=None,
             ls_op_args = getfuncarglist(ls_op)
             route_count = ls_op_args.index('D')
             op_order_sensitive = ls_op in ROUTE_ORDER_SENSITIVE_OPERATORS
+            op_kwargs = {}
+            if ls_op in GRANULAR_OPERATORS:
+                op_kwargs['neighbors'] = granular_neighbors
+            prune_routes = route_count>1 and (prune_route_combinations or
+                                              ls_op in GRANULAR_OPERATORS)
+            pruned_count = 0
+            searched_count = 0
             
             op_improved = False
             
@@ -131,6 +239,14 @@ def do_local_search(ls_ops, sol, D, d, C, L=None,
                         log(DEBUG-2, "Route combination %s already searched for %s, skipping it."%
                             (str(route_indices), ls_op.__name__))
                     continue
+                
+                # The routes are too far apart to be combined
+                searched_count+=1
+                if prune_routes and \
+                   not route_neighborhoods.are_neighbors(route_indices):
+                    pruned_count+=1
+                    no_improving_lsop_found.update((route_indices,))
+                    continue
 
                 # The one route case has different call signature
                 if route_count==1:
@@ -145,7 +261,7 @@ def do_local_search(ls_ops, sol, D, d, C, L=None,
                                  # However, then we lose the ability to mark
                                  # some route combinations as ls_optimal.
                                  #+[best_delta]
-                result = ls_op(*op_params)
+                result = ls_op(*op_params, **op_kwargs)
                 #print("REMOVEME:",route_datas[route_indices[0]].route, "->", result)
                 
                 # route was changed, record the change in route datas
@@ -168,7 +284,8 @@ def do_local_search(ls_ops, sol, D, d, C, L=None,
                                 best_delta = 0
                            
                             old_rd = route_datas[route_indices[0]]
-                            new_rd = RouteData(result[0],old_rd.cost+delta,old_rd.demand)
+                            new_rd = RouteData.derive(result[0],old_rd.cost+delta,
+                                                      old_rd.demand,old_rd)
                             best_result.append( (route_indices[0], new_rd) )
                             best_delta+=delta
                     else:
@@ -181,6 +298,10 @@ def do_local_search(ls_ops, sol, D, d, C, L=None,
                         break # route combination loop
                 
             # end route combination loop
+            
+            if __debug__ and prune_routes:
+                log(DEBUG-1, "Pruned %d of %d route combinations for %s"%
+                    (pruned_count, searched_count, ls_op.__name__))
                         
             # Mark the routes that had no potential improvements to be at
             #  local optima to avoid checking the same moves again.
@@ -199,6 +320,11 @@ def do_local_search(ls_ops, sol, D, d, C, L=None,
                 else:
                     op_improved = True
                     improving_iteration = True
+                    best_result = list(best_result)
+                    if route_neighborhoods is not None:
+                        route_neighborhoods.update_routes(
+                            [(ri, route_datas[ri].route, new_rd.route)
+                             for ri, new_rd in best_result])
                     for ri, new_rd in best_result:
                         route_datas[ri] = new_rd
                         # The route was modified, allow other operators to 
@@ -242,6 +368,11 @@ def do_local_search(ls_ops, sol, D, d, C, L=None,
            (best_iteration_result is not None):
             improving_iteration = True
             
+            best_iteration_result = list(best_iteration_result)
+            if route_neighborhoods is not None:
+                route_neighborhoods.update_routes(
+                    [(ri, route_datas[ri].route, new_rd.route)
+                     for ri, new_rd in best_iteration_result])
             for ri, new_rd in best_iteration_result:
                 route_datas[ri] = new_rd
                 # The route was modified, allow other operators to 
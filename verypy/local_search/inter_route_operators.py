@@ -44,9 +44,11 @@ from __future__ import division
 from builtins import range
 
 from itertools import product, permutations
+from collections import defaultdict
 
 from verypy.routedata import RouteData
-from verypy.local_search import LSOPT, ROUTE_ORDER_SENSITIVE_OPERATORS
+from verypy.local_search import LSOPT, ROUTE_ORDER_SENSITIVE_OPERATORS,\
+                                 GRANULAR_OPERATORS, granular_neighbor_lists
 from verypy.config import COST_EPSILON as S_EPS
 from verypy.config import CAPACITY_EPSILON as C_EPS
 
@@ -62,16 +64,39 @@ __status__ = "Development"
 def routeordersensitive(f):
     ROUTE_ORDER_SENSITIVE_OPERATORS.add(f)
     return f
+
+# Create a decorator to mark operators that take the candidate edges
+def granular(f):
+    GRANULAR_OPERATORS.add(f)
+    return f
+
+def _route_positions(route):
+    """ Returns a dict of the positions of each node on the route. The depot
+    has two positions, the first and the last. """
+    positions = defaultdict(list)
+    for p, n in enumerate(route):
+        positions[n].append(p)
+    return positions
+
+def _granular_positions(route_positions, nodes, offsets, first, last):
+    """ Returns the sorted positions p+o in range [first, last], where p is
+    a position of one of the nodes on the route and o is in offsets. """
+    return sorted(set(p+o for n in nodes for p in route_positions.get(n, [])
+                      for o in offsets if first<=p+o<=last))
     
 def do_2optstar_move(route1_data, route2_data, D, d=None, 
                       C=None, L=None, # constraints
                       strategy=LSOPT.FIRST_ACCEPT,
-                      best_delta = None):
+                      best_delta = None, neighbors = None):
     
     """ 2-opt* inter-route local search operation for the symmetric distances D
     Remove 2 edges from different routes and check if swapping the edge halves
     (in two different ways) would yield an improvement, while making sure the
     move does not violate constraints.
+    
+    If the candidate edges are given as neighbors (see
+    granular_neighbor_lists), only the moves that add at least one of them
+    are tried.
     """
 
     # use 2-opt
@@ -96,8 +121,19 @@ def do_2optstar_move(route1_data, route2_data, D, d=None,
     #print("REMOVEME: 2opt* on %s %s"%(list(route1_data.route), list(route2_data.route)) )
     
     
+    if neighbors is not None:
+        route2_positions = _route_positions(route2_data.route)
+    
     for i in range(0,len(route1_data.route)-1):
-        for j in range(0,len(route2_data.route)-1):
+        if neighbors is None:
+            j_candidates = range(0,len(route2_data.route)-1)
+        else:
+            # the new edge from a or b ends to c or d
+            j_candidates = _granular_positions(route2_positions,
+                neighbors[route1_data.route[i]]+\
+                neighbors[route1_data.route[i+1]],
+                (-1,0), 0, len(route2_data.route)-2)
+        for j in j_candidates:
             a = route1_data.route[i]
             b = route1_data.route[i+1]
             c = route2_data.route[j]
@@ -129,11 +165,15 @@ def do_2optstar_move(route1_data, route2_data, D, d=None,
                     constraint_violated = True
                 
                 if not constraint_violated:
-                    # store segments, deltas, and demands
+                    # store segments, costs, demands, and unchanged head and
+                    #  tail lengths
                     best_move = (((None,i+1,1), (j,None,-1),
-                                  D[a,c]-D[a,b], r1_new_demand),
+                                  route1_data.fwd_l[i]+D[a,c]+route2_data.fwd_l[j],
+                                  r1_new_demand, (route1_data,i+1), (None,0)),
                                  ((None,i,-1), (j+1,None,1),
-                                  D[b,d]-D[c,d], r2_new_demand))
+                                  route1_data.rwd_l[i+1]+D[b,d]+route2_data.rwd_l[j+1],
+                                  r2_new_demand, (None,0),
+                                  (route2_data,len(route2_data.route)-j-1)))
                     best_delta = delta
                     
                     if strategy==LSOPT.FIRST_ACCEPT:
@@ -164,11 +204,15 @@ def do_2optstar_move(route1_data, route2_data, D, d=None,
                     constraint_violated = True
                     
                 if not constraint_violated:
-                    # store segments, deltas, and demands
+                    # store segments, costs, demands, and unchanged head and
+                    #  tail lengths
                     best_move = (((None,i+1,1), (j+1,None,1),
-                                  D[a,d]-D[a,b], r1_new_demand),
+                                  route1_data.fwd_l[i]+D[a,d]+route2_data.rwd_l[j+1],
+                                  r1_new_demand, (route1_data,i+1),
+                                  (route2_data,len(route2_data.route)-j-1)),
                                  ((None,i,-1), (j,None,-1),
-                                  D[b,c]-D[c,d], r2_new_demand))
+                                  route1_data.rwd_l[i+1]+D[b,c]+route2_data.fwd_l[j],
+                                  r2_new_demand, (None,0), (None,0)))
                     best_delta = delta
                     
                     if strategy==LSOPT.FIRST_ACCEPT:
@@ -180,35 +224,24 @@ def do_2optstar_move(route1_data, route2_data, D, d=None,
                 
     if best_move:
         # unpack the move
-        ((r1_sgm1, r2_sgm1, r1_delta, r1_new_demand),
-         (r1_sgm2, r2_sgm2, r2_delta, r2_new_demand)) = best_move
-         
-        return (
-            # route 1
-            RouteData(
-                route1_data.route[r1_sgm1[0]:r1_sgm1[1]:r1_sgm1[2]]+\
-                route2_data.route[r2_sgm1[0]:r2_sgm1[1]:r2_sgm1[2]],
-                route1_data.cost+r1_delta,
-                r1_new_demand),
-            # route 2
-            RouteData(
-                route1_data.route[r1_sgm2[0]:r1_sgm2[1]:r1_sgm2[2]]+\
-                route2_data.route[r2_sgm2[0]:r2_sgm2[1]:r2_sgm2[2]],
-                route1_data.cost+r1_delta,
-                r1_new_demand),
-            # delta
-            best_delta)
+        new_route_datas = []
+        for (r1_sgm, r2_sgm, new_cost, new_demand,
+             (head_data, head_len), (tail_data, tail_len)) in best_move:
+            new_route_datas.append( RouteData.derive(
+                route1_data.route[r1_sgm[0]:r1_sgm[1]:r1_sgm[2]]+\
+                route2_data.route[r2_sgm[0]:r2_sgm[1]:r2_sgm[2]],
+                new_cost, new_demand,
+                head_data, head_len, tail_data, tail_len) )
+        return tuple(new_route_datas+[best_delta])
  
     return None, None, None
 
-    return None, None, None, None
-
 
 @routeordersensitive
 def do_1point_move(route1_data, route2_data, D, d=None,
                       C=None, L=None, # constraints
                       strategy=LSOPT.FIRST_ACCEPT,
-                      best_delta = None):
+                      best_delta = None, neighbors = None):
     """ Move one point from route1 to route2. Tries all possible combinations
     of moving a node from route 1 to any valid position in route 2. Sometimes
     called "relocate" (e.g., Bräysy & M. Gendreau 2005, Savelsbergh 1992), but
@@ -218,6 +251,9 @@ def do_1point_move(route1_data, route2_data, D, d=None,
     If an improving move was found and made, operation returns new routes in
     same format as route_data inputs, but if C and d are not given the 3.
     field of the tuple is None. If there is no improving move, returns None.
+    
+    If the candidate edges are given as neighbors (see
+    granular_neighbor_lists), the node is only inserted next to its neighbors.
 
     Groër, C., Golden, B. and Wasil, E., 2010. A library of local search
      heuristics for the vehicle routing problem. Mathematical Programming
@@ -241,6 +277,9 @@ def do_1point_move(route1_data, route2_data, D, d=None,
     best_move = None
     accept_move = False
     
+    if neighbors is not None:
+        route2_positions = _route_positions(route2)
+    
     for i in range(1,len(route1)-1):
         remove_after = route1[i-1]
         to_move = route1[i]
@@ -254,7 +293,13 @@ def do_1point_move(route1_data, route2_data, D, d=None,
         if C and r2_d+d[to_move]-C_EPS>C:
             continue
 
-        for j in range(1,len(route2)):
+        if neighbors is None:
+            j_candidates = range(1,len(route2))
+        else:
+            # insert after or before a neighbor
+            j_candidates = _granular_positions(route2_positions,
+                neighbors[to_move], (0,1), 1, len(route2)-1)
+        for j in j_candidates:
             insert_after = route2[j-1]
             insert_before = route2[j]
             
@@ -282,10 +327,12 @@ def do_1point_move(route1_data, route2_data, D, d=None,
         # unpack best move
         i, j, remove_delta, insert_delta = best_move
         to_move = route1[i] 
-        return (RouteData(route1[:i]+route1[i+1:], r1_l+remove_delta,
-                 None if not C else r1_d-d[to_move]),
-                RouteData(route2[:j]+[to_move]+route2[j:], r2_l+insert_delta,
-                 None if not C else r2_d+d[to_move]),
+        return (RouteData.derive(route1[:i]+route1[i+1:], r1_l+remove_delta,
+                 None if not C else r1_d-d[to_move],
+                 route1_data, i, route1_data, len(route1)-i-1),
+                RouteData.derive(route2[:j]+[to_move]+route2[j:], r2_l+insert_delta,
+                 None if not C else r2_d+d[to_move],
+                 route2_data, j, route2_data, len(route2)-j),
                 remove_delta+insert_delta)
                 
     return None,None,None
@@ -294,7 +341,7 @@ def do_1point_move(route1_data, route2_data, D, d=None,
 def do_2point_move(route1_data, route2_data, D, d=None,
                    C=None,L=None, # constraints
                    strategy=LSOPT.FIRST_ACCEPT,
-                   best_delta = None):                 
+                   best_delta = None, neighbors = None):
     """ Swap one point from route1 with one point on route2 if it improves the
     solution. This operation is sometimes referred to as "exchange" (e.g. in 
     Bräysy & M. Gendreau 2005, Savelsbergh 1992), but we use the name
@@ -304,6 +351,10 @@ def do_2point_move(route1_data, route2_data, D, d=None,
     If an improving move was found and made, operation returns new routes in
      same format as route_data inputs, but if C and d are not given the 3.
      field of the tuple is None. If there is no improving move, returns None.
+    
+    If the candidate edges are given as neighbors (see
+     granular_neighbor_lists), only the swaps that add at least one of them
+     are tried.
 
     Groër, C., Golden, B. and Wasil, E., 2010. A library of local search
      heuristics for the vehicle routing problem. Mathematical Programming
@@ -324,14 +375,27 @@ def do_2point_move(route1_data, route2_data, D, d=None,
     best_move = None
     accept_move = False
     
+    if neighbors is not None:
+        route2_positions = _route_positions(route2)
+    
     for i in range(1,len(route1)-1):
         to_swap1 = route1[i]
 
         swap1_after = route1[i-1]
         swap1_before = route1[i+1]     
 
-
-        for j in range(1,len(route2)-1):
+        if neighbors is None:
+            j_candidates = range(1,len(route2)-1)
+        else:
+            # to_swap1 next to its neighbor or the neighbor of its current
+            #  predecessor or successor in its place
+            j_candidates = sorted(set(
+                _granular_positions(route2_positions, neighbors[to_swap1],
+                                    (-1,1), 1, len(route2)-2)+\
+                _granular_positions(route2_positions,
+                    neighbors[swap1_after]+neighbors[swap1_before],
+                    (0,), 1, len(route2)-2)))
+        for j in j_candidates:
             to_swap2 = route2[j]
             
             # capacity constraint feasibility check 
@@ -370,17 +434,64 @@ def do_2point_move(route1_data, route2_data, D, d=None,
         i, j, route1_delta, route2_delta = best_move
         to_swap1 = route1[i] 
         to_swap2 = route2[j] 
-        return (RouteData(route1[:i]+[to_swap2]+route1[i+1:],
+        return (RouteData.derive(route1[:i]+[to_swap2]+route1[i+1:],
                  r1_l+route1_delta,
-                 None if not C else r1_d-d[to_swap1]+d[to_swap2]),
-                RouteData(route2[:j]+[to_swap1]+route2[j+1:],
+                 None if not C else r1_d-d[to_swap1]+d[to_swap2],
+                 route1_data, i, route1_data, len(route1)-i-1),
+                RouteData.derive(route2[:j]+[to_swap1]+route2[j+1:],
                  r2_l+route2_delta,
-                 None if not C else r2_d-d[to_swap2]+d[to_swap1]),
+                 None if not C else r2_d-d[to_swap2]+d[to_swap1],
+                 route2_data, j, route2_data, len(route2)-j-1),
                           
                 route1_delta+route2_delta)
                 
     return None,None,None
 
+@granular
+def do_granular_2optstar_move(route1_data, route2_data, D, d=None,
+                              C=None, L=None, # constraints
+                              strategy=LSOPT.FIRST_ACCEPT,
+                              best_delta = None, neighbors = None):
+    """ Granular version of the 2-opt* move (Toth & Vigo 2003) that only tries
+    the moves adding an edge between neighboring nodes. The neighbor lists are
+    calculated with granular_neighbor_lists if not given. When called from
+    do_local_search they are calculated only once.
+    
+    Toth, P. and Vigo, D., 2003. The granular tabu search and its application
+     to the vehicle-routing problem. INFORMS Journal on Computing, 15(4),
+     pp.333-346.
+    """
+    if neighbors is None:
+        neighbors = granular_neighbor_lists(D)
+    return do_2optstar_move(route1_data, route2_data, D, d, C, L,
+                            strategy, best_delta, neighbors)
+
+@granular
+@routeordersensitive
+def do_granular_1point_move(route1_data, route2_data, D, d=None,
+                            C=None, L=None, # constraints
+                            strategy=LSOPT.FIRST_ACCEPT,
+                            best_delta = None, neighbors = None):
+    """ Granular version of the one point move that only inserts the moved
+    node next to one of its neighbors. See do_granular_2optstar_move. """
+    if neighbors is None:
+        neighbors = granular_neighbor_lists(D)
+    return do_1point_move(route1_data, route2_data, D, d, C, L,
+                          strategy, best_delta, neighbors)
+
+@granular
+def do_granular_2point_move(route1_data, route2_data, D, d=None,
+                            C=None, L=None, # constraints
+                            strategy=LSOPT.FIRST_ACCEPT,
+                            best_delta = None, neighbors = None):
+    """ Granular version of the two point move that only tries the swaps
+    adding an edge between neighboring nodes. See do_granular_2optstar_move.
+    """
+    if neighbors is None:
+        neighbors = granular_neighbor_lists(D)
+    return do_2point_move(route1_data, route2_data, D, d, C, L,
+                          strategy, best_delta, neighbors)
+
 @routeordersensitive
 def do_insert_move(unrouted, recieving_route_data, D,d=None,C=None,L=None,
                    strategy=LSOPT.FIRST_ACCEPT,
@@ -669,14 +780,17 @@ def do_chain_move(route1_data, route2_data, route3_data, D, d=None,
         i, j, k, remove_delta, replace_delta, insert_delta = best_move
         to_move = route1[i] 
         to_replace = route2[j] 
-        return (RouteData(route1[:i]+route1[i+1:],
+        return (RouteData.derive(route1[:i]+route1[i+1:],
                     r1_l+remove_delta,
-                    None if not C else r1_d-d[to_move]),
-                RouteData(route2[:j]+[to_move]+route2[j+1:],
+                    None if not C else r1_d-d[to_move],
+                    route1_data, i, route1_data, len(route1)-i-1),
+                RouteData.derive(route2[:j]+[to_move]+route2[j+1:],
                     r2_l+replace_delta,
-                    None if not C else r2_d-d[to_replace]+d[to_move]),
-                RouteData(route3[:k]+[to_replace]+route3[k:],
+                    None if not C else r2_d-d[to_replace]+d[to_move],
+                    route2_data, j, route2_data, len(route2)-j-1),
+                RouteData.derive(route3[:k]+[to_replace]+route3[k:],
                     r3_l+insert_delta,
-                    None if not C else r3_d+d[to_replace]),
+                    None if not C else r3_d+d[to_replace],
+                    route3_data, k, route3_data, len(route3)-k),
                 best_delta)
     return None,None,None,None             
@@ -44,8 +44,13 @@ from __future__ import print_function
 from __future__ import division
 from builtins import range
 
+import numpy as np
+
 from verypy.local_search import LSOPT
+from verypy.util import produce_nn_list
 from verypy.config import COST_EPSILON as S_EPS
+from verypy.config import VECTORIZED_LS_MIN_ROUTE_LEN, VECTORIZED_LS_BATCH_SIZE
+from verypy.config import GRANULAR_NEIGHBORHOOD_SIZE
 
 __author__ = "Jussi Rasku"
 __copyright__ = "Copyright 2022, Jussi Rasku"
@@ -56,13 +61,25 @@ __email__ = "jussi.rasku@gmail.com"
 __status__ = "Development"
 
 
-def do_2opt_move(route, D, strategy=LSOPT.FIRST_ACCEPT, best_delta=None):
+def do_2opt_move(route, D, strategy=LSOPT.FIRST_ACCEPT, best_delta=None,
+                 vectorized=None):
     """ 2-opt local search operation for the symmetric distances D
     Remove 2 edges from the route and check if swapping then endpoints
     would yield an improvement.
+    
+    The move deltas can be evaluated with NumPy (vectorized=True) or with
+    plain Python loops (vectorized=False). The default None picks NumPy for
+    routes that are at least VECTORIZED_LS_MIN_ROUTE_LEN long. Both give
+    exactly the same moves for both FIRST_ACCEPT and BEST_ACCEPT.
     """
 
     rN = len(route)
+    if vectorized is None:
+        vectorized = isinstance(D, np.ndarray) and\
+                     rN>=VECTORIZED_LS_MIN_ROUTE_LEN
+    if vectorized:
+        return _do_vectorized_2opt_move(route, D, strategy, best_delta)
+    
     best_move = None
     if not best_delta:
         best_delta = 0
@@ -100,6 +117,70 @@ def do_2opt_move(route, D, strategy=LSOPT.FIRST_ACCEPT, best_delta=None):
         #print("REMOVEME:","best_move", i,j, route, best_delta)
         return route[:i+1]+route[j:i:-1]+route[j+1:], best_delta
     return None, None
+
+def _do_vectorized_2opt_move(route, D, strategy=LSOPT.FIRST_ACCEPT,
+                             best_delta=None):
+    """ A NumPy implementation of do_2opt_move. The deltas of the moves are
+    calculated for batches of the first removed edge (the i loop), at most
+    VECTORIZED_LS_BATCH_SIZE deltas at a time. The improving moves are then
+    visited in the same order as in the nested loops of do_2opt_move to
+    replicate its FIRST_ACCEPT and BEST_ACCEPT move selection exactly.
+    """
+    
+    rN = len(route)
+    best_move = None
+    if not best_delta:
+        best_delta = 0
+    if rN<3:
+        return None, None
+    
+    # edges are from tails[i] to heads[i] 
+    tails = np.asarray(route[:-1])
+    heads = np.asarray(route[1:])
+    edge_wts = D[tails, heads]
+    eN = rN-1
+    edge_idxs = np.arange(eN)
+    batch_rows = max(1, VECTORIZED_LS_BATCH_SIZE//eN)
+    
+    for i_start in range(0, eN-1, batch_rows):
+        i_end = min(i_start+batch_rows, eN-1)
+        
+        # a=tails[i], b=heads[i], c=tails[j], d=heads[j] as in do_2opt_move,
+        #  and the delta is calculated in the same order to avoid rounding
+        #  differences
+        a = tails[i_start:i_end,None]
+        b = heads[i_start:i_end,None]
+        deltas = D[a,tails] + D[b,heads] \
+                 -edge_wts[i_start:i_end,None]-edge_wts
+        
+        # only j>i are valid moves, the flat index is i*eN+j
+        improving = (deltas+S_EPS<best_delta)
+        improving &= (edge_idxs>edge_idxs[i_start:i_end,None])
+        candidates = np.flatnonzero(improving)
+        candidate_deltas = deltas.ravel()[candidates]
+        
+        # check the improving moves in the i,j loop order and update the best
+        #  only if the move is better than the current best
+        ci = 0
+        while ci<len(candidates):
+            k = candidates[ci]
+            best_move = (i_start+int(k//eN), int(k%eN))
+            best_delta = candidate_deltas[ci]
+            if strategy==LSOPT.FIRST_ACCEPT:
+                break
+            next_improving = np.flatnonzero(
+                candidate_deltas[ci+1:]+S_EPS<best_delta)
+            if len(next_improving)==0:
+                break
+            ci += 1+next_improving[0]
+        
+        if best_move and strategy==LSOPT.FIRST_ACCEPT:
+            break # i batch loop
+            
+    if best_move:
+        i,j = best_move
+        return route[:i+1]+route[j:i:-1]+route[j+1:], best_delta
+    return None, None
     
 def do_3opt_move(route, D, strategy=LSOPT.FIRST_ACCEPT, best_delta=None):
     """ 3-opt local search operation for the symmetric distances D """
@@ -262,6 +343,170 @@ def do_3opt_move(route, D, strategy=LSOPT.FIRST_ACCEPT, best_delta=None):
 
     return None, None
 
+def route_neighbor_lists(route, D, k=GRANULAR_NEIGHBORHOOD_SIZE):
+    """ Returns a dict with the k nearest neighbours of each node of the route
+    (among the other nodes of the route) as a list sorted by the distance. """
+    nodes = list(route[:-1]) if (route and route[0]==route[-1]) else list(route)
+    if len(nodes)<2:
+        return {n:[] for n in nodes}
+    NN_D = produce_nn_list(D[np.ix_(nodes,nodes)])
+    neighbors = {}
+    for ni, n in enumerate(nodes):
+        neighbors[n] = [nodes[nj] for nj, _ in NN_D[ni][:k+1] if nj!=ni][:k]
+    return neighbors
+
+def _3opt_reconnections(route, D, i, j, k):
+    """ Generates the 7 ways to reconnect the route after removing the edges
+    starting from the route positions i<j<k as (delta, segments) 2-tuples.
+    The segments are given in the same format as in do_3opt_move."""
+    a = route[i]
+    b = route[i+1]
+    c = route[j]
+    d = route[j+1]
+    e = route[k]
+    f = route[k+1]
+    removed_weights = D[a,b] + D[c,d] + D[e,f]
+    
+    # the 2-opt moves, see do_3opt_move for the illustrations
+    yield ((D[a,b] + D[c,e] + D[d,f])-removed_weights,
+           ((None,i+1, 1), (i+1,j+1, 1), (k,j, -1), (k+1,None, 1)))
+    yield ((D[a,c] + D[b,d] + D[e,f])-removed_weights,
+           ((None,i+1, 1), (j,i, -1), (j+1,k+1, 1), (k+1,None, 1)))
+    yield ((D[a,e] + D[d,c] + D[b,f])-removed_weights,
+           ((None,i+1, 1), (k,j, -1), (j,i, -1), (k+1,None, 1)))
+    # the 3-opt moves
+    yield ((D[a,c] + D[b,e] + D[d,f])-removed_weights,
+           ((None,i+1, 1), (j,i, -1), (k,j, -1), (k+1,None, 1)))
+    yield ((D[a,d] + D[e,b] + D[c,f])-removed_weights,
+           ((None,i+1, 1), (j+1,k+1, 1), (i+1,j+1, 1), (k+1,None, 1)))
+    yield ((D[a,d] + D[e,c] + D[b,f])-removed_weights,
+           ((None,i+1, 1), (j+1,k+1, 1), (j,i, -1), (k+1,None, 1)))
+    yield ((D[a,e] + D[d,b] + D[c,f])-removed_weights,
+           ((None,i+1, 1), (k,j, -1), (i+1,j+1, 1), (k+1,None, 1)))
+    
+def do_granular_3opt_move(route, D, strategy=LSOPT.FIRST_ACCEPT,
+                          best_delta=None, neighbors=None,
+                          dont_look_bits=None):
+    """ A granular variant of the 3-opt local search operation for the
+    symmetric distances D. Instead of trying all the O(n^3) combinations of
+    the removed edges, the search is started from each node of the route and
+    the new edges are only made to the nodes that are on the neighbor list of
+    that node (and then of the node that was disconnected). Also, the
+    (partial) gain has to stay positive while building the move. The search
+    space includes also the 2-opt moves.
+    
+    * neighbors is a dict of nearest neighbor lists of the route nodes as
+       returned by the route_neighbor_lists. If not given, it is calculated for
+       the route with the default k=GRANULAR_NEIGHBORHOOD_SIZE.
+    * dont_look_bits is an optional set of nodes that are not used to start the
+       search. It is updated in place: the nodes that do not lead to an
+       improving move are added to the set and the end nodes of the removed
+       edges of the returned move are removed from it. Give the same set on
+       the repeated calls to avoid searching the unchanged parts of the route
+       again (see solve_tsp_granular_3opt).
+    """
+    
+    rN = len(route)
+    if not best_delta:
+        best_delta = 0
+    if rN<4:
+        return None, None
+    if neighbors is None:
+        neighbors = route_neighbor_lists(route, D)
+    
+    # A route that returns to the depot is a cycle of rN-1 edges, where the
+    #  edge t is from route[t] to route[t+1].
+    eN = rN-1
+    is_cycle = (route[0]==route[-1])
+    if is_cycle:
+        pos = {n:p for p,n in enumerate(route[:-1])}
+        edges_at = lambda p: (p, (p-1)%eN)
+    else:
+        pos = {n:p for p,n in enumerate(route)}
+        edges_at = lambda p: [t for t in (p, p-1) if 0<=t<eN]
+    other_end = lambda t, n: route[t+1] if route[t]==n else route[t]
+    
+    best_move = None
+    accept_move = False
+    for n1 in route[:eN] if is_cycle else route:
+        if (dont_look_bits is not None) and (n1 in dont_look_bits):
+            continue
+        
+        node_improved = False
+        for t1 in edges_at(pos[n1]):
+            n2 = other_end(t1, n1)
+            g1_base = D[n1,n2]
+            # add the new edge n1-n3, neighbors are sorted, and, thus, stop
+            #  when the gain would not be positive anymore
+            for n3 in neighbors[n1]:
+                g1 = g1_base-D[n1,n3]
+                if g1<=S_EPS:
+                    break
+                for t2 in edges_at(pos[n3]):
+                    if t2==t1:
+                        continue
+                    n4 = other_end(t2, n3)
+                    
+                    # check the 2-opt move of removing the edges t1 and t2
+                    lo, hi = (t1,t2) if t1<t2 else (t2,t1)
+                    delta = D[route[lo],route[hi]] + D[route[lo+1],route[hi+1]]\
+                            -D[route[lo],route[lo+1]]-D[route[hi],route[hi+1]]
+                    if delta+S_EPS<best_delta:
+                        best_move = ((None,lo+1, 1), (hi,lo, -1),
+                                     (hi+1,None, 1)), (lo,hi)
+                        best_delta = delta
+                        node_improved = True
+                        if strategy==LSOPT.FIRST_ACCEPT:
+                            accept_move = True
+                            break # t2 loop
+                    elif delta+S_EPS<0:
+                        node_improved = True
+                    
+                    # and then the 3-opt moves with a new edge n4-n5
+                    g2 = g1+D[n3,n4]
+                    for n5 in neighbors[n4]:
+                        if g2-D[n4,n5]<=S_EPS:
+                            break
+                        for t3 in edges_at(pos[n5]):
+                            if t3==t1 or t3==t2:
+                                continue
+                            i,j,k = sorted((t1,t2,t3))
+                            for delta, sgmts in _3opt_reconnections(route,D,i,j,k):
+                                if delta+S_EPS<best_delta:
+                                    best_move = sgmts, (i,j,k)
+                                    best_delta = delta
+                                    node_improved = True
+                                    if strategy==LSOPT.FIRST_ACCEPT:
+                                        accept_move = True
+                                        break # reconnection loop
+                                elif delta+S_EPS<0:
+                                    node_improved = True
+                            if accept_move:
+                                break # t3 loop
+                        if accept_move:
+                            break # n5 loop
+                    if accept_move:
+                        break # t2 loop
+                if accept_move:
+                    break # n3 loop
+            if accept_move:
+                break # t1 loop
+        
+        # with BEST_ACCEPT a node that has any improving moves is kept active
+        if (not node_improved) and (dont_look_bits is not None):
+            dont_look_bits.add(n1)
+        if accept_move:
+            break # n1 loop
+        
+    if best_move:
+        sgmts, removed_edges = best_move
+        if dont_look_bits is not None:
+            for t in removed_edges:
+                dont_look_bits.discard(route[t])
+                dont_look_bits.discard(route[t+1])
+        return [n for s in sgmts for n in route[s[0]:s[1]:s[2]]], best_delta
+    return None, None
+
 def do_relocate_move(route, D, strategy=LSOPT.FIRST_ACCEPT, best_delta=None):
     """Relocate local search operation for the symmetric distances D.
     Check if a node on the route can be moved to another position on the same
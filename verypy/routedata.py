@@ -1,7 +1,12 @@
 # -*- coding: utf-8 -*-
+import numpy as np
+
 from verypy.util import sol2routes, objf
 
 class RouteData:
+    __slots__ = ('route', 'cost', 'demand', 'node_set', 'aux_data_updated',
+                 'fwd_l', 'rwd_l', 'fwd_d', 'rwd_d')
+    
     def __init__(self, route=None, cost=0.0, demand=0.0, node_set=None,
                  generate_node_set=False):
         self.route = [0,0] if (route is None) else route
@@ -54,35 +59,45 @@ class RouteData:
             self.update_auxiliary_data(D, d, direction=1)
             self.update_auxiliary_data(D, d, direction=-1)
             return
-            
-        route_d = [0.0]*len(self.route)
-        route_l = [0.0]*len(self.route)
         
-        cum_d = 0.0
-        cum_l = 0.0
-        prev_n = 0
-        start_i = 1 if direction==1 else -2
-        i = start_i
-        
-        #TODO: there might be a faster (numpy?) way of doing this
-        # e.g. using cumsum
-        for n in self.route[start_i::direction]:
-            if d:
-                cum_d += d[n]
-                route_d[i] = cum_d
-                
-            cum_l += D[prev_n,n]
-            route_l[i] = cum_l
-            prev_n = n
-            i+=direction
-            
+        rN = len(self.route)
+        route_l = np.zeros(rN)
+        route_d = np.zeros(rN)
         if direction>0:
+            RouteData._cumulate(self.route, D, d, route_l, route_d)
             self.fwd_l = route_l
             self.fwd_d = route_d
         elif direction<0:
+            # the backward cumulative data is the forward cumulative data of
+            #  the reversed route
+            RouteData._cumulate(self.route[::-1], D, d,
+                                route_l[::-1], route_d[::-1])
             self.rwd_l = route_l
             self.rwd_d = route_d
             
+    @staticmethod
+    def _cumulate(route, D, d, route_l, route_d, from_i=1):
+        """ Fills the cumulative route length and demand arrays route_l and
+        route_d in place starting from the index from_i (>=1), that is, the
+        values at the indices before from_i are assumed to be up to date. The
+        values are summed in the route order (cumsum) to get exactly the same
+        floating point values as when summing them one by one."""
+        if from_i>=len(route):
+            return
+        # the edges leading to the nodes from_i, from_i+1, ...
+        prev_nodes = route[from_i-1:-1]
+        next_nodes = route[from_i:]
+        
+        edge_l = np.empty(len(next_nodes)+1)
+        edge_l[0] = route_l[from_i-1]
+        edge_l[1:] = D[prev_nodes, next_nodes]
+        route_l[from_i-1:] = np.cumsum(edge_l)
+        if d:
+            node_d = np.empty(len(next_nodes)+1)
+            node_d[0] = route_d[from_i-1]
+            node_d[1:] = [d[n] for n in next_nodes]
+            route_d[from_i-1:] = np.cumsum(node_d)
+            
     def normalize(self):
         """ The smaller route start/end node comes first """
         if self.route[1]>self.route[-2]:
@@ -105,26 +120,96 @@ class RouteData:
             
         return r_nodes
         
-    @staticmethod
-    def from_routes(routes, D, d):
+    @classmethod
+    def from_routes(cls, routes, D, d):
         # consruct route data array
         route_datas = []
         for r in routes:
             r_cost = objf(r, D)
             r_demand = sum( d[node] for node in r ) if d else 0
             r_nodes = RouteData._route_to_nodeset(r)
-            route_datas.append( RouteData(r, r_cost, r_demand, r_nodes) )    
+            route_datas.append( cls(r, r_cost, r_demand, r_nodes) )    
         return route_datas
         
-    @staticmethod
-    def from_solution(solution, D, d):
+    @classmethod
+    def from_solution(cls, solution, D, d):
         routes = sol2routes(solution)
-        return RouteData.from_routes(routes, D, d)
+        return cls.from_routes(routes, D, d)
         
     @staticmethod
     def to_solution(route_datas):
         return [0]+[n for rd in route_datas for n in rd.route[1:]]
+    
+    @staticmethod
+    def derive(route, cost, demand, head_data=None, head_len=0,
+               tail_data=None, tail_len=0):
+        """ Creates the RouteData for a route that was modified by a local
+        search operation. The first head_len nodes of the route are known to
+        be the same as the first nodes of the route of head_data and the
+        last tail_len nodes the same as the last nodes of tail_data. If
+        either of those is an ArrayRouteData, an ArrayRouteData that reuses
+        the auxiliary data of the unchanged parts is returned. Otherwise,
+        the result is a plain RouteData. """
+        if isinstance(head_data, ArrayRouteData) or\
+           isinstance(tail_data, ArrayRouteData):
+            return ArrayRouteData.derive(route, cost, demand, head_data,
+                                         head_len, tail_data, tail_len)
+        return RouteData(route, cost, demand)
+        
+class ArrayRouteData(RouteData):
+    """ A RouteData that keeps its auxiliary data (the cumulative route length
+    and demand) up to date. The auxiliary data is calculated only once and 
+    the routes derived from this one by the local search operations reuse the
+    unchanged part of it. That is, after a move only the changed suffix of the
+    forward (and the changed prefix of the backward) data is recalculated.
+    
+    The route must not be modified in place after the auxiliary data has
+    been calculated. Instead, use derive to create a new ArrayRouteData."""
+    
+    # how many of the first fwd_* and last rwd_* values are up to date
+    __slots__ = ('_fwd_valid', '_rwd_valid')
+    
+    def __init__(self, route=None, cost=0.0, demand=0.0, node_set=None,
+                 generate_node_set=False):
+        RouteData.__init__(self, route, cost, demand, node_set,
+                           generate_node_set)
+        self._fwd_valid = 0
+        self._rwd_valid = 0
         
+    def update_auxiliary_data(self, D, d, direction=None):
+        rN = len(self.route)
+        if self.fwd_l is None:
+            self.fwd_l, self.fwd_d = np.zeros(rN), np.zeros(rN)
+            self.rwd_l, self.rwd_d = np.zeros(rN), np.zeros(rN)
+        if (not direction or direction>0) and self._fwd_valid<rN:
+            RouteData._cumulate(self.route, D, d, self.fwd_l, self.fwd_d,
+                                max(1, self._fwd_valid))
+            self._fwd_valid = rN
+        if (not direction or direction<0) and self._rwd_valid<rN:
+            RouteData._cumulate(self.route[::-1], D, d, self.rwd_l[::-1],
+                                self.rwd_d[::-1], max(1, self._rwd_valid))
+            self._rwd_valid = rN
+        self.aux_data_updated = (self._fwd_valid==rN and self._rwd_valid==rN)
         
+    @staticmethod
+    def derive(route, cost, demand, head_data=None, head_len=0,
+               tail_data=None, tail_len=0):
+        rd = ArrayRouteData(route, cost, demand)
+        rN = len(route)
+        rd.fwd_l, rd.fwd_d = np.zeros(rN), np.zeros(rN)
+        rd.rwd_l, rd.rwd_d = np.zeros(rN), np.zeros(rN)
         
-        
\ No newline at end of file
+        # only the up to date parts can be reused
+        head_len = min(head_len, head_data._fwd_valid, rN) if\
+                   isinstance(head_data, ArrayRouteData) else 0
+        tail_len = min(tail_len, tail_data._rwd_valid, rN) if\
+                   isinstance(tail_data, ArrayRouteData) else 0
+        if head_len>0:
+            rd.fwd_l[:head_len] = head_data.fwd_l[:head_len]
+            rd.fwd_d[:head_len] = head_data.fwd_d[:head_len]
+            rd._fwd_valid = head_len
+        if tail_len>0:
+            rd.rwd_l[rN-tail_len:] = tail_data.rwd_l[-tail_len:]
+            rd.rwd_d[rN-tail_len:] = tail_data.rwd_d[-tail_len:]
+            rd._rwd_valid = tail_len
+        return rd
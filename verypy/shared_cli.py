@@ -17,7 +17,9 @@ import logging
 
 import verypy.cvrp_ops as cvrp_ops
 import verypy.cvrp_io as cvrp_io
+from verypy import algo_name_aliases
 from verypy.util import objf, sol2routes, is_better_sol, natural_sort
+from verypy.solution_cache import SolutionCache, solution_cache_key
 from verypy.config import DEBUG_VERBOSITY as DEFAULT_DEBUG_VERBOSITY
 
 def print_problem_information(points, D, d, C, L, service_time, tightness=None, verbosity=0):
@@ -78,7 +80,8 @@ def print_solution_statistics(sol, D, D_cost, d, C, L=None, service_time=None,
 
 def read_and_solve_a_problem(problem_instance_path, with_algorithm_function,
                              minimize_K, best_of_n=1, verbosity=-1,
-                             single=False, print_measured_time=False):
+                             single=False, print_measured_time=False,
+                             algorithm_abbreviation=None, use_cache=True):
     """ Solve a problem instance with the path in problem_instance_path
     with the agorithm in <with_algorithm_function>.
     
@@ -87,11 +90,16 @@ def read_and_solve_a_problem(problem_instance_path, with_algorithm_function,
     
     Options <verbosity>, <single> and <print_measured_time> may be used to adjust what
     is printed and if a restricted single iteration search (different meaning 
-    for different algorithms) is made."""
+    for different algorithms) is made.
+    
+    If the <algorithm_abbreviation> (e.g. "ps", see get_algorithms) is given,
+    the solution is looked up from (and stored to) the SolutionCache unless
+    <use_cache> is False. The best of n solutions (<best_of_n> > 1) are not
+    cached."""
     
     pfn = problem_instance_path
-    N, points, dd_points, d, D, C, ewt = cvrp_io.read_TSPLIB_CVRP(pfn)
-    required_K, L, st = cvrp_io.read_TSBLIB_additional_constraints(pfn)
+    (N, points, dd_points, d, D, C, ewt), (required_K, L, st) = \
+        cvrp_io.read_compiled_CVRP(pfn)
     
     # model service time with the distance matrix
     D_c = cvrp_ops.D2D_c(D, st) if st else D
@@ -112,7 +120,26 @@ def read_and_solve_a_problem(problem_instance_path, with_algorithm_function,
     best_f = float('inf')
     best_K = len(D)
     interrupted = False
-    for repeat_n in range(best_of_n):
+    
+    cache = SolutionCache()
+    cache_key = None
+    from_cache = False
+    if use_cache and algorithm_abbreviation and best_of_n==1:
+        cache_key = solution_cache_key(points, D, d, C, L, st,
+                                       algorithm_abbreviation, minimize_K,
+                                       single)
+        start = time()
+        best_sol = cache.get(cache_key)
+        elapsed = time()-start
+        from_cache = best_sol is not None
+        if from_cache:
+            if verbosity>=0:
+                print("SOLUTION FROM CACHE (not solved with the current "+
+                      "code, use --no-cache to solve it again)")
+            if print_measured_time or verbosity>=1:
+                print("SOLVED IN: %.2f s"%elapsed)
+    
+    for repeat_n in range(0 if from_cache else best_of_n):
         
         sol, sol_f, sol_K = None, float('inf'), float('inf')
         start = time()
@@ -144,6 +171,9 @@ def read_and_solve_a_problem(problem_instance_path, with_algorithm_function,
                 
         if interrupted:
             break
+    
+    if cache_key and best_sol and not (from_cache or interrupted):
+        cache.put(cache_key, best_sol)
             
     if verbosity>=0 and best_sol:
         n_best_sol = cvrp_ops.normalize_solution(best_sol)
@@ -249,6 +279,7 @@ def cli(init_name, init_desc, init_f):
     output_logfilepath = None
     best_of_n = 1
     interrupted = False
+    use_cache = True
     
     for i in range(0, len(sys.argv)-1):
         if sys.argv[i]=="-v" and sys.argv[i+1].isdigit():
@@ -259,6 +290,8 @@ def cli(init_name, init_desc, init_f):
             single = True
         if sys.argv[i]=="-t":
             print_measured_time = True
+        if sys.argv[i]=="--no-cache":
+            use_cache = False
         if sys.argv[i]=="-l":
             output_logfilepath = sys.argv[i+1]       
         if sys.argv[i]=="-b":
@@ -323,11 +356,15 @@ def cli(init_name, init_desc, init_f):
           "  -1 to run only one iteration (if applicable)\n"+\
           "  -t to print elapsed wall time\n"+\
           "  -l <file_path> to store the debug output to a file\n"+\
+          "  --no-cache to solve the problem even if it has a cached solution\n"+\
           "  -b <'cost'|'vehicles'> or <c|K> sets the primary optimization oBjective (default is cost)",
           file=sys.stderr)
     elif problem_file_list:
+        # the solutions are cached with the same key as in the web GUI
+        algorithm_abbreviation = algo_name_aliases.get(init_name.lower())
         for problem_path in problem_file_list:
             problem_name = path.basename(problem_path)
             print("Solve", problem_name ,"with", init_name)
             read_and_solve_a_problem(problem_path, init_f, minimize_K, best_of_n, 
-                                     verbosity, single, print_measured_time)
+                                     verbosity, single, print_measured_time,
+                                     algorithm_abbreviation, use_cache)
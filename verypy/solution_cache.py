@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+################################################################################
+""" This file implements an on-disk cache of the solutions of the CLI and the
+web GUI solves. The same problem is often solved with the same algorithm over
+and over again, and as the heuristics are deterministic, the solution can be
+looked up instead. The solutions are content addressed, that is, keyed by a
+hash of the problem data, the solve options, and the VeRyPy version (see
+solution_cache_key).
+
+Note that a cached solution bypasses the current code. An upgrade of VeRyPy
+invalidates the cached solutions, but a local edit to a heuristic does not.
+Then, solve with the cache disabled (e.g. --no-cache) or clear the
+SOLUTION_CACHE_DIR.
+"""
+
+# Written in Python 2.7, but try to maintain Python 3+ compatibility
+from __future__ import print_function
+from __future__ import division
+
+import os
+import json
+import hashlib
+from glob import glob
+
+import numpy as np
+
+import verypy
+from verypy.cvrp_io import _atomic_write
+from verypy.config import SOLUTION_CACHE_DIR, SOLUTION_CACHE_MAX_SIZE
+
+__author__ = "Jussi Rasku"
+__copyright__ = "Copyright 2022, Jussi Rasku"
+__credits__ = ["Jussi Rasku"]
+__license__ = "MIT"
+__maintainer__ = "Jussi Rasku"
+__email__ = "jussi.rasku@gmail.com"
+__status__ = "Development"
+
+################################################################################
+
+# bump this if the solutions of the earlier versions should not be used
+SOLUTION_CACHE_FORMAT_VERSION = 1
+
+def _update_with_array(h, a):
+    a = np.ascontiguousarray(a)
+    h.update(("%s%s"%(a.dtype.str, a.shape)).encode('ascii'))
+    h.update(a.tobytes())
+
+def solution_cache_key(points, D, d, C, L, st, algorithm, minimize_K, single):
+    """ Returns the key of the solution of the problem (points, D, d, C, L, st)
+    solved with the algorithm (e.g., its abbreviation) and the options
+    minimize_K and single. The points and d can be None. The key also
+    includes the VeRyPy version, but not the code of the algorithm, so a
+    locally edited algorithm gets the solutions cached before the edit. """
+    h = hashlib.sha1()
+    h.update(("%d/%s"%(SOLUTION_CACHE_FORMAT_VERSION,
+                       verypy.__version__)).encode('ascii'))
+    _update_with_array(h, D)
+    for a in (points, d):
+        if a is None:
+            h.update(b"None")
+        else:
+            _update_with_array(h, np.asarray(a, dtype=float))
+    options = [None if v is None else float(v) for v in (C, L, st)]+\
+              [str(algorithm), bool(minimize_K), bool(single)]
+    h.update(json.dumps(options).encode('ascii'))
+    return h.hexdigest()
+
+class SolutionCache(object):
+    def __init__(self, cache_dir=SOLUTION_CACHE_DIR,
+                 max_size=SOLUTION_CACHE_MAX_SIZE):
+        """ The solutions are stored as small JSON files in the cache_dir
+        (None disables the cache). When the files take more than max_size
+        bytes, the least recently used ones are removed. """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+    
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key+".json")
+    
+    def get(self, key):
+        """ Returns the cached solution or None if there is no solution with
+        the key (see solution_cache_key). """
+        if self.cache_dir is None:
+            return None
+        try:
+            with open(self._path(key), "r") as fh:
+                solution = json.load(fh)['solution']
+            # the modification time is used to find the least recently used
+            os.utime(self._path(key), None)
+        except (IOError, OSError, ValueError, KeyError):
+            self.misses+=1
+            return None
+        self.hits+=1
+        return solution
+    
+    def put(self, key, solution):
+        """ Stores the solution (a list of node indices) with the key. Any
+        errors in writing the cache are ignored. """
+        if self.cache_dir is None or not solution:
+            return
+        try:
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            _atomic_write(self._path(key), lambda fh: json.dump(
+                {'solution':[int(n) for n in solution]}, fh), "w")
+            self._evict()
+        except (IOError, OSError):
+            pass
+    
+    def _evict(self):
+        """ Removes the least recently used solutions until the cache fits in
+        max_size. """
+        files = []
+        for file_path in glob(os.path.join(self.cache_dir, "*.json")):
+            try:
+                stat = os.stat(file_path)
+                files.append((stat.st_mtime, stat.st_size, file_path))
+            except OSError:
+                # removed by another process
+                pass
+        total_size = sum(size for _, size, _ in files)
+        for _, size, file_path in sorted(files):
+            if total_size<=self.max_size:
+                break
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass
+            total_size-=size
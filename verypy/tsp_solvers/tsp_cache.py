@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+################################################################################
+""" This file implements a memoization cache for the route TSPs. The
+construction heuristics that try several sweep start positions, directions,
+or assignments (e.g. sweep, gillet_miller_sweep, petalvrp, and gapvrp) end up
+routing the same sets of customers over and over again. Wrapping the TSP
+solver in a RouteTSPCache solves each of these TSPs only once.
+"""
+
+# Written in Python 2.7, but try to maintain Python 3+ compatibility
+from __future__ import print_function
+from __future__ import division
+
+from collections import OrderedDict
+
+from verypy.config import ROUTE_TSP_CACHE_SIZE
+
+__author__ = "Jussi Rasku"
+__copyright__ = "Copyright 2022, Jussi Rasku"
+__credits__ = ["Jussi Rasku"]
+__license__ = "MIT"
+__maintainer__ = "Jussi Rasku"
+__email__ = "jussi.rasku@gmail.com"
+__status__ = "Development"
+
+################################################################################
+
+class RouteTSPCache(object):
+    def __init__(self, tsp_f, max_size=ROUTE_TSP_CACHE_SIZE,
+                 ignore_order=True):
+        """ Wraps the TSP solver function tsp_f(D, selected_idxs) that returns
+        a (route, cost) tuple. The cache is called the same way as the solver
+        and keeps at most max_size least recently used solutions.
+        
+        The solutions are keyed by the first node (the end point of the route,
+        usually the depot) and the set of the selected nodes. That is, the
+        order of the selected nodes is ignored, and a TSP for a node set that
+        has already been solved is not solved again even if the nodes are
+        given in a different order. As D is not part of the key, a cache must
+        not be used with more than one distance matrix.
+        
+        Note that the heuristic TSP solvers may give a different route for the
+        same nodes in a different order. Then, the cached route depends on the
+        order the TSPs were solved in. With ignore_order=False the solutions
+        are keyed by the node sequence, which makes the cache transparent:
+        it always returns what tsp_f would have returned. """
+        self.tsp_f = tsp_f
+        self.max_size = max_size
+        self.ignore_order = ignore_order
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+    
+    def __len__(self):
+        return len(self._cache)
+    
+    def __call__(self, D, selected_idxs):
+        if self.ignore_order:
+            key = (selected_idxs[0], frozenset(selected_idxs))
+        else:
+            key = tuple(selected_idxs)
+        cache = self._cache
+        if key in cache:
+            # move to the most recently used end
+            route, cost = cache.pop(key)
+            cache[key] = (route, cost)
+            self.hits+=1
+        else:
+            route, cost = self.tsp_f(D, selected_idxs)
+            self.misses+=1
+            if self.max_size>0:
+                route = tuple(route)
+                cache[key] = (route, cost)
+                if len(cache)>self.max_size:
+                    cache.popitem(last=False)
+        # the callers are free to modify the returned route
+        return list(route), cost
+    
+    def clear(self):
+        self._cache.clear()
+        self.hits = 0
+        self.misses = 0
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+################################################################################
+""" This file implements solving the shortest Hamiltonian path with fixed end
+points (an open path TSP) with any of the TSP solvers. The usual trick of
+zeroing the distance between the end points is done on a copy of the (small)
+distance matrix of the path nodes, so that D can be read-only and shared
+between threads and processes, or memory mapped.
+"""
+
+# Written in Python 2.7, but try to maintain Python 3+ compatibility
+from __future__ import print_function
+from __future__ import division
+
+from logging import log, DEBUG
+
+import numpy as np
+
+from verypy.tsp_solvers.tsp_solver_ropt import solve_tsp_3opt
+
+__author__ = "Jussi Rasku"
+__copyright__ = "Copyright 2022, Jussi Rasku"
+__credits__ = ["Jussi Rasku"]
+__license__ = "MIT"
+__maintainer__ = "Jussi Rasku"
+__email__ = "jussi.rasku@gmail.com"
+__status__ = "Development"
+
+################################################################################
+
+def solve_path_tsp(D, from_node, to_node, through_nodes, tsp_f=solve_tsp_3opt):
+    """ Finds a short path from from_node to to_node that visits all the
+    through_nodes using the TSP solver function tsp_f(D, selected_idxs) that
+    returns a (route, cost) tuple. D is not modified.
+
+    Returns a (path, cost) tuple where the path starts from from_node and
+    ends to to_node. If from_node and to_node are the same, the path is a
+    closed TSP tour through the nodes. """
+    through_nodes = list(through_nodes)
+    if not through_nodes:
+        return [from_node,to_node], D[from_node, to_node]
+    if from_node==to_node:
+        return tsp_f(D, [from_node]+through_nodes+[to_node])
+
+    # Make sure to_node is the last by setting the distance between the end
+    #  points to 0.0 in a local distance matrix of the path nodes.
+    path_nodes = [from_node]+through_nodes+[to_node]
+    path_D = np.array(D[np.ix_(path_nodes, path_nodes)])
+    path_D[0, -1] = 0.0
+    path_D[-1, 0] = 0.0
+    local_route, cost = tsp_f(path_D, list(range(len(path_nodes))))
+    route = [path_nodes[i] for i in local_route]
+
+    # contingency plan for the special case where there are nodes that overlap
+    #  the end points. Check for it and fix it with a simple swap if needed.
+    if route[-2]!=to_node:
+        last_node_idx = route.index(to_node)
+        route[last_node_idx]=route[-2]
+        route[-2]=to_node
+        if __debug__:
+            log(DEBUG-1, "WARNING: the chain does not end to node "+
+                       "(%d). Swapped two nodes to get route %s"%
+                       (to_node,route))
+
+    return route[:-1], cost
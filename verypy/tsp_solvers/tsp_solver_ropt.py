@@ -6,7 +6,9 @@ from __future__ import division
 
 
 from verypy.util import objf
-from verypy.local_search.intra_route_operators import do_2opt_move, do_3opt_move
+from verypy.local_search.intra_route_operators import do_2opt_move, do_3opt_move,\
+    do_granular_3opt_move, route_neighbor_lists
+from verypy.config import GRANULAR_NEIGHBORHOOD_SIZE
 from random import shuffle
     
 def solve_tsp_2opt(D, selected_idxs):
@@ -16,11 +18,37 @@ def solve_tsp_2opt(D, selected_idxs):
 def solve_tsp_3opt(D, selected_idxs):
     return solve_tsp_ropt(D, selected_idxs,
                do_shuffle=False, do2opt=False, do3opt=True)
+
+def solve_tsp_granular_3opt(D, selected_idxs, k=GRANULAR_NEIGHBORHOOD_SIZE):
+    """ Makes the route 3-optimal w.r.t. the granular neighborhood where the
+    new edges must connect each node to one of its k nearest neighbors. The
+    don't look bits are kept over the moves, so that only the nodes around
+    the changed edges are searched again after each improving move. """
+    endp = selected_idxs[0]
+    if selected_idxs[-1]!=endp:
+        new_route = selected_idxs+[endp]
+    else:
+        new_route = selected_idxs
+    new_route_cost = objf(new_route, D)
+    
+    neighbors = route_neighbor_lists(new_route, D, k)
+    dont_look_bits = set()
+    while True:
+        improved_route, delta = do_granular_3opt_move(new_route, D, 1,
+            neighbors=neighbors, dont_look_bits=dont_look_bits)
+        if improved_route is None:
+            break
+        new_route = improved_route 
+        new_route_cost+=delta
+        
+    return new_route, new_route_cost
     
     
 def solve_tsp_ropt(D, selected_idxs,
-                   do_shuffle=False, do2opt=True, do3opt=True):    
+                   do_shuffle=False, do2opt=True, do3opt=True,
+                   vectorized_2opt=None):    
     # r-Opt (r \in {2,3} )
+    # vectorized_2opt selects the 2-opt move evaluation, see do_2opt_move
     endp = selected_idxs[0]
     
     if do_shuffle:
@@ -39,7 +67,8 @@ def solve_tsp_ropt(D, selected_idxs,
         improved = True
         while improved:
             improved = False
-            improved_route, delta = do_2opt_move(new_route, D, 1)
+            improved_route, delta = do_2opt_move(new_route, D, 1,
+                                          vectorized=vectorized_2opt)
             if improved_route is not None:
                 new_route = improved_route 
                 new_route_cost+=delta
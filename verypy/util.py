@@ -11,6 +11,7 @@ from __future__ import division
 
 import sys
 import re
+from time import time
 from builtins import range
 
 from itertools import groupby    
@@ -78,6 +79,23 @@ def is_better_sol(best_f, best_K, sol_f, sol_K, minimize_K):
     else:
         return sol_f<best_f
 
+def progress_reporter(progress_callback, minimize_K=False):
+    """Returns a function report(sol, sol_f, sol_K) for the algorithms to
+    report their incumbent solutions. Only the solutions that are better than
+    the previously reported one (according to minimize_K) are passed on to
+    progress_callback(sol, sol_f, sol_K, elapsed), where elapsed is the time
+    in seconds since the reporter was created. If progress_callback is None,
+    nothing is reported."""
+    start_time = time()
+    reported = [None, None]
+    def report(sol, sol_f, sol_K):
+        if progress_callback is None or not sol:
+            return
+        if is_better_sol(reported[0], reported[1], sol_f, sol_K, minimize_K):
+            reported[:] = [sol_f, sol_K]
+            progress_callback(sol, sol_f, sol_K, time()-start_time)
+    return report
+
 def without_empty_routes(sol):
     """Removes empty routes from the solution. WARNING: this also removes
     other concecutive duplicate nodes, not just 0,0!"""